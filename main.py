@@ -3,89 +3,73 @@
 import argparse
 import json
 import os
-import random
 import signal
 import time
 
+from cardano.wt.audit import AuditSink
 from cardano.wt.bonuses.bogo import Bogo
 from cardano.wt.blockfrost import BlockfrostApi
+from cardano.wt.budget import RequestBudget
+from cardano.wt.cache import DiskCache
 from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.chain_follower import ChainFollower, OgmiosChainSync
+from cardano.wt.journal import VendJournal
+from cardano.wt.kupo_ogmios import KupoOgmiosBackend
 from cardano.wt.mint import Mint
 from cardano.wt.nft_vending_machine import NftVendingMachine
+from cardano.wt.poll_scheduler import AdaptivePollScheduler
+from cardano.wt.protocol_params import ProtocolParameters
+from cardano.wt.retry_scheduler import RetryScheduler
+from cardano.wt.retry_policy import CircuitOpenError
+from cardano.wt.submission import HedgedSubmitter, OgmiosSubmitEndpoint, SubmitApiEndpoint
+from cardano.wt.tx_builder import PyCardanoTxBuilder
 from cardano.wt.utxo import Utxo, Balance
+from cardano.wt.webhook import WebhookListener
 from cardano.wt.whitelist.no_whitelist import NoWhitelist
 from cardano.wt.whitelist.asset_whitelist import SingleUseWhitelist, UnlimitedWhitelist
 from cardano.wt.whitelist.wallet_whitelist import WalletWhitelist
 
-# Blockfrost gives the wrong format back for protocol parameters so here's a translator
-BLOCKFROST_PROTOCOL_TRANSLATOR = {
-    'decentralization': 'decentralisation_param',
-    'extraPraosEntropy': 'extra_entropy',
-    'maxBlockBodySize': 'max_block_size',
-    'maxBlockHeaderSize': 'max_block_header_size',
-    'minPoolCost': 'min_pool_cost',
-    'maxTxSize': 'max_tx_size',
-    'minUTxOValue': 'min_utxo',
-    'monetaryExpansion': 'rho',
-    'poolPledgeInfluence': 'a0',
-    'poolRetireMaxEpoch': 'e_max',
-    'protocolVersion': {
-        'minor': 'protocol_minor_ver',
-        'major': 'protocol_major_ver'
-    },
-    'stakeAddressDeposit': 'key_deposit',
-    'stakePoolDeposit': 'pool_deposit',
-    'stakePoolTargetNum': 'n_opt',
-    'treasuryCut': 'tau',
-    'txFeeFixed': 'min_fee_b',
-    'txFeePerByte': 'min_fee_a'
-}
-
 # Vending machine internal constants (global required)
 LOCKED_SUBDIR = 'in_proc'
 METADATA_SUBDIR = 'metadata'
 WL_CONSUMED_DIR_SUBDIR = 'wl_consumed'
-WAIT_TIMEOUT = 15
+VEND_JOURNAL_FILE = 'vend_journal.db'
+BLOCKFROST_CACHE_SUBDIR = 'blockfrost_cache'
+CHAIN_SYNC_STATE_FILE = 'chain_sync_utxos.json'
+MIN_WAIT_TIMEOUT = 2
+MAX_WAIT_TIMEOUT = 60
+WEBHOOK_SAFETY_POLL = 300
+CHAIN_SYNC_TIMEOUT = 60
+METRICS_LOG_INTERVAL = 600
+TXN_BUILDERS = {
+    'cardano-cli': CardanoCli,
+    'pycardano': PyCardanoTxBuilder
+}
 
 _program_is_running = True
+_poll_scheduler = None
 
 def end_program(signum, frame):
     global _program_is_running
     _program_is_running = False
+    if _poll_scheduler:
+        _poll_scheduler.notify()
 
 def set_interrupt_signal(end_program_func):
     signal.signal(signal.SIGINT, end_program_func)
 
-def seed_random():
-    random.seed(321)
-
 def ensure_output_dirs_made(output_dir):
     os.makedirs(os.path.join(output_dir, LOCKED_SUBDIR), exist_ok=True)
     os.makedirs(os.path.join(output_dir, METADATA_SUBDIR), exist_ok=True)
     os.makedirs(os.path.join(output_dir, CardanoCli.TXN_DIR), exist_ok=True)
     os.makedirs(os.path.join(output_dir, WL_CONSUMED_DIR_SUBDIR), exist_ok=True)
 
-def generate_cardano_cli_protocol(translator, blockfrost_input):
-    translated = {}
-    for entry in translator:
-        translation = translator[entry]
-        if type(translation) is dict:
-            translated[entry] = generate_cardano_cli_protocol(translation, blockfrost_input)
-        else:
-            input_val = blockfrost_input[translation]
-            if type(input_val) is str and input_val.isdigit():
-                translated[entry] = int(input_val)
-            else:
-                translated[entry] = input_val
-    return translated
-
-def rewritten_protocol_params(blockfrost_protocol_json, output_dir):
-    cardanocli_protocol_json = generate_cardano_cli_protocol(BLOCKFROST_PROTOCOL_TRANSLATOR, blockfrost_protocol_json)
-    print(cardanocli_protocol_json)
-    protocol_filename = os.path.join(output_dir, 'protocol.json')
-    with open(protocol_filename, 'w') as protocol_file:
-        json.dump(cardanocli_protocol_json, protocol_file)
-    return protocol_filename
+def get_epoch_schedule(args):
+    if args.mainnet:
+        return ProtocolParameters.MAINNET_EPOCHS
+    if args.preview:
+        return ProtocolParameters.PREVIEW_EPOCHS
+    return ProtocolParameters.PREPROD_EPOCHS
 
 def get_whitelist_type(args, wl_output_dir):
     assert(not (args.no_whitelist and (args.single_use_asset_whitelist or args.unlimited_asset_whitelist)))
@@ -109,15 +93,42 @@ def get_parser():
     parser.add_argument('--mint-sign-key', required=True, action='append', help='Location on disk of minting signing key(s) (validated on launch)')
     parser.add_argument('--metadata-dir', required=True, help='Local folder where Cardano NFT metadata (e.g., 721s) are stored')
     parser.add_argument('--output-dir', required=True, help='Local folder where vending machine output stored')
-    parser.add_argument('--blockfrost-project', required=True, help='Blockfrost project ID to use for retrieving chain data')
+    parser.add_argument('--blockfrost-pool-size', type=int, default=10, help='Maximum number of keep-alive connections to Blockfrost (should be at least --vend-workers, default is 10)')
+    parser.add_argument('--blockfrost-timeouts', type=float, nargs=2, default=[5, 30], metavar=('CONNECT_SEC', 'READ_SEC'), help='Connect and read timeouts for Blockfrost calls (default is 5 and 30 seconds)')
+    parser.add_argument('--blockfrost-cache-mb', type=int, default=256, help='Size cap of the on-disk cache of immutable Blockfrost responses in the output directory (0 disables, default is 256)')
+    parser.add_argument('--blockfrost-daily-quota', type=int, default=0, help='Daily request quota of the Blockfrost plan, used to pace non-critical calls and polling as it runs low (0 disables, default is 0)')
+    parser.add_argument('--incremental-utxos', action='store_true', help='Discover payment UTxOs from the transactions seen since the last poll instead of listing the whole address every poll')
+    parser.add_argument('--utxo-reconcile-interval', type=int, default=900, help='With --incremental-utxos, seconds between full listings of the payment address (default is 900)')
+    parser.add_argument('--blockfrost-http2', action='store_true', help='Use HTTP/2 for Blockfrost calls (requires the http2 extra)')
     parser.add_argument('--mainnet', action='store_true', help='Run the vending machine in production (default is False [preprod])')
     parser.add_argument('--preview', action='store_true', help='Run the vending machine on the preview network (default is False [preprod])')
     parser.add_argument('--single-vend-max', type=int, required=True, help='Backend limit enforced on NFTs vended at once')
-    parser.add_argument('--vend-randomly', action='store_true', help='Randomly pick from the metadata directory (using seed 321) when listing')
+    parser.add_argument('--vend-randomly', action='store_true', help='Randomly pick from the metadata directory (using seed 321) in an order persisted to the output directory')
+    parser.add_argument('--vend-workers', type=int, default=1, help='Number of mint requests to vend in parallel (default is 1)')
+    parser.add_argument('--vend-batch-size', type=int, default=1, help='Maximum number of mint requests combined into a single transaction (default is 1)')
+    parser.add_argument('--max-vend-attempts', type=int, default=5, help='Attempts made to vend a mint request (with exponential backoff) before giving up on it (default is 5)')
+    parser.add_argument('--min-poll-wait', type=float, default=MIN_WAIT_TIMEOUT, help=f"Seconds between polls for mint requests while requests keep arriving (default is {MIN_WAIT_TIMEOUT})")
+    parser.add_argument('--max-poll-wait', type=float, default=MAX_WAIT_TIMEOUT, help=f"Maximum seconds between polls for mint requests when idle (default is {MAX_WAIT_TIMEOUT})")
+    parser.add_argument('--metrics-log-interval', type=float, default=METRICS_LOG_INTERVAL, help=f"Seconds between logs of the Blockfrost request budget (submission latencies are logged whenever they change, default is {METRICS_LOG_INTERVAL})")
+    parser.add_argument('--txn-builder', choices=TXN_BUILDERS.keys(), default='cardano-cli', help='Backend used to build, size, and sign mint transactions (pycardano builds them in memory without spawning cardano-cli, default is cardano-cli)')
+    parser.add_argument('--in-memory-txns', action='store_true', help='Keep metadata and transactions in memory from build to submit (requires --txn-builder pycardano)')
+    parser.add_argument('--no-txn-audit', action='store_true', help='With --in-memory-txns, do not write audit copies of metadata and transactions to the output directory in the background')
     parser.add_argument('--dev-fee', type=int, required=False, help='Developer fee (in lovelace, 1/1,000,000 ₳)')
     parser.add_argument('--dev-addr', type=str, required=False, help='Address of developer wallet to send fee to')
     parser.add_argument('--bogo', type=int, nargs=2, metavar=('BOGO_THRESHOLD', 'BOGO_ADDITIONAL'), help='Provide BOGO functionality (two arguments are the threshold for a bonus and then how many bonuses the user should get)')
 
+    chain_backend = parser.add_mutually_exclusive_group(required=True)
+    chain_backend.add_argument('--blockfrost-project', help='Blockfrost project ID to use for retrieving chain data')
+    chain_backend.add_argument('--kupo-url', help='URL of a self-hosted Kupo indexer (matching "*") to use for retrieving chain data instead of Blockfrost (requires --ogmios-url)')
+    parser.add_argument('--chain-sync-url', help='WebSocket URL of an Ogmios instance to follow the chain with, discovering mint requests as their blocks arrive instead of polling (requires the chainsync extra)')
+    parser.add_argument('--chain-sync-timeout', type=float, default=CHAIN_SYNC_TIMEOUT, help=f"With --chain-sync-url, seconds to wait at startup for the chain follower to catch up before vending from Blockfrost listings in the meantime (default is {CHAIN_SYNC_TIMEOUT})")
+    parser.add_argument('--webhook-port', type=int, help='Port to listen on for Blockfrost transaction webhooks on the payment address, which are vended as soon as they arrive')
+    parser.add_argument('--webhook-secret', help='Auth token of the Blockfrost webhook, used to verify webhook signatures (required with --webhook-port)')
+    parser.add_argument('--webhook-safety-poll', type=float, default=WEBHOOK_SAFETY_POLL, help=f"With --webhook-port, seconds between listings of the payment address in case a webhook was missed (default is {WEBHOOK_SAFETY_POLL})")
+    parser.add_argument('--ogmios-url', help='URL of the Ogmios instance used with --kupo-url for protocol parameters and submitting transactions')
+    parser.add_argument('--submit-api-url', action='append', default=[], help='URL of a cardano-submit-api instance to also submit transactions to, in parallel with the chain backend (repeat for multiple)')
+    parser.add_argument('--submit-ogmios-url', action='append', default=[], help='URL of an Ogmios instance to also submit transactions to, in parallel with the chain backend (repeat for multiple)')
+
     whitelist = parser.add_mutually_exclusive_group(required=True)
     whitelist.add_argument('--no-whitelist', action='store_true', help='No whitelist required for mints')
     whitelist.add_argument('--single-use-asset-whitelist', type=str, help='Use an asset-based whitelist.  The provided directory should have files where the filenames represent asset IDs on the whitelist and the contents represent linked identifiers (exactly one per line).  Each asset can mint up to <N> NFT')
@@ -132,9 +143,10 @@ def get_parser():
 
 if __name__ == "__main__":
     _args = get_parser().parse_args()
+    assert(not _args.kupo_url or _args.ogmios_url)
+    assert(not _args.webhook_port or _args.webhook_secret)
 
     set_interrupt_signal(end_program)
-    seed_random()
     ensure_output_dirs_made(_args.output_dir)
 
     _mint_prices = [Balance(int(mint[0]), mint[1]) for mint in _args.mint_price]
@@ -143,13 +155,38 @@ if __name__ == "__main__":
     _bogo = Bogo(_args.bogo[0], _args.bogo[1]) if _args.bogo else None
     _mint = Mint(_mint_prices, _dev_fee, _args.dev_addr, _args.metadata_dir, _args.mint_script, _args.mint_sign_key, _whitelist, _bogo)
 
-    _blockfrost_api = BlockfrostApi(_args.blockfrost_project, mainnet=_args.mainnet, preview=_args.preview)
+    _blockfrost_budget = RequestBudget(_args.blockfrost_daily_quota) if _args.blockfrost_daily_quota and _args.blockfrost_project else None
+    _blockfrost_api = KupoOgmiosBackend(_args.kupo_url, _args.ogmios_url) if _args.kupo_url else BlockfrostApi(
+            _args.blockfrost_project,
+            mainnet=_args.mainnet,
+            preview=_args.preview,
+            pool_size=_args.blockfrost_pool_size,
+            connect_timeout=_args.blockfrost_timeouts[0],
+            read_timeout=_args.blockfrost_timeouts[1],
+            http2=_args.blockfrost_http2,
+            incremental_utxos=_args.incremental_utxos,
+            reconcile_interval=_args.utxo_reconcile_interval,
+            cache=DiskCache(os.path.join(_args.output_dir, BLOCKFROST_CACHE_SUBDIR), _args.blockfrost_cache_mb * 1024 * 1024) if _args.blockfrost_cache_mb else None,
+            budget=_blockfrost_budget
+    )
+
+    _submit_endpoints = {'ogmios' if _args.kupo_url else 'blockfrost': _blockfrost_api}
+    _submit_endpoints.update({f"submit-api:{url}": SubmitApiEndpoint(url) for url in _args.submit_api_url})
+    _submit_endpoints.update({f"ogmios:{url}": OgmiosSubmitEndpoint(url) for url in _args.submit_ogmios_url})
+    _submitter = HedgedSubmitter(_submit_endpoints) if len(_submit_endpoints) > 1 else None
 
-    _blockfrost_protocol_params = _blockfrost_api.get_protocol_parameters()
-    _protocol_params = rewritten_protocol_params(_blockfrost_protocol_params, _args.output_dir)
-    max_txn_fee = (_blockfrost_protocol_params['min_fee_a'] * _blockfrost_protocol_params['max_tx_size']) + _blockfrost_protocol_params['min_fee_b']
-    print(f"Max txn fee is a * size(tx) + b: {max_txn_fee}");
-    _cardano_cli = CardanoCli(protocol_params=_protocol_params)
+    _protocol_params = ProtocolParameters(_blockfrost_api, _args.output_dir, epoch_schedule=get_epoch_schedule(_args))
+    _protocol_file = _protocol_params.load()
+    print(f"Max txn fee is a * size(tx) + b: {_protocol_params.max_txn_fee()}");
+    _cardano_cli = TXN_BUILDERS[_args.txn_builder](protocol_params=_protocol_file)
+
+    _chain_follower = ChainFollower(
+            _args.payment_addr,
+            OgmiosChainSync(_args.chain_sync_url),
+            os.path.join(_args.output_dir, CHAIN_SYNC_STATE_FILE),
+            bootstrap=_blockfrost_api,
+            on_utxo=lambda utxo: _poll_scheduler.notify() if _poll_scheduler else None
+    ) if _args.chain_sync_url else None
 
     _nft_vending_machine = NftVendingMachine(
             _args.payment_addr,
@@ -160,7 +197,15 @@ if __name__ == "__main__":
             _mint,
             _blockfrost_api,
             _cardano_cli,
-            mainnet=_args.mainnet
+            mainnet=_args.mainnet,
+            vend_workers=_args.vend_workers,
+            vend_batch_size=_args.vend_batch_size,
+            retry_scheduler=RetryScheduler(max_attempts=_args.max_vend_attempts),
+            journal=VendJournal(os.path.join(_args.output_dir, VEND_JOURNAL_FILE)),
+            in_memory=_args.in_memory_txns,
+            audit_sink=AuditSink() if _args.in_memory_txns and not _args.no_txn_audit else None,
+            utxo_source=_chain_follower,
+            submitter=_submitter
     )
     _nft_vending_machine.validate()
     print(f"Initialized vending machine with the following parameters")
@@ -169,9 +214,42 @@ if __name__ == "__main__":
     if _args.command == 'validate':
         print('Successfully validated vending machine configuration!')
     elif _args.command == 'run':
+        _poll_scheduler = AdaptivePollScheduler(_args.min_poll_wait, _args.max_poll_wait, budget=_blockfrost_budget)
         exclusions = set()
+        num_resumed = _nft_vending_machine.restore(_args.output_dir, LOCKED_SUBDIR, exclusions)
+        print(f"Restored {len(exclusions)} completed and {num_resumed} in-flight mint request(s) from the vend journal")
+        _protocol_params.start()
+        if _chain_follower and not _chain_follower.start(sync_timeout=_args.chain_sync_timeout):
+            print(f"WARNING: Chain follower did not catch up within {_args.chain_sync_timeout}s, listing the payment address through Blockfrost until it does")
+        _webhook_listener = WebhookListener(_nft_vending_machine, _args.webhook_secret, _args.webhook_port, notify=_poll_scheduler.notify) if _args.webhook_port else None
+        if _webhook_listener:
+            _webhook_listener.start()
+        _last_listing = 0
+        (_last_metrics_log, _last_latencies) = (0, None)
         while _program_is_running:
-            _nft_vending_machine.vend(_args.output_dir, LOCKED_SUBDIR, METADATA_SUBDIR, exclusions)
-            time.sleep(WAIT_TIMEOUT)
+            _list_address = not _webhook_listener or (time.time() - _last_listing) >= _args.webhook_safety_poll
+            try:
+                num_vended = _nft_vending_machine.vend(_args.output_dir, LOCKED_SUBDIR, METADATA_SUBDIR, exclusions, list_address=_list_address)
+                if _list_address:
+                    _last_listing = time.time()
+            except CircuitOpenError as e:
+                print(f"WARNING: Blockfrost is unavailable, skipping this poll ({e})")
+                num_vended = 0
+            if _blockfrost_budget and (time.time() - _last_metrics_log) >= _args.metrics_log_interval:
+                print(f"Blockfrost request budget: {json.dumps(_blockfrost_budget.metrics())}")
+                _last_metrics_log = time.time()
+            if _submitter and _submitter.latencies() != _last_latencies:
+                _last_latencies = _submitter.latencies()
+                print(f"Submission latencies: {json.dumps(_last_latencies)}")
+            _poll_scheduler.wait(num_vended)
+        if _webhook_listener:
+            _webhook_listener.stop()
+        if _chain_follower:
+            _chain_follower.stop()
+        if _nft_vending_machine.audit_sink:
+            _nft_vending_machine.audit_sink.close()
+        if _submitter:
+            _submitter.close()
+        _protocol_params.stop()
     else:
         raise ValueError(f"Unknown vending machine subcommand: {_args.subparser_name}")
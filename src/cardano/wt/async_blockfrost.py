@@ -0,0 +1,226 @@
+import asyncio
+import json
+import requests
+
+from http import HTTPStatus
+
+from cardano.wt.blockfrost import BlockfrostApi, Http2Response, PageWindow
+from cardano.wt.rate_limit import TokenBucket
+from cardano.wt.retry_policy import CircuitBreaker, RetryingCall, RetryPolicy
+from cardano.wt.single_flight import AsyncSingleFlight
+
+"""
+Asyncio-native version of BlockfrostApi (via the optional httpx dependency)
+with the same methods as coroutines.  Pass the sync client's rate_limiter,
+cache, retry_policy, and circuit_breaker to share them between both clients so
+they draw on one rate limit and see the same health of the API.
+
+Errors are raised as the same requests exceptions the sync client raises.
+Incremental UTxO discovery is only available on the sync client.
+"""
+class AsyncBlockfrostApi(object):
+
+    PREPROD_MAGIC = BlockfrostApi.PREPROD_MAGIC
+    PREVIEW_MAGIC = BlockfrostApi.PREVIEW_MAGIC
+
+    _APPLICATION_JSON = BlockfrostApi._APPLICATION_JSON
+    _UTXO_LIST_LIMIT = BlockfrostApi._UTXO_LIST_LIMIT
+
+    def __init__(self, project, mainnet=False, preview=False, max_get_retries=BlockfrostApi._MAX_GET_RETRIES, max_post_retries=BlockfrostApi._MAX_POST_RETRIES, pool_size=BlockfrostApi._POOL_SIZE, connect_timeout=BlockfrostApi._CONNECT_TIMEOUT_SEC, read_timeout=BlockfrostApi._READ_TIMEOUT_SEC, http2=False, api_base=None, rate_limiter=None, cache=None, page_window=BlockfrostApi._PAGE_WINDOW, retry_policy=None, circuit_breaker=None, coalesce_ttl=BlockfrostApi._COALESCE_TTL_SEC, budget=None):
+        try:
+            import httpx
+        except ImportError:
+            raise ValueError("Async support requires the 'async' extra (pip install cardano-nft-vending-machine[async])")
+        self.project = project
+        self.mainnet = mainnet
+        self.preview = preview
+        self.max_get_retries = max_get_retries
+        self.max_post_retries = max_post_retries
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.http2 = http2
+        self.api_base = api_base
+        self.rate_limiter = rate_limiter if rate_limiter else TokenBucket(BlockfrostApi._API_CALLS_PER_SEC, BlockfrostApi._API_BURST)
+        self.cache = cache
+        if page_window < 1:
+            raise ValueError(f"Must fetch at least one page at a time, found {page_window}")
+        self.page_window = page_window
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.circuit_breaker = circuit_breaker if circuit_breaker else CircuitBreaker()
+        self.coalesce_ttl = coalesce_ttl
+        self.budget = budget
+        self.__single_flight = AsyncSingleFlight(coalesce_ttl)
+        self.__httpx = httpx
+        self.__client = httpx.AsyncClient(
+            http2=http2,
+            headers={'project_id': project},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+        )
+
+    def __get_api_base(self):
+        return BlockfrostApi.api_base_url(self.api_base, self.mainnet, self.preview)
+
+    async def close(self):
+        await self.__client.aclose()
+
+    async def __request(self, method, resource, content_type, data=None):
+        # Surface transport failures as requests' exceptions so both clients retry (and raise) alike
+        try:
+            httpx_resp = await self.__client.request(
+                method,
+                f"{self.__get_api_base()}/{resource}",
+                headers={'Content-Type': content_type},
+                content=data
+            )
+        except self.__httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except self.__httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        return Http2Response(httpx_resp)
+
+    async def __call_with_retries(self, resource, call_func, max_retries, priority):
+        call = RetryingCall(self.retry_policy, self.circuit_breaker, max_retries)
+        while True:
+            call.before_attempt()
+            try:
+                if self.budget is not None:
+                    await asyncio.sleep(self.budget.pacing_delay(priority))
+                await self.rate_limiter.acquire_async(priority)
+                if self.budget is not None:
+                    self.budget.record(resource)
+                api_json = BlockfrostApi.parse_response(await call_func(), self.rate_limiter)
+                call.succeeded()
+                return api_json
+            except RetryingCall.RETRIED_ERRORS as e:
+                await asyncio.sleep(call.failed(e))
+            except Exception as e:
+                call.aborted(e)
+                raise e
+
+    async def __call_get_api(self, resource, priority=TokenBucket.NORMAL, immutable=False):
+        return await self.__single_flight.do(
+            resource,
+            lambda: self.__fetch_get_api(resource, priority, immutable),
+            ttl=self.coalesce_ttl if immutable else 0
+        )
+
+    async def __fetch_get_api(self, resource, priority, immutable):
+        # The disk cache blocks on file I/O, so it is kept off the event loop
+        loop = asyncio.get_running_loop()
+        if immutable and self.cache is not None:
+            cached = await loop.run_in_executor(None, self.cache.get, self.__get_api_base(), resource)
+            if cached is not None:
+                return cached
+        api_json = await self.__call_with_retries(
+            resource,
+            lambda: self.__request('GET', resource, AsyncBlockfrostApi._APPLICATION_JSON),
+            self.max_get_retries,
+            priority
+        )
+        if immutable and self.cache is not None:
+            await loop.run_in_executor(None, self.cache.put, self.__get_api_base(), resource, api_json)
+        return api_json
+
+    async def __get_page(self, resource, page, priority):
+        separator = '&' if '?' in resource else '?'
+        try:
+            return await self.__call_get_api(f"{resource}{separator}count={AsyncBlockfrostApi._UTXO_LIST_LIMIT}&page={page}", priority)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code != HTTPStatus.NOT_FOUND:
+                raise e
+            return []
+
+    async def __call_paginated_get_api(self, resource, priority=TokenBucket.NORMAL):
+        pages = PageWindow(self.page_window, AsyncBlockfrostApi._UTXO_LIST_LIMIT)
+        in_flight = [asyncio.ensure_future(self.__get_page(resource, page, priority)) for page in pages.first()]
+        try:
+            while in_flight:
+                arr_data = await in_flight.pop(0)
+                next_pages = pages.after(arr_data, len(in_flight))
+                if next_pages is None:
+                    yield arr_data
+                    return
+                in_flight.extend([asyncio.ensure_future(self.__get_page(resource, page, priority)) for page in next_pages])
+                yield arr_data
+        finally:
+            for page_task in in_flight:
+                page_task.cancel()
+
+    async def __call_post_api(self, content_type, resource, data):
+        return await self.__call_with_retries(
+            resource,
+            lambda: self.__request('POST', resource, content_type, data=data),
+            self.max_post_retries,
+            TokenBucket.HIGH
+        )
+
+    async def get_assets(self, policy_id):
+        assets = []
+        async for assets_data in self.__call_paginated_get_api(f"assets/policy/{policy_id}", TokenBucket.LOW):
+            assets += assets_data
+        return assets
+
+    async def get_asset(self, asset_id):
+        try:
+            return await self.__call_get_api(f"assets/{asset_id}", TokenBucket.LOW)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == HTTPStatus.NOT_FOUND:
+                return None
+            raise e
+
+    async def get_tx_utxos(self, txn_hash):
+        return await self.__call_get_api(f"txs/{txn_hash}/utxos", TokenBucket.HIGH, immutable=True)
+
+    async def get_inputs(self, txn_hash):
+        utxo_metadata = await self.get_tx_utxos(txn_hash)
+        return utxo_metadata['inputs']
+
+    async def get_outputs(self, txn_hash):
+        utxo_metadata = await self.get_tx_utxos(txn_hash)
+        return utxo_metadata['outputs']
+
+    async def get_txn(self, txn_hash):
+        try:
+            return await self.__call_get_api(f"txs/{txn_hash}", immutable=True)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == HTTPStatus.NOT_FOUND:
+                return None
+            raise e
+
+    async def get_metadata(self, txn_hash):
+        return await self.__call_get_api(f"txs/{txn_hash}/metadata", TokenBucket.LOW, immutable=True)
+
+    async def iter_utxos(self, address, exclusions):
+        """
+        :param address: Address whose UTxOs should be listed
+        :param exclusions: UTxOs to leave out (checked as each one is yielded)
+        :return: Async generator of the address's UTxOs, streamed page by page
+        """
+        yielded = set()
+        async for utxo_data in self.__call_paginated_get_api(f"addresses/{address}/utxos", TokenBucket.HIGH):
+            for raw_utxo in utxo_data:
+                utxo = BlockfrostApi.to_utxo(raw_utxo)
+                if utxo in exclusions or utxo in yielded:
+                    print(f'Skipping {utxo.hash}#{utxo.ix}')
+                    continue
+                yielded.add(utxo)
+                yield utxo
+
+    async def get_utxos(self, address, exclusions):
+        return [utxo async for utxo in self.iter_utxos(address, exclusions)]
+
+    async def get_tip(self):
+        tip = await self.__call_get_api('blocks/latest', TokenBucket.HIGH)
+        return {'slot': tip['slot'], 'id': tip['hash']}
+
+    async def get_protocol_parameters(self):
+        return await self.__call_get_api('epochs/latest/parameters')
+
+    async def submit_txn(self, signed_file):
+        with open(signed_file, 'r') as signed_filehandle:
+            tx_cbor = json.load(signed_filehandle)['cborHex']
+        return await self.submit_txn_cbor(bytes.fromhex(tx_cbor))
+
+    async def submit_txn_cbor(self, tx_cbor):
+        return await self.__call_post_api('application/cbor', 'tx/submit', tx_cbor)
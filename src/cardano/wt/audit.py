@@ -0,0 +1,56 @@
+import json
+import os
+import queue
+import threading
+
+"""
+Writes audit copies of vending machine artifacts (e.g., combined metadata and
+transactions) to disk on a background thread so that file I/O stays off the
+vending hot path.  Writes are best effort: failures are logged, not raised.
+"""
+class AuditSink(object):
+
+    _STOP = None
+
+    def __init__(self):
+        self.__queue = queue.Queue()
+        self.__writer = threading.Thread(target=self.__write_forever, name='audit-sink', daemon=True)
+        self.__writer.start()
+
+    def __write_forever(self):
+        while True:
+            entry = self.__queue.get()
+            try:
+                if entry is AuditSink._STOP:
+                    return
+                (path, contents) = entry
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'w') as audit_filehandle:
+                    audit_filehandle.write(contents)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"WARNING: Could not write audit file '{entry[0]}': {e}")
+            finally:
+                self.__queue.task_done()
+
+    def write_json(self, path, json_obj):
+        """
+        Queue a JSON document to be written to path.
+
+        :param path: Destination file
+        :param json_obj: JSON-serializable object (serialized immediately)
+        """
+        self.__queue.put((path, json.dumps(json_obj)))
+
+    def flush(self):
+        """
+        Block until every queued write has been attempted.
+        """
+        self.__queue.join()
+
+    def close(self):
+        """
+        Flush outstanding writes and stop the background writer.
+        """
+        self.__queue.put(AuditSink._STOP)
+        self.__writer.join()
@@ -1,133 +1,408 @@
-import json
+import collections
 import requests
 import time
 
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
+from requests.adapters import HTTPAdapter
 
 from cardano.wt import network
+from cardano.wt.chain_backend import ChainBackend
+from cardano.wt.rate_limit import TokenBucket
+from cardano.wt.retry_policy import CircuitBreaker, RetryingCall, RetryPolicy
+from cardano.wt.single_flight import SingleFlight
 from cardano.wt.utxo import Utxo, Balance
 
+"""
+Adapts an httpx response to the subset of the requests.Response interface used
+by BlockfrostApi (including raising requests' HTTPError on error statuses).
+"""
+class Http2Response(object):
+
+    def __init__(self, httpx_resp):
+        self.__httpx_resp = httpx_resp
+        self.url = str(httpx_resp.url)
+        self.status_code = httpx_resp.status_code
+        self.headers = httpx_resp.headers
+        self.text = httpx_resp.text
+
+    def json(self):
+        return self.__httpx_resp.json()
+
+    def raise_for_status(self):
+        if self.status_code >= HTTPStatus.BAD_REQUEST:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+"""
+Pooled HTTP/2 client (via the optional httpx dependency) with the same get/post
+interface as a requests.Session.
+"""
+class Http2Session(object):
+
+    def __init__(self, pool_size):
+        try:
+            import httpx
+        except ImportError:
+            raise ValueError("HTTP/2 support requires the 'http2' extra (pip install cardano-nft-vending-machine[http2])")
+        self.headers = {}
+        self.__client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+        self.__httpx = httpx
+
+    def __request(self, method, url, headers, timeout, data=None):
+        (connect_timeout, read_timeout) = timeout
+        # Surface transport failures as requests' exceptions so they are retried the same way
+        try:
+            httpx_resp = self.__client.request(
+                method,
+                url,
+                headers={**self.headers, **headers},
+                content=data,
+                timeout=self.__httpx.Timeout(read_timeout, connect=connect_timeout)
+            )
+        except self.__httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except self.__httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        return Http2Response(httpx_resp)
+
+    def get(self, url, headers={}, timeout=None):
+        return self.__request('GET', url, headers, timeout)
+
+    def post(self, url, headers={}, data=None, timeout=None):
+        return self.__request('POST', url, headers, timeout, data=data)
+
+    def close(self):
+        self.__client.close()
+
+"""
+Decides which pages of a paginated listing to request.  The first page is
+requested on its own, since most listings (e.g., a payment address between
+polls) fit on it; only once a full page shows there is more is a window of
+pages kept in flight.
+"""
+class PageWindow(object):
+
+    def __init__(self, window, page_size):
+        if window < 1:
+            raise ValueError(f"Must fetch at least one page at a time, found {window}")
+        self.window = window
+        self.page_size = page_size
+        self.__next_page = 1
+
+    def __take(self, count):
+        pages = list(range(self.__next_page, self.__next_page + count))
+        self.__next_page += count
+        return pages
+
+    def first(self):
+        return self.__take(1)
+
+    def after(self, page_data, num_in_flight):
+        """
+        :param page_data: Contents of the page just handed back
+        :param num_in_flight: Pages still requested but not yet handed back
+        :return: Pages to request next, or None if page_data was the last page
+        """
+        if len(page_data) < self.page_size:
+            return None
+        return self.__take(self.window - num_in_flight)
+
+"""
+Locally maintained view of the UTxOs sitting at one address, advanced by the
+transactions seen since a block-height cursor.
+"""
+class AddressUtxos(object):
+
+    def __init__(self):
+        self.utxos = {}
+        self.cursor = None
+        self.seen_at_cursor = set()
+        self.last_reconcile = 0
+
 """
 Repreentation of the Blockfrost web API used in retrieving metadata about txn i/o on the chain.
+All calls share one pooled, keep-alive HTTP session so repeated calls do not
+pay for a new TCP/TLS handshake.  Failed calls are retried according to a
+RetryPolicy, and a CircuitBreaker fails calls fast while Blockfrost is down.
+Concurrent GETs of the same resource share one call, and immutable resources
+are also shared with back-to-back callers for a few seconds.  An optional
+RequestBudget counts every call against the plan's daily quota and paces
+non-critical calls as the quota runs low.
 """
-class BlockfrostApi(object):
+class BlockfrostApi(ChainBackend):
 
     PREPROD_MAGIC = network.PREPROD_MAGIC
     PREVIEW_MAGIC = network.PREVIEW_MAGIC
 
+    _API_BURST = 500
     _API_CALLS_PER_SEC = 10
     _APPLICATION_JSON = 'application/json'
-    _BACKOFF_SEC = 10
+    _COALESCE_TTL_SEC = 2
+    _CONNECT_TIMEOUT_SEC = 5
     _MAX_GET_RETRIES = 9
     _MAX_POST_RETRIES = 2
+    _PAGE_WINDOW = 4
+    _POOL_SIZE = 10
+    _READ_TIMEOUT_SEC = 30
+    _RECONCILE_SEC = 900
     _UTXO_LIST_LIMIT = 100
 
-    def __init__(self, project, mainnet=False, preview=False, max_get_retries=_MAX_GET_RETRIES, max_post_retries=_MAX_POST_RETRIES):
+    def __init__(self, project, mainnet=False, preview=False, max_get_retries=_MAX_GET_RETRIES, max_post_retries=_MAX_POST_RETRIES, pool_size=_POOL_SIZE, connect_timeout=_CONNECT_TIMEOUT_SEC, read_timeout=_READ_TIMEOUT_SEC, http2=False, api_base=None, rate_limiter=None, cache=None, incremental_utxos=False, reconcile_interval=_RECONCILE_SEC, page_window=_PAGE_WINDOW, retry_policy=None, circuit_breaker=None, coalesce_ttl=_COALESCE_TTL_SEC, budget=None):
         self.project = project
         self.mainnet = mainnet
         self.preview = preview
         self.max_get_retries = max_get_retries
         self.max_post_retries = max_post_retries
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.http2 = http2
+        self.api_base = api_base
+        self.rate_limiter = rate_limiter if rate_limiter else TokenBucket(BlockfrostApi._API_CALLS_PER_SEC, BlockfrostApi._API_BURST)
+        self.cache = cache
+        self.incremental_utxos = incremental_utxos
+        self.reconcile_interval = reconcile_interval
+        if page_window < 1:
+            raise ValueError(f"Must fetch at least one page at a time, found {page_window}")
+        self.page_window = page_window
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.circuit_breaker = circuit_breaker if circuit_breaker else CircuitBreaker()
+        self.coalesce_ttl = coalesce_ttl
+        self.budget = budget
+        self.__single_flight = SingleFlight(coalesce_ttl)
+        self.__address_utxos = {}
+        self.__session = self.__new_session()
 
-    def __get_api_base(self):
-        identifier = 'mainnet' if self.mainnet else 'preview' if self.preview else 'preprod'
+    def __new_session(self):
+        if self.http2:
+            session = Http2Session(self.pool_size)
+        else:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        session.headers.update({'project_id': self.project})
+        return session
+
+    def api_base_url(api_base, mainnet, preview):
+        """
+        :param api_base: Explicit API base URL, if any (e.g., a self-hosted instance)
+        :return: The base URL of the Blockfrost API for the network
+        """
+        if api_base:
+            return api_base
+        identifier = 'mainnet' if mainnet else 'preview' if preview else 'preprod'
         return f"https://cardano-{identifier}.blockfrost.io/api/v0"
 
-    def __call_with_retries(self, call_func, max_retries):
-        retries = 0
+    def __get_api_base(self):
+        return BlockfrostApi.api_base_url(self.api_base, self.mainnet, self.preview)
+
+    def close(self):
+        self.__session.close()
+
+    def parse_response(api_resp, rate_limiter):
+        """
+        :param api_resp: Response of a Blockfrost call
+        :param rate_limiter: Limiter to drain if Blockfrost is throttling
+        :return: The response's JSON
+        :raises requests.exceptions.HTTPError: On an error status
+        """
+        if api_resp.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            rate_limiter.drain()
+        print(f"{api_resp.url}: ({api_resp.status_code})")
+        print(api_resp.text)
+        api_resp.raise_for_status()
+        return api_resp.json()
+
+    def __call_with_retries(self, resource, call_func, max_retries, priority):
+        call = RetryingCall(self.retry_policy, self.circuit_breaker, max_retries)
         while True:
+            call.before_attempt()
             try:
-                api_resp = call_func()
-                print(f"{api_resp.url}: ({api_resp.status_code})")
-                print(api_resp.text)
-                api_resp.raise_for_status()
-                return api_resp.json()
-            except requests.exceptions.HTTPError as e:
-                if retries < max_retries:
-                    retries += 1
-                    time.sleep(retries * BlockfrostApi._BACKOFF_SEC)
-                else:
-                    raise e
-
-    def __call_get_api(self, resource):
-        return self.__call_with_retries(
-            lambda: requests.get(f"{self.__get_api_base()}/{resource}", headers={'project_id': self.project, 'Content-Type': BlockfrostApi._APPLICATION_JSON}),
-            self.max_get_retries
+                if self.budget is not None:
+                    time.sleep(self.budget.pacing_delay(priority))
+                self.rate_limiter.acquire(priority)
+                if self.budget is not None:
+                    self.budget.record(resource)
+                api_json = BlockfrostApi.parse_response(call_func(), self.rate_limiter)
+                call.succeeded()
+                return api_json
+            except RetryingCall.RETRIED_ERRORS as e:
+                time.sleep(call.failed(e))
+            except Exception as e:
+                call.aborted(e)
+                raise e
+
+    def __call_get_api(self, resource, priority=TokenBucket.NORMAL, immutable=False):
+        # Results of mutable resources (e.g., address UTxOs) are only shared while the call is in flight
+        return self.__single_flight.do(
+            resource,
+            lambda: self.__fetch_get_api(resource, priority, immutable),
+            ttl=self.coalesce_ttl if immutable else 0
         )
 
-    def __call_paginated_get_api(self, resource):
-        current_page = 0
-        while True:
-            current_page += 1
-            arr_data = []
-            try:
-                arr_data = self.__call_get_api(f"{resource}?count={BlockfrostApi._UTXO_LIST_LIMIT}&page={current_page}")
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code != HTTPStatus.NOT_FOUND:
-                    raise e
-            yield arr_data
-            if len(arr_data) < BlockfrostApi._UTXO_LIST_LIMIT:
-                return
+    def __fetch_get_api(self, resource, priority, immutable):
+        # Only resources that can never change once they exist are cached (never address UTxOs or assets)
+        if immutable and self.cache is not None:
+            cached = self.cache.get(self.__get_api_base(), resource)
+            if cached is not None:
+                return cached
+        api_json = self.__call_with_retries(
+            resource,
+            lambda: self.__session.get(f"{self.__get_api_base()}/{resource}", headers={'Content-Type': BlockfrostApi._APPLICATION_JSON}, timeout=self.timeout),
+            self.max_get_retries,
+            priority
+        )
+        if immutable and self.cache is not None:
+            self.cache.put(self.__get_api_base(), resource, api_json)
+        return api_json
+
+    def __get_page(self, resource, page, priority):
+        separator = '&' if '?' in resource else '?'
+        try:
+            return self.__call_get_api(f"{resource}{separator}count={BlockfrostApi._UTXO_LIST_LIMIT}&page={page}", priority)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code != HTTPStatus.NOT_FOUND:
+                raise e
+            return []
+
+    def __call_paginated_get_api(self, resource, priority=TokenBucket.NORMAL):
+        # Pages in flight each still wait on the shared rate limiter, and are handed back in order
+        pages = PageWindow(self.page_window, BlockfrostApi._UTXO_LIST_LIMIT)
+        with ThreadPoolExecutor(max_workers=self.page_window) as fetcher:
+            in_flight = collections.deque([fetcher.submit(self.__get_page, resource, page, priority) for page in pages.first()])
+            while in_flight:
+                arr_data = in_flight.popleft().result()
+                next_pages = pages.after(arr_data, len(in_flight))
+                if next_pages is None:
+                    for page_future in in_flight:
+                        page_future.cancel()
+                    yield arr_data
+                    return
+                in_flight.extend([fetcher.submit(self.__get_page, resource, page, priority) for page in next_pages])
+                yield arr_data
 
     def __call_post_api(self, content_type, resource, data):
         return self.__call_with_retries(
-            lambda: requests.post(f"{self.__get_api_base()}/{resource}", headers={'project_id': self.project, 'Content-Type': content_type}, data=data),
-            self.max_post_retries
+            resource,
+            lambda: self.__session.post(f"{self.__get_api_base()}/{resource}", headers={'Content-Type': content_type}, data=data, timeout=self.timeout),
+            self.max_post_retries,
+            TokenBucket.HIGH
         )
 
     def get_assets(self, policy_id):
         assets = []
-        for assets_data in self.__call_paginated_get_api(f"assets/policy/{policy_id}"):
+        for assets_data in self.__call_paginated_get_api(f"assets/policy/{policy_id}", TokenBucket.LOW):
             assets += assets_data
         return assets
 
     def get_asset(self, asset_id):
         try:
-            return self.__call_get_api(f"assets/{asset_id}")
+            return self.__call_get_api(f"assets/{asset_id}", TokenBucket.LOW)
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == HTTPStatus.NOT_FOUND:
                 return None
             raise e
 
     def get_tx_utxos(self, txn_hash):
-        return self.__call_get_api(f"txs/{txn_hash}/utxos")
-
-    def get_inputs(self, txn_hash):
-        utxo_metadata = self.get_tx_utxos(txn_hash)
-        return utxo_metadata['inputs']
-
-    def get_outputs(self, txn_hash):
-        utxo_metadata = self.get_tx_utxos(txn_hash)
-        return utxo_metadata['outputs']
+        return self.__call_get_api(f"txs/{txn_hash}/utxos", TokenBucket.HIGH, immutable=True)
 
     def get_txn(self, txn_hash):
         try:
-            return self.__call_get_api(f"txs/{txn_hash}")
+            return self.__call_get_api(f"txs/{txn_hash}", immutable=True)
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == HTTPStatus.NOT_FOUND:
                 return None
             raise e
 
     def get_metadata(self, txn_hash):
-        return self.__call_get_api(f"txs/{txn_hash}/metadata")
+        return self.__call_get_api(f"txs/{txn_hash}/metadata", TokenBucket.LOW, immutable=True)
+
+    def to_utxo(raw_utxo):
+        balances = [Balance(int(balance['quantity']), balance['unit']) for balance in raw_utxo['amount']]
+        return Utxo(raw_utxo['tx_hash'], raw_utxo['output_index'], balances)
 
-    def get_utxos(self, address, exclusions):
-        available_utxos = list()
-        for utxo_data in self.__call_paginated_get_api(f"addresses/{address}/utxos"):
-            #print('EXCLUSIONS\t', [f'{utxo.hash}#{utxo.ix}' for utxo in exclusions])
+    def __list_utxos(self, address):
+        for utxo_data in self.__call_paginated_get_api(f"addresses/{address}/utxos", TokenBucket.HIGH):
             for raw_utxo in utxo_data:
-                balances = [Balance(int(balance['quantity']), balance['unit']) for balance in raw_utxo['amount']]
-                utxo = Utxo(raw_utxo['tx_hash'], raw_utxo['output_index'], balances)
-                if utxo in exclusions or utxo in available_utxos:
-                    print(f'Skipping {utxo.hash}#{utxo.ix}')
+                yield BlockfrostApi.to_utxo(raw_utxo)
+
+    def __reconcile_utxos(self, address, address_utxos):
+        tip = self.__call_get_api('blocks/latest', TokenBucket.HIGH)
+        reconciled = {}
+        for utxo in self.__list_utxos(address):
+            reconciled[utxo] = utxo
+        missed = [utxo for utxo in reconciled if not utxo in address_utxos.utxos]
+        if address_utxos.cursor is not None and missed:
+            print(f"Full reconciliation of {address} found {len(missed)} UTxO(s) missed incrementally")
+        address_utxos.utxos = reconciled
+        # The tip was read before the listing, so every transaction up to it is already reflected
+        address_utxos.cursor = tip['height'] + 1
+        address_utxos.seen_at_cursor = set()
+        address_utxos.last_reconcile = time.time()
+
+    def __apply_txn(self, address, txn_hash, address_utxos):
+        tx_utxos = self.get_tx_utxos(txn_hash)
+        for tx_input in tx_utxos['inputs']:
+            if tx_input['address'] == address and not tx_input.get('reference') and not tx_input.get('collateral'):
+                address_utxos.utxos.pop(Utxo(tx_input['tx_hash'], tx_input['output_index'], []), None)
+        for tx_output in tx_utxos['outputs']:
+            if tx_output['address'] == address and not tx_output.get('collateral'):
+                utxo = BlockfrostApi.to_utxo({**tx_output, 'tx_hash': txn_hash})
+                address_utxos.utxos[utxo] = utxo
+
+    def __advance_utxos(self, address, address_utxos):
+        # Blockfrost treats 'from' as inclusive, so transactions at the cursor height may be seen twice
+        resource = f"addresses/{address}/transactions?order=asc&from={address_utxos.cursor}"
+        for txn_data in self.__call_paginated_get_api(resource, TokenBucket.HIGH):
+            for raw_txn in txn_data:
+                if raw_txn['block_height'] > address_utxos.cursor:
+                    address_utxos.cursor = raw_txn['block_height']
+                    address_utxos.seen_at_cursor = set()
+                elif raw_txn['tx_hash'] in address_utxos.seen_at_cursor:
                     continue
-                available_utxos.append(utxo)
-        return available_utxos
+                self.__apply_txn(address, raw_txn['tx_hash'], address_utxos)
+                address_utxos.seen_at_cursor.add(raw_txn['tx_hash'])
+
+    def __incremental_utxos(self, address):
+        if not address in self.__address_utxos:
+            self.__address_utxos[address] = AddressUtxos()
+        address_utxos = self.__address_utxos[address]
+        if address_utxos.cursor is None or (time.time() - address_utxos.last_reconcile) > self.reconcile_interval:
+            self.__reconcile_utxos(address, address_utxos)
+        else:
+            self.__advance_utxos(address, address_utxos)
+        return list(address_utxos.utxos.values())
+
+    def iter_utxos(self, address, exclusions):
+        """
+        Stream an address's UTxOs page by page (fetching the next pages while
+        the current one is consumed) so callers can start on the first page
+        before the listing finishes.
+
+        :param address: Address whose UTxOs should be listed
+        :param exclusions: UTxOs to leave out (checked as each one is yielded)
+        :return: Generator of the address's UTxOs, either listed in full or (in
+            incremental mode) maintained from the transactions seen since the
+            last call
+        """
+        yielded = set()
+        utxos = self.__incremental_utxos(address) if self.incremental_utxos else self.__list_utxos(address)
+        for utxo in utxos:
+            if utxo in exclusions or utxo in yielded:
+                print(f'Skipping {utxo.hash}#{utxo.ix}')
+                continue
+            yielded.add(utxo)
+            yield utxo
+
+    def get_tip(self):
+        tip = self.__call_get_api('blocks/latest', TokenBucket.HIGH)
+        return {'slot': tip['slot'], 'id': tip['hash']}
 
     def get_protocol_parameters(self):
         return self.__call_get_api('epochs/latest/parameters')
 
-    def submit_txn(self, signed_file):
-        with open(signed_file, 'r') as signed_filehandle:
-            tx_cbor = json.load(signed_filehandle)['cborHex']
-        return self.__call_post_api('application/cbor', '/tx/submit', bytes.fromhex(tx_cbor))
+    def submit_txn_cbor(self, tx_cbor):
+        return self.__call_post_api('application/cbor', '/tx/submit', tx_cbor)
@@ -0,0 +1,115 @@
+import collections
+import threading
+import time
+
+from cardano.wt.rate_limit import TokenBucket
+
+"""
+Tracks Blockfrost calls against the plan's daily request quota (which resets at
+midnight UTC), per endpoint, and projects the day's usage from the rate so far.
+As the projection approaches the quota, non-critical (low priority) calls are
+paced first, then normal priority calls and mint request polling; critical
+calls are never delayed.
+"""
+class RequestBudget(object):
+
+    PRIORITY_THRESHOLDS = {
+        TokenBucket.LOW: 0.8,
+        TokenBucket.NORMAL: 1.0
+    }
+
+    _MAX_PACING_SEC = 60
+    _MAX_POLL_STRETCH = 10
+    _MIN_PROJECTION_SEC = 3600
+    _SEC_PER_DAY = 86400
+
+    def __init__(self, daily_quota, clock=time.time):
+        if daily_quota < 1:
+            raise ValueError(f"Daily request quota must be positive, found {daily_quota}")
+        self.daily_quota = daily_quota
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__day = None
+        self.__counts = collections.Counter()
+
+    def endpoint(resource):
+        """
+        :param resource: Blockfrost resource path (e.g., 'txs/<hash>/utxos?page=2')
+        :return: The endpoint it belongs to, with identifiers replaced by '{}'
+        """
+        path = resource.strip('/').split('?')[0]
+        return '/'.join(['{}' if any(char.isdigit() for char in segment) else segment for segment in path.split('/')])
+
+    def __roll_over(self, now):
+        day = int(now // RequestBudget._SEC_PER_DAY)
+        if day != self.__day:
+            self.__day = day
+            self.__counts = collections.Counter()
+
+    def record(self, resource):
+        """
+        :param resource: Resource of a call that was just sent to Blockfrost
+        """
+        with self.__lock:
+            self.__roll_over(self.__clock())
+            self.__counts[RequestBudget.endpoint(resource)] += 1
+
+    def __used(self):
+        return sum(self.__counts.values())
+
+    def __projected(self, now):
+        elapsed = now % RequestBudget._SEC_PER_DAY
+        rate = self.__used() / max(elapsed, RequestBudget._MIN_PROJECTION_SEC)
+        return self.__used() + rate * (RequestBudget._SEC_PER_DAY - elapsed)
+
+    def pressure(self):
+        """
+        :return: Projected end-of-day usage as a fraction of the quota
+        """
+        with self.__lock:
+            now = self.__clock()
+            self.__roll_over(now)
+            return self.__projected(now) / self.daily_quota
+
+    def pacing_delay(self, priority):
+        """
+        :param priority: TokenBucket priority of the call about to be made
+        :return: Seconds to wait first so that calls at this priority spread
+            what is left of the quota over the rest of the day (0 if unthrottled)
+        """
+        if not priority in RequestBudget.PRIORITY_THRESHOLDS:
+            return 0
+        with self.__lock:
+            now = self.__clock()
+            self.__roll_over(now)
+            if self.__projected(now) / self.daily_quota < RequestBudget.PRIORITY_THRESHOLDS[priority]:
+                return 0
+            remaining = max(self.daily_quota - self.__used(), 1)
+            return min(RequestBudget._MAX_PACING_SEC, (RequestBudget._SEC_PER_DAY - now % RequestBudget._SEC_PER_DAY) / remaining)
+
+    def poll_wait(self, wait):
+        """
+        :param wait: Seconds the poll scheduler would wait before the next poll
+        :return: The wait stretched in proportion to how far usage is projected
+            to exceed the quota
+        """
+        return wait * min(RequestBudget._MAX_POLL_STRETCH, max(1, self.pressure()))
+
+    def metrics(self):
+        """
+        :return: The day's usage, per endpoint and in total, against the quota
+        """
+        with self.__lock:
+            now = self.__clock()
+            self.__roll_over(now)
+            used = self.__used()
+            return {
+                'daily_quota': self.daily_quota,
+                'used': used,
+                'remaining': max(self.daily_quota - used, 0),
+                'projected': int(self.__projected(now)),
+                'endpoints': dict(self.__counts)
+            }
+
+    def remaining(self):
+        return self.metrics()['remaining']
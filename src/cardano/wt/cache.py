@@ -0,0 +1,110 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+
+"""
+Content-addressed, size-capped on-disk cache for JSON documents that never
+change (e.g., API responses for confirmed transactions).  Entries are named by
+a hash of their namespace and key and evicted least-recently-used first once
+the cache grows past its size cap.  Recency is tracked with file modification
+times, so it survives restarts.
+"""
+class DiskCache(object):
+
+    _MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, cache_dir, max_bytes=_MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError(f"Cache size cap must be positive, found {max_bytes}")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.__lock = threading.Lock()
+        self.__entries = collections.OrderedDict()
+        self.__total_bytes = 0
+        self.__load_index()
+
+    def __load_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached = []
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for filename in os.listdir(shard_dir):
+                if filename.endswith('.tmp'):
+                    continue
+                stat = os.stat(os.path.join(shard_dir, filename))
+                cached.append((stat.st_mtime_ns, filename, stat.st_size))
+        for (mtime, filename, size) in sorted(cached):
+            self.__entries[filename] = size
+            self.__total_bytes += size
+        self.__evict()
+
+    def __digest(self, namespace, key):
+        return hashlib.sha256(f"{namespace}:{key}".encode('UTF-8')).hexdigest()
+
+    def __path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def __evict(self):
+        while self.__total_bytes > self.max_bytes and self.__entries:
+            (digest, size) = self.__entries.popitem(last=False)
+            self.__total_bytes -= size
+            try:
+                os.remove(self.__path(digest))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+    def size(self):
+        """
+        :return: Total bytes currently stored in the cache
+        """
+        with self.__lock:
+            return self.__total_bytes
+
+    def get(self, namespace, key):
+        """
+        :param namespace: Separates otherwise identical keys (e.g., the network)
+        :param key: Identifier of the document (e.g., the resource path)
+        :return: The cached document or None if it is not cached
+        """
+        digest = self.__digest(namespace, key)
+        with self.__lock:
+            if not digest in self.__entries:
+                return None
+            try:
+                with open(self.__path(digest), 'r') as cache_filehandle:
+                    cached = json.load(cache_filehandle)
+                os.utime(self.__path(digest))
+            except (OSError, ValueError):
+                self.__total_bytes -= self.__entries.pop(digest)
+                return None
+            self.__entries.move_to_end(digest)
+            return cached
+
+    def put(self, namespace, key, document):
+        """
+        :param namespace: Separates otherwise identical keys (e.g., the network)
+        :param key: Identifier of the document (e.g., the resource path)
+        :param document: JSON-serializable document to cache
+        """
+        digest = self.__digest(namespace, key)
+        contents = json.dumps(document)
+        path = self.__path(digest)
+        with self.__lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as cache_filehandle:
+                cache_filehandle.write(contents)
+            os.replace(tmp_path, path)
+            if digest in self.__entries:
+                self.__total_bytes -= self.__entries.pop(digest)
+            self.__entries[digest] = os.stat(path).st_size
+            self.__total_bytes += self.__entries[digest]
+            self.__evict()
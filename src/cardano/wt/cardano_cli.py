@@ -1,4 +1,5 @@
 import json
+import math
 import os
 import subprocess
 import tempfile
@@ -6,6 +7,7 @@ import tempfile
 from deprecated import deprecated
 
 from cardano.wt import network
+from cardano.wt.fees import FeeCalculator
 from cardano.wt.utxo import Utxo
 
 """
@@ -14,9 +16,25 @@ cardano-cli *nix script representation in Python
 class CardanoCli(object):
 
     TXN_DIR = 'txn'
+    WITNESS_SIZE = FeeCalculator.WITNESS_SIZE
+
+    _MAX_FEE_ITERATIONS = 5
 
     def __init__(self, protocol_params=None):
         self.protocol_params = protocol_params
+        self.__fee_calculators = {}
+
+    def fee_calculator(self):
+        # Keyed on modification time so rewritten protocol parameters are picked up
+        protocol_key = (self.protocol_params, os.stat(self.protocol_params).st_mtime_ns)
+        if not protocol_key in self.__fee_calculators:
+            self.__fee_calculators = {protocol_key: FeeCalculator(self.protocol_params)}
+        return self.__fee_calculators[protocol_key]
+
+    def initial_fee(fee_calculator, witness_count, fee_step):
+        # The fee of an empty transaction is a lower bound that (at real-world fees) already has the
+        # final fee's CBOR width, so the first build's size is final and one rebuild settles the fee
+        return math.ceil(fee_calculator.min_fee(0, witness_count) / fee_step) * fee_step
 
     def __run_script(self, cardano_args):
         cmd = f'cardano-cli {cardano_args}'
@@ -56,6 +74,37 @@ class CardanoCli(object):
             mint_args.append(f"--invalid-hereafter {mint.expiration_slot}")
         return self.build_raw_txn(output_dir, txn_id, tx_in_args, tx_out_args, fee, metadata_json_file, mint_args)
 
+    def build_raw_mint_txn_at_min_fee(self, output_dir, txn_id, tx_in_args, tx_outs_for_fee, witness_count, metadata_json_file, mint, nft_policy_map, scripts_map, fee_step=1):
+        """
+        Build a mint transaction whose fee covers its own (signed) size.  The
+        fee is computed locally and the transaction rebuilt until the fee
+        reaches a fixed point (usually two builds in all).
+
+        :param tx_outs_for_fee: Function returning the --tx-out args that balance a given fee
+        :param witness_count: Number of keys that will sign the transaction
+        :param fee_step: The fee is rounded up to a multiple of this amount
+        :return: A tuple of the build file and the fee it pays
+        """
+        fee_calculator = self.fee_calculator()
+        fee = CardanoCli.initial_fee(fee_calculator, witness_count, fee_step)
+        for iteration in range(CardanoCli._MAX_FEE_ITERATIONS):
+            raw_build_file = self.build_raw_mint_txn(output_dir, txn_id, tx_in_args, tx_outs_for_fee(fee), fee, metadata_json_file, mint, nft_policy_map, scripts_map)
+            min_fee = fee_calculator.min_fee(self.txn_size(raw_build_file), witness_count)
+            if min_fee <= fee:
+                return (raw_build_file, fee)
+            fee = math.ceil(min_fee / fee_step) * fee_step
+        raise ValueError(f"Fee for {txn_id} did not converge after {CardanoCli._MAX_FEE_ITERATIONS} builds (last was {fee})")
+
+    def max_tx_size(self):
+        if not self.protocol_params:
+            return None
+        with open(self.protocol_params, 'r') as protocol_filehandle:
+            return json.load(protocol_filehandle)['maxTxSize']
+
+    def txn_size(self, build_file):
+        with open(build_file, 'r') as build_filehandle:
+            return len(bytes.fromhex(json.load(build_filehandle)['cborHex']))
+
     def calculate_min_fee(self, raw_build_file, tx_in_count, tx_out_count, witness_count):
         lovelace_fee_str = self.__run_script(
             f'transaction calculate-min-fee --tx-body-file {raw_build_file} --tx-in-count {tx_in_count} \
@@ -0,0 +1,102 @@
+import abc
+import json
+
+"""
+Source of the chain data the vending machine reads and the transactions it
+submits.  Every backend returns data in the shapes of the Blockfrost API (which
+was the first backend), so callers do not care where the data comes from.
+Subclasses must implement every abstract method (instantiating an incomplete
+backend raises TypeError); the rest are built on top of them.
+"""
+class ChainBackend(abc.ABC):
+
+    @abc.abstractmethod
+    def get_tx_utxos(self, txn_hash):
+        """
+        :param txn_hash: Hash of a transaction on chain
+        :return: The transaction's 'inputs' and 'outputs' (as in Blockfrost's
+            txs/{hash}/utxos)
+        """
+        pass
+
+    def get_inputs(self, txn_hash):
+        return self.get_tx_utxos(txn_hash)['inputs']
+
+    def get_outputs(self, txn_hash):
+        return self.get_tx_utxos(txn_hash)['outputs']
+
+    @abc.abstractmethod
+    def get_txn(self, txn_hash):
+        """
+        :param txn_hash: Hash of a transaction
+        :return: Information about the transaction, or None if it is not on chain
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_metadata(self, txn_hash):
+        """
+        :param txn_hash: Hash of a transaction on chain
+        :return: List of the transaction's metadata, one {'label', 'json_metadata'} per label
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_asset(self, asset_id):
+        """
+        :param asset_id: Policy ID followed by the hex asset name
+        :return: Information about the asset (including its 'quantity'), or None if it does not exist
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_assets(self, policy_id):
+        """
+        :param policy_id: Policy whose assets should be listed
+        :return: List of {'asset', 'quantity'} for every asset under the policy
+        """
+        pass
+
+    @abc.abstractmethod
+    def iter_utxos(self, address, exclusions):
+        """
+        :param address: Address whose UTxOs should be listed
+        :param exclusions: UTxOs to leave out
+        :return: Generator of the address's UTxOs
+        """
+        pass
+
+    def get_utxos(self, address, exclusions):
+        """
+        :param address: Address whose UTxOs should be listed
+        :param exclusions: UTxOs to leave out of the result
+        :return: List of the address's UTxOs (see iter_utxos)
+        """
+        return list(self.iter_utxos(address, exclusions))
+
+    @abc.abstractmethod
+    def get_tip(self):
+        """
+        :return: Point ({'slot', 'id'}) of the most recent block the backend has indexed
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_protocol_parameters(self):
+        """
+        :return: Current protocol parameters (as in Blockfrost's epochs/latest/parameters)
+        """
+        pass
+
+    def submit_txn(self, signed_file):
+        with open(signed_file, 'r') as signed_filehandle:
+            tx_cbor = json.load(signed_filehandle)['cborHex']
+        return self.submit_txn_cbor(bytes.fromhex(tx_cbor))
+
+    @abc.abstractmethod
+    def submit_txn_cbor(self, tx_cbor):
+        """
+        :param tx_cbor: Serialized signed transaction
+        :return: The submitted transaction's hash
+        """
+        pass
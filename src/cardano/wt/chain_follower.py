@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import time
+import traceback
+
+from cardano.wt.utxo import Utxo, Balance
+
+"""
+Block stream from Ogmios's chain-sync protocol (JSON-RPC over WebSocket, via
+the optional websocket-client dependency).  Blocks and points are returned in
+Ogmios's own (v6) format.
+"""
+class OgmiosChainSync(object):
+
+    ORIGIN = 'origin'
+
+    _TIMEOUT_SEC = 120
+
+    def __init__(self, url, timeout=_TIMEOUT_SEC):
+        try:
+            import websocket
+        except ImportError:
+            raise ValueError("Chain-sync requires the 'chainsync' extra (pip install cardano-nft-vending-machine[chainsync])")
+        self.url = url
+        self.timeout = timeout
+        self.__websocket = websocket
+        self.__connection = None
+
+    def connect(self):
+        self.close()
+        self.__connection = self.__websocket.create_connection(self.url, timeout=self.timeout)
+
+    def close(self):
+        if self.__connection:
+            self.__connection.close()
+            self.__connection = None
+
+    def __rpc(self, method, params=None):
+        request = {'jsonrpc': '2.0', 'method': method, 'id': None}
+        if params is not None:
+            request['params'] = params
+        self.__connection.send(json.dumps(request))
+        response = json.loads(self.__connection.recv())
+        if 'error' in response:
+            raise ValueError(f"Ogmios {method} failed: {response['error']}")
+        return response['result']
+
+    def tip(self):
+        """
+        :return: Point ({'slot', 'id'}) of the node's current tip
+        """
+        return self.__rpc('queryNetwork/tip')
+
+    def find_intersection(self, points):
+        """
+        :param points: Candidate points to resume from, most recent first
+        :return: The most recent of the points that is still on chain
+        :raises ValueError: If none of the points are on chain
+        """
+        return self.__rpc('findIntersection', {'points': points})['intersection']
+
+    def next_block(self):
+        """
+        :return: Either {'direction': 'forward', 'block', 'tip'} or
+            {'direction': 'backward', 'point', 'tip'} (blocks until a new
+            block arrives when already at the tip)
+        """
+        return self.__rpc('nextBlock')
+
+"""
+Follows the chain and keeps the set of UTxOs at one address (in memory and in
+a state file), so new mint requests are seen as soon as their block arrives
+without any per-poll API calls.  Rollbacks are undone from a log of the
+changes made by recent blocks.
+
+The follower is bootstrapped from a ChainBackend listing of the address, and
+afterwards resumes from the last point in its state file.  Use it as the
+vending machine's utxo_source, with on_utxo waking up the vend loop.  Until it
+has caught up to the tip (or while the node is unreachable) listings fall back
+to the bootstrap backend, so an Ogmios outage only costs API calls.
+"""
+class ChainFollower(object):
+
+    _RECONNECT_SEC = 5
+    _RESUME_POINTS = 20
+    _ROLLBACK_SLOTS = 129600    # Stability window (3k/f) on mainnet
+    _SAVE_INTERVAL_SEC = 30
+
+    def __init__(self, address, chain_sync, state_file, bootstrap=None, on_utxo=None):
+        self.address = address
+        self.chain_sync = chain_sync
+        self.state_file = state_file
+        self.bootstrap = bootstrap
+        self.on_utxo = on_utxo
+        self.__lock = threading.Lock()
+        self.__utxos = {}
+        self.__history = []
+        self.__point = None
+        self.__dirty = False
+        self.__last_save = 0
+        self.__synced = threading.Event()
+        self.__stopped = threading.Event()
+        self.__follower = None
+        self.__load()
+
+    def __to_json(utxo):
+        return [utxo.hash, utxo.ix, [[balance.lovelace, balance.policy] for balance in utxo.balances]]
+
+    def __from_json(utxo_json):
+        (utxo_hash, utxo_ix, balances) = utxo_json
+        return Utxo(utxo_hash, utxo_ix, [Balance(balance[0], balance[1]) for balance in balances])
+
+    def __load(self):
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file, 'r') as state_filehandle:
+            state = json.load(state_filehandle)
+        if state['address'] != self.address:
+            raise ValueError(f"State file '{self.state_file}' follows {state['address']}, not {self.address}")
+        self.__point = state['point']
+        self.__utxos = {utxo: utxo for utxo in [ChainFollower.__from_json(utxo_json) for utxo_json in state['utxos']]}
+        self.__history = state['history']
+
+    def __save(self):
+        with self.__lock:
+            state = {
+                'address': self.address,
+                'point': self.__point,
+                'utxos': [ChainFollower.__to_json(utxo) for utxo in self.__utxos.values()],
+                'history': self.__history
+            }
+            self.__dirty = False
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w') as state_filehandle:
+            json.dump(state, state_filehandle)
+        os.replace(tmp_file, self.state_file)
+        self.__last_save = time.time()
+
+    def __slot(point):
+        return -1 if point == OgmiosChainSync.ORIGIN else point['slot']
+
+    def __resume_points(self):
+        points = [self.__point] if self.__point else []
+        for entry in reversed(self.__history[-ChainFollower._RESUME_POINTS:]):
+            if entry['point'] != self.__point:
+                points.append(entry['point'])
+        return points
+
+    def __bootstrap(self):
+        if not self.bootstrap:
+            raise ValueError(f"Cannot follow {self.address} without a state file or a backend to bootstrap from")
+        # The backend (e.g., Blockfrost) can lag the node, so the sync resumes from the backend's own tip, read
+        # before the listing: replaying from there can only re-apply changes already listed, never miss any
+        tip = self.bootstrap.get_tip()
+        utxos = self.bootstrap.get_utxos(self.address, set())
+        with self.__lock:
+            self.__utxos = {utxo: utxo for utxo in utxos}
+            self.__history = []
+            self.__point = tip
+        print(f"Bootstrapped {len(utxos)} UTxO(s) at {self.address} as of {tip}")
+        self.__save()
+        self.chain_sync.find_intersection([tip])
+
+    def __intersect(self):
+        resume_points = self.__resume_points()
+        if resume_points:
+            try:
+                intersection = self.chain_sync.find_intersection(resume_points)
+                print(f"Resuming chain-sync for {self.address} from {intersection}")
+                return
+            except ValueError as e:
+                print(f"WARNING: Could not resume chain-sync from saved state ({e}), bootstrapping again")
+        self.__bootstrap()
+
+    def __produced(txn):
+        outputs = txn.get('outputs', [])
+        if txn.get('spends', 'inputs') == 'inputs':
+            return (txn.get('inputs', []), list(enumerate(outputs)))
+        # Transactions failing phase-2 validation only consume collateral (and return the change after the outputs)
+        collateral_return = [(len(outputs), txn['collateralReturn'])] if txn.get('collateralReturn') else []
+        return (txn.get('collaterals', []), collateral_return)
+
+    def __to_balances(value):
+        balances = [Balance(value['ada']['lovelace'], Balance.LOVELACE_POLICY)]
+        for policy, assets in value.items():
+            if policy == 'ada':
+                continue
+            for asset_name, quantity in assets.items():
+                balances.append(Balance(quantity, f"{policy}{asset_name}"))
+        return balances
+
+    def __roll_forward(self, block):
+        added = []
+        with self.__lock:
+            changes = []
+            for txn in block.get('transactions', []):
+                (consumed, produced) = ChainFollower.__produced(txn)
+                for tx_in in consumed:
+                    spent = self.__utxos.pop(Utxo(tx_in['transaction']['id'], tx_in['index'], []), None)
+                    if spent:
+                        changes.append(['remove', ChainFollower.__to_json(spent)])
+                for (output_ix, output) in produced:
+                    if output['address'] != self.address:
+                        continue
+                    utxo = Utxo(txn['id'], output_ix, ChainFollower.__to_balances(output['value']))
+                    self.__utxos[utxo] = utxo
+                    changes.append(['add', ChainFollower.__to_json(utxo)])
+                    added.append(utxo)
+            self.__point = {'slot': block['slot'], 'id': block['id']}
+            if changes:
+                self.__history.append({'point': self.__point, 'changes': changes})
+                self.__dirty = True
+            oldest_slot = block['slot'] - ChainFollower._ROLLBACK_SLOTS
+            self.__history = [entry for entry in self.__history if entry['point']['slot'] > oldest_slot]
+        for utxo in added:
+            print(f"Chain-sync found {utxo} at {self.address}")
+            if self.on_utxo:
+                self.on_utxo(utxo)
+
+    def __roll_backward(self, point):
+        rollback_slot = ChainFollower.__slot(point)
+        with self.__lock:
+            while self.__history and self.__history[-1]['point']['slot'] > rollback_slot:
+                entry = self.__history.pop()
+                print(f"Rolling back changes to {self.address} from {entry['point']}")
+                for (change, utxo_json) in reversed(entry['changes']):
+                    utxo = ChainFollower.__from_json(utxo_json)
+                    if change == 'add':
+                        self.__utxos.pop(utxo, None)
+                    else:
+                        self.__utxos[utxo] = utxo
+                self.__dirty = True
+            self.__point = None if point == OgmiosChainSync.ORIGIN else point
+
+    def __sync(self):
+        self.chain_sync.connect()
+        self.__intersect()
+        while not self.__stopped.is_set():
+            result = self.chain_sync.next_block()
+            if result['direction'] == 'forward':
+                self.__roll_forward(result['block'])
+                point = result['block']
+            else:
+                self.__roll_backward(result['point'])
+                point = result['point']
+            if ChainFollower.__slot(point) >= ChainFollower.__slot(result['tip']):
+                self.__synced.set()
+            if self.__dirty or (time.time() - self.__last_save) > ChainFollower._SAVE_INTERVAL_SEC:
+                self.__save()
+
+    def __follow(self):
+        while not self.__stopped.is_set():
+            try:
+                self.__sync()
+            except Exception as e:
+                if self.__stopped.is_set():
+                    break
+                self.__synced.clear()
+                print(traceback.format_exc())
+                print(f"WARNING: Chain-sync for {self.address} failed ({e}), reconnecting in {ChainFollower._RECONNECT_SEC}s")
+                self.__stopped.wait(ChainFollower._RECONNECT_SEC)
+            finally:
+                self.chain_sync.close()
+
+    def start(self, sync_timeout=None):
+        """
+        Start following the chain on a background thread.
+
+        :param sync_timeout: Seconds to wait for the follower to catch up to the
+            tip (None waits indefinitely)
+        :return: Whether the follower caught up to the tip in time
+        """
+        self.__stopped.clear()
+        self.__follower = threading.Thread(target=self.__follow, name='chain-follower', daemon=True)
+        self.__follower.start()
+        return self.__synced.wait(sync_timeout)
+
+    def stop(self):
+        self.__stopped.set()
+        self.chain_sync.close()
+        if self.__follower:
+            self.__follower.join()
+        self.__save()
+
+    def is_synced(self):
+        return self.__synced.is_set()
+
+    def iter_utxos(self, address, exclusions):
+        """
+        :param address: Must be the followed address
+        :param exclusions: UTxOs to leave out
+        :return: Generator over the followed address's UTxOs as of the latest block
+            (or as listed by the bootstrap backend while not caught up)
+        """
+        if address != self.address:
+            raise ValueError(f"Chain follower tracks {self.address}, not {address}")
+        if not self.__synced.is_set() and self.bootstrap is not None:
+            yield from self.bootstrap.iter_utxos(address, exclusions)
+            return
+        with self.__lock:
+            utxos = list(self.__utxos.values())
+        for utxo in utxos:
+            if utxo in exclusions:
+                print(f'Skipping {utxo.hash}#{utxo.ix}')
+                continue
+            yield utxo
+
+    def get_utxos(self, address, exclusions):
+        return list(self.iter_utxos(address, exclusions))
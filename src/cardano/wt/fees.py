@@ -0,0 +1,36 @@
+import json
+
+"""
+Computes Cardano's linear minimum fee (min_fee_a * size + min_fee_b) locally
+from the protocol parameters instead of asking cardano-cli for it.  Witnesses
+are added after the fee is set, so their size is estimated from the number of
+signers.
+"""
+class FeeCalculator(object):
+
+    WITNESS_SIZE = 101              # CBOR size of a single [vkey, signature] witness
+    WITNESS_SET_OVERHEAD = 3        # Map key and array header for the vkey witnesses
+
+    def __init__(self, protocol_params):
+        with open(protocol_params, 'r') as protocol_filehandle:
+            protocol_json = json.load(protocol_filehandle)
+        self.fee_per_byte = protocol_json['txFeePerByte']
+        self.fee_fixed = protocol_json['txFeeFixed']
+
+    def witnessed_size(self, txn_size, witness_count):
+        """
+        :param txn_size: Size in bytes of the unsigned transaction
+        :param witness_count: Number of keys that will sign the transaction
+        :return: Estimated size in bytes of the signed transaction
+        """
+        if not witness_count:
+            return txn_size
+        return txn_size + FeeCalculator.WITNESS_SET_OVERHEAD + (witness_count * FeeCalculator.WITNESS_SIZE)
+
+    def min_fee(self, txn_size, witness_count):
+        """
+        :param txn_size: Size in bytes of the unsigned transaction
+        :param witness_count: Number of keys that will sign the transaction
+        :return: Minimum fee in lovelace for the signed transaction
+        """
+        return (self.fee_per_byte * self.witnessed_size(txn_size, witness_count)) + self.fee_fixed
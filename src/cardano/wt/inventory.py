@@ -0,0 +1,193 @@
+import json
+import os
+import random
+import shutil
+import threading
+import time
+
+"""
+In-memory index of the NFT metadata files that are still available to vend.
+The index is built once from the metadata directory and then kept in sync by
+watching the directory's modification time (e.g., when the vending machine is
+restocked), so reserving NFTs does not require listing the directory again.
+
+By default NFTs are handed out in sorted filename order.  Once randomize() is
+called they are instead handed out in a pre-shuffled order that is persisted
+to disk alongside a cursor, so the order survives restarts and can be audited.
+"""
+class Inventory(object):
+
+    _RESCAN_SEC = 60
+
+    def __init__(self, nfts_dir):
+        self.nfts_dir = nfts_dir
+        self.__lock = threading.Lock()
+        self.__known = set()
+        self.__available = set()
+        self.__sorted = []
+        self.__order_file = None
+        self.__seed = None
+        self.__order = []
+        self.__cursor = 0
+        self.__dir_mtime = None
+        self.__last_scan = 0
+        self.refresh()
+
+    def __dir_changed(self):
+        return os.stat(self.nfts_dir).st_mtime_ns != self.__dir_mtime or (time.time() - self.__last_scan) > Inventory._RESCAN_SEC
+
+    def __cursor_file(self):
+        return f"{self.__order_file}.cursor"
+
+    def __write_atomically(self, path, contents):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as tmp_file:
+            tmp_file.write(contents)
+        os.replace(tmp_path, path)
+
+    def __persist_order(self):
+        self.__write_atomically(self.__order_file, json.dumps({'seed': self.__seed, 'order': self.__order}))
+
+    def __persist_cursor(self):
+        self.__write_atomically(self.__cursor_file(), str(self.__cursor))
+
+    def __shuffled(self, filenames):
+        # Seeded by the permutation length so appending a restock is reproducible
+        shuffled = sorted(filenames)
+        rng = random.Random(f"{self.__seed}:{len(self.__order)}")
+        for idx in range(len(shuffled) - 1, 0, -1):
+            swap_idx = rng.randint(0, idx)
+            shuffled[idx], shuffled[swap_idx] = shuffled[swap_idx], shuffled[idx]
+        return shuffled
+
+    def __add_to_order(self, filenames):
+        unordered = set(filenames) - set(self.__order[self.__cursor:])
+        if not unordered:
+            return
+        self.__order.extend(self.__shuffled(unordered))
+        self.__persist_order()
+
+    def __rescan(self):
+        self.__dir_mtime = os.stat(self.nfts_dir).st_mtime_ns
+        self.__last_scan = time.time()
+        listing = set(os.listdir(self.nfts_dir))
+        restocked = listing - self.__known
+        if restocked:
+            print(f"Found {len(restocked)} new NFT(s) in '{self.nfts_dir}', adding to inventory")
+        self.__known = listing
+        self.__available = (self.__available & listing) | restocked
+        if restocked:
+            self.__sorted = sorted(self.__available, reverse=True)
+            if self.__order_file:
+                self.__add_to_order(restocked)
+
+    def refresh(self):
+        """
+        Re-index the metadata directory, but only if it was modified since the
+        last time it was indexed by this object.
+        """
+        with self.__lock:
+            if self.__dir_changed():
+                self.__rescan()
+
+    def randomize(self, order_file, seed):
+        """
+        Hand out NFTs in a random order that is generated once (Fisher-Yates,
+        seeded) and persisted to order_file along with a cursor recording how
+        far into the order the vending machine has gotten.  If order_file
+        already exists the persisted order and cursor are reused.  Calling this
+        again with the same file is a no-op.
+
+        :param order_file: Where the permutation is stored on disk
+        :param seed: Seed used to generate the permutation
+        """
+        with self.__lock:
+            if self.__order_file == order_file:
+                return
+            self.__order_file = order_file
+            self.__seed = seed
+            self.__order = []
+            self.__cursor = 0
+            if os.path.exists(order_file):
+                with open(order_file, 'r') as order_filehandle:
+                    persisted = json.load(order_filehandle)
+                if persisted['seed'] != seed:
+                    raise ValueError(f"Random order in '{order_file}' was generated with seed {persisted['seed']}, not {seed}")
+                self.__order = persisted['order']
+                if os.path.exists(self.__cursor_file()):
+                    with open(self.__cursor_file(), 'r') as cursor_filehandle:
+                        self.__cursor = int(cursor_filehandle.read())
+                print(f"Resuming random order from '{order_file}' at position {self.__cursor} of {len(self.__order)}")
+            self.__add_to_order(self.__available)
+            self.__persist_cursor()
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__available)
+
+    def __pop(self):
+        if not self.__order_file:
+            while self.__sorted:
+                filename = self.__sorted.pop()
+                if filename in self.__available:
+                    return filename
+            return None
+        while self.__cursor < len(self.__order):
+            filename = self.__order[self.__cursor]
+            self.__cursor += 1
+            if filename in self.__available:
+                return filename
+        return None
+
+    def reserve(self, num_nfts, locked_dir):
+        """
+        Remove NFTs from the inventory by moving their metadata files into the
+        locked directory.
+
+        :param num_nfts: How many NFTs to reserve
+        :param locked_dir: Directory where reserved metadata files are moved
+        :return: The filenames of the reserved NFTs (now in locked_dir)
+        """
+        reserved = []
+        with self.__lock:
+            if self.__dir_changed():
+                self.__rescan()
+            while len(reserved) < num_nfts and self.__available:
+                filename = self.__pop()
+                if not filename:
+                    break
+                self.__available.remove(filename)
+                try:
+                    shutil.move(os.path.join(self.nfts_dir, filename), os.path.join(locked_dir, filename))
+                except FileNotFoundError:
+                    print(f"WARNING: '{filename}' was removed from '{self.nfts_dir}' outside of the vending machine, skipping...")
+                    continue
+                reserved.append(filename)
+            self.__dir_mtime = os.stat(self.nfts_dir).st_mtime_ns
+            if self.__order_file:
+                self.__persist_cursor()
+        if len(reserved) < num_nfts:
+            raise ValueError(f"Only able to reserve {len(reserved)} of {num_nfts} NFTs from '{self.nfts_dir}'")
+        return reserved
+
+    def release(self, filenames, locked_dir):
+        """
+        Return previously reserved NFTs to the inventory (e.g., if the vend
+        they were reserved for could not go through).  They will be the next
+        NFTs handed out.
+
+        :param filenames: Filenames returned by reserve()
+        :param locked_dir: Directory the files were reserved into
+        """
+        if not filenames:
+            return
+        with self.__lock:
+            for filename in filenames:
+                shutil.move(os.path.join(locked_dir, filename), os.path.join(self.nfts_dir, filename))
+                self.__known.add(filename)
+                self.__available.add(filename)
+            self.__sorted.extend(reversed(filenames))
+            if self.__order_file:
+                self.__order[self.__cursor:self.__cursor] = filenames
+                self.__persist_order()
+            self.__dir_mtime = os.stat(self.nfts_dir).st_mtime_ns
@@ -0,0 +1,147 @@
+import json
+import sqlite3
+import threading
+import time
+
+from cardano.wt.utxo import Utxo, Balance
+
+"""
+The most recent journal entry for a single mint request UTxO.
+"""
+class JournalEntry(object):
+
+    def __init__(self, utxo, stage, txn_id, details, recorded_at):
+        self.utxo = utxo
+        self.stage = stage
+        self.txn_id = txn_id
+        self.details = details
+        self.recorded_at = recorded_at
+
+    def __repr__(self):
+        return f"{self.utxo} ({self.stage} @ {self.recorded_at})"
+
+"""
+Append-only, crash-safe record of how far each mint request has progressed
+through the vending pipeline, stored in SQLite (WAL mode).  On restart the
+journal tells the vending machine which requests were already submitted (and
+so must be excluded) and which were in flight (and can be resumed with the
+inventory that was already reserved for them).
+"""
+class VendJournal(object):
+
+    RESERVED = 'reserved'
+    BUILT = 'built'
+    SIGNED = 'signed'
+    SUBMITTED = 'submitted'
+    CONFIRMED = 'confirmed'
+    DEAD_LETTER = 'dead_letter'
+
+    IN_FLIGHT_STAGES = [RESERVED, BUILT, SIGNED]
+    EXCLUDED_STAGES = [SUBMITTED, CONFIRMED, DEAD_LETTER]
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.__conn.execute('PRAGMA journal_mode=WAL')
+        self.__conn.execute('PRAGMA synchronous=NORMAL')
+        self.__conn.execute(
+            'CREATE TABLE IF NOT EXISTS vend_journal ('
+            '  id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            '  utxo_hash TEXT NOT NULL,'
+            '  utxo_ix INTEGER NOT NULL,'
+            '  stage TEXT NOT NULL,'
+            '  txn_id TEXT,'
+            '  details TEXT,'
+            '  recorded_at REAL NOT NULL'
+            ')'
+        )
+        self.__conn.execute('CREATE INDEX IF NOT EXISTS vend_journal_utxo ON vend_journal (utxo_hash, utxo_ix)')
+        # One row per mint request holding its latest stage (and all of its details merged), kept in step with the
+        # append-only log above so that restarts read the current state by stage instead of replaying the history
+        has_latest = self.__conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vend_latest'").fetchone()
+        self.__conn.execute(
+            'CREATE TABLE IF NOT EXISTS vend_latest ('
+            '  utxo_hash TEXT NOT NULL,'
+            '  utxo_ix INTEGER NOT NULL,'
+            '  stage TEXT NOT NULL,'
+            '  txn_id TEXT,'
+            '  details TEXT NOT NULL,'
+            '  recorded_at REAL NOT NULL,'
+            '  PRIMARY KEY (utxo_hash, utxo_ix)'
+            ')'
+        )
+        self.__conn.execute('CREATE INDEX IF NOT EXISTS vend_latest_stage ON vend_latest (stage)')
+        if not has_latest:
+            self.__backfill_latest()
+
+    def __backfill_latest(self):
+        rows = self.__conn.execute(
+            'SELECT utxo_hash, utxo_ix, stage, txn_id, details, recorded_at FROM vend_journal ORDER BY id'
+        ).fetchall()
+        self.__conn.execute('BEGIN')
+        for (utxo_hash, utxo_ix, stage, txn_id, details, recorded_at) in rows:
+            self.__update_latest(utxo_hash, utxo_ix, stage, txn_id, details, recorded_at)
+        self.__conn.execute('COMMIT')
+
+    def __update_latest(self, utxo_hash, utxo_ix, stage, txn_id, details_json, recorded_at):
+        row = self.__conn.execute(
+            'SELECT details FROM vend_latest WHERE utxo_hash = ? AND utxo_ix = ?', (utxo_hash, utxo_ix)
+        ).fetchone()
+        merged_details = json.loads(row[0]) if row else {}
+        if details_json:
+            merged_details.update(json.loads(details_json))
+        self.__conn.execute(
+            'INSERT INTO vend_latest (utxo_hash, utxo_ix, stage, txn_id, details, recorded_at) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (utxo_hash, utxo_ix) DO UPDATE SET stage = excluded.stage, txn_id = excluded.txn_id, '
+            'details = excluded.details, recorded_at = excluded.recorded_at',
+            (utxo_hash, utxo_ix, stage, txn_id, json.dumps(merged_details), recorded_at)
+        )
+
+    def record(self, utxo, stage, txn_id=None, details=None):
+        """
+        Append a stage transition for a mint request.
+
+        :param utxo: The mint request UTxO
+        :param stage: One of the stage constants on this class
+        :param txn_id: Identifier of the vending machine transaction, if any
+        :param details: JSON-serializable information needed to resume
+        """
+        details_json = json.dumps(details) if details is not None else None
+        recorded_at = time.time()
+        with self.__lock:
+            self.__conn.execute('BEGIN')
+            try:
+                self.__conn.execute(
+                    'INSERT INTO vend_journal (utxo_hash, utxo_ix, stage, txn_id, details, recorded_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (utxo.hash, utxo.ix, stage, txn_id, details_json, recorded_at)
+                )
+                self.__update_latest(utxo.hash, utxo.ix, stage, txn_id, details_json, recorded_at)
+            except Exception:
+                self.__conn.execute('ROLLBACK')
+                raise
+            self.__conn.execute('COMMIT')
+
+    def latest(self, stages=None):
+        """
+        :param stages: Only return requests whose latest stage is in this list
+        :return: The latest JournalEntry of every (matching) mint request, with
+            the details of all of its journaled stages merged together
+        """
+        query = 'SELECT utxo_hash, utxo_ix, stage, txn_id, details, recorded_at FROM vend_latest'
+        params = []
+        if stages:
+            query += f" WHERE stage IN ({', '.join('?' * len(stages))})"
+            params = list(stages)
+        with self.__lock:
+            rows = self.__conn.execute(f"{query} ORDER BY rowid", params).fetchall()
+        entries = []
+        for (utxo_hash, utxo_ix, stage, txn_id, details_json, recorded_at) in rows:
+            details = json.loads(details_json)
+            balances = [Balance(balance[0], balance[1]) for balance in details.get('balances', [])]
+            entries.append(JournalEntry(Utxo(utxo_hash, utxo_ix, balances), stage, txn_id, details, recorded_at))
+        return entries
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
@@ -0,0 +1,199 @@
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from cardano.wt.blockfrost import BlockfrostApi
+from cardano.wt.chain_backend import ChainBackend
+
+"""
+Chain backend for a self-hosted Kupo indexer (chain reads) and Ogmios (protocol
+parameters and submission) over local HTTP, with no request quota.  Results are
+translated into the shapes of the Blockfrost API.
+
+Kupo must index every output (--match "*") without pruning spent ones, since
+the inputs of a mint request come from other wallets.  Ogmios is spoken to
+with its JSON-RPC over HTTP interface (Ogmios v6+).
+"""
+class KupoOgmiosBackend(ChainBackend):
+
+    _ASSET_SEPARATOR = '.'
+    _CONNECT_TIMEOUT_SEC = 2
+    _HEX_PREFIX = '0x'
+    _POLICY_ID_LEN = 56
+    _POOL_SIZE = 10
+    _READ_TIMEOUT_SEC = 10
+
+    def __init__(self, kupo_url, ogmios_url, pool_size=_POOL_SIZE, connect_timeout=_CONNECT_TIMEOUT_SEC, read_timeout=_READ_TIMEOUT_SEC):
+        self.kupo_url = kupo_url.rstrip('/')
+        self.ogmios_url = ogmios_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.__session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.__session.mount('https://', adapter)
+        self.__session.mount('http://', adapter)
+
+    def close(self):
+        self.__session.close()
+
+    def __kupo(self, resource):
+        kupo_resp = self.__session.get(f"{self.kupo_url}/{resource}", timeout=self.timeout)
+        kupo_resp.raise_for_status()
+        return kupo_resp.json()
+
+    def __ogmios(self, method, params=None):
+        request = {'jsonrpc': '2.0', 'method': method, 'id': None}
+        if params is not None:
+            request['params'] = params
+        ogmios_resp = self.__session.post(self.ogmios_url, json=request, timeout=self.timeout)
+        try:
+            response = ogmios_resp.json()
+        except ValueError:
+            ogmios_resp.raise_for_status()
+            raise
+        if 'error' in response:
+            raise ValueError(f"Ogmios {method} failed: {response['error']}")
+        ogmios_resp.raise_for_status()
+        return response['result']
+
+    def __to_amount(value):
+        amount = [{'unit': 'lovelace', 'quantity': str(value['coins'])}]
+        for asset, quantity in value.get('assets', {}).items():
+            amount.append({'unit': asset.replace(KupoOgmiosBackend._ASSET_SEPARATOR, ''), 'quantity': str(quantity)})
+        return amount
+
+    def __to_output(match):
+        return {
+            'address': match['address'],
+            'amount': KupoOgmiosBackend.__to_amount(match['value']),
+            'tx_hash': match['transaction_id'],
+            'output_index': match['output_index'],
+            'data_hash': match.get('datum_hash'),
+            'reference_script_hash': match.get('script_hash'),
+            'collateral': False,
+            'reference': False
+        }
+
+    def __to_metadatum(detailed):
+        # Kupo returns metadata in cardano-node's detailed schema
+        if 'int' in detailed:
+            return detailed['int']
+        if 'string' in detailed:
+            return detailed['string']
+        if 'bytes' in detailed:
+            return f"{KupoOgmiosBackend._HEX_PREFIX}{detailed['bytes']}"
+        if 'list' in detailed:
+            return [KupoOgmiosBackend.__to_metadatum(val) for val in detailed['list']]
+        if 'map' in detailed:
+            return {str(KupoOgmiosBackend.__to_metadatum(entry['k'])): KupoOgmiosBackend.__to_metadatum(entry['v']) for entry in detailed['map']}
+        raise ValueError(f"Unexpected metadatum in Kupo response: {detailed}")
+
+    def __lovelace(ogmios_value):
+        return ogmios_value['ada']['lovelace']
+
+    def __ratio(ogmios_ratio):
+        (numerator, denominator) = ogmios_ratio.split('/')
+        return int(numerator) / int(denominator)
+
+    def __tx_outputs(self, txn_hash):
+        matches = self.__kupo(f"matches/*@{txn_hash}")
+        return sorted(matches, key=lambda match: match['output_index'])
+
+    def get_tx_utxos(self, txn_hash):
+        outputs = self.__tx_outputs(txn_hash)
+        if not outputs:
+            raise ValueError(f"Transaction {txn_hash} was not found in Kupo")
+        slot_no = outputs[0]['created_at']['slot_no']
+        spent_in_slot = self.__kupo(f"matches/*?spent&spent_after={slot_no - 1}&spent_before={slot_no + 1}")
+        inputs = [
+            KupoOgmiosBackend.__to_output(match) for match in spent_in_slot
+            if match['spent_at'] and match['spent_at'].get('transaction_id') == txn_hash
+        ]
+        return {
+            'hash': txn_hash,
+            'inputs': sorted(inputs, key=lambda tx_input: (tx_input['tx_hash'], tx_input['output_index'])),
+            'outputs': [KupoOgmiosBackend.__to_output(match) for match in outputs]
+        }
+
+    def get_txn(self, txn_hash):
+        outputs = self.__tx_outputs(txn_hash)
+        if not outputs:
+            return None
+        created_at = outputs[0]['created_at']
+        return {'hash': txn_hash, 'slot': created_at['slot_no'], 'block': created_at['header_hash']}
+
+    def get_metadata(self, txn_hash):
+        outputs = self.__tx_outputs(txn_hash)
+        if not outputs:
+            return []
+        metadata = []
+        for txn_metadata in self.__kupo(f"metadata/{outputs[0]['created_at']['slot_no']}?transaction_id={txn_hash}"):
+            for label, detailed in txn_metadata['schema'].items():
+                metadata.append({'label': str(label), 'json_metadata': KupoOgmiosBackend.__to_metadatum(detailed)})
+        return metadata
+
+    def __asset_quantities(self, pattern):
+        quantities = {}
+        for match in self.__kupo(f"matches/{pattern}?unspent"):
+            for asset, quantity in match['value'].get('assets', {}).items():
+                quantities[asset] = quantities.get(asset, 0) + quantity
+        return quantities
+
+    def get_asset(self, asset_id):
+        policy_id = asset_id[:KupoOgmiosBackend._POLICY_ID_LEN]
+        asset_name = asset_id[KupoOgmiosBackend._POLICY_ID_LEN:]
+        kupo_asset = f"{policy_id}{KupoOgmiosBackend._ASSET_SEPARATOR}{asset_name}" if asset_name else policy_id
+        quantity = self.__asset_quantities(f"{policy_id}{KupoOgmiosBackend._ASSET_SEPARATOR}{asset_name if asset_name else '*'}").get(kupo_asset, 0)
+        if not quantity:
+            return None
+        return {'asset': asset_id, 'policy_id': policy_id, 'asset_name': asset_name if asset_name else None, 'quantity': str(quantity)}
+
+    def get_assets(self, policy_id):
+        quantities = self.__asset_quantities(f"{policy_id}{KupoOgmiosBackend._ASSET_SEPARATOR}*")
+        return [
+            {'asset': asset.replace(KupoOgmiosBackend._ASSET_SEPARATOR, ''), 'quantity': str(quantity)}
+            for asset, quantity in sorted(quantities.items()) if asset.startswith(policy_id)
+        ]
+
+    def iter_utxos(self, address, exclusions):
+        yielded = set()
+        for match in self.__kupo(f"matches/{address}?unspent"):
+            utxo = BlockfrostApi.to_utxo(KupoOgmiosBackend.__to_output(match))
+            if utxo in exclusions or utxo in yielded:
+                print(f'Skipping {utxo.hash}#{utxo.ix}')
+                continue
+            yielded.add(utxo)
+            yield utxo
+
+    def get_tip(self):
+        # Kupo lists its checkpoints most recent first
+        checkpoint = self.__kupo('checkpoints')[0]
+        return {'slot': checkpoint['slot_no'], 'id': checkpoint['header_hash']}
+
+    def get_protocol_parameters(self):
+        params = self.__ogmios('queryLedgerState/protocolParameters')
+        return {
+            'epoch': self.__ogmios('queryLedgerState/epoch'),
+            'min_fee_a': params['minFeeCoefficient'],
+            'min_fee_b': KupoOgmiosBackend.__lovelace(params['minFeeConstant']),
+            'max_block_size': params['maxBlockBodySize']['bytes'],
+            'max_tx_size': params['maxTransactionSize']['bytes'],
+            'max_block_header_size': params['maxBlockHeaderSize']['bytes'],
+            'key_deposit': KupoOgmiosBackend.__lovelace(params['stakeCredentialDeposit']),
+            'pool_deposit': KupoOgmiosBackend.__lovelace(params['stakePoolDeposit']),
+            'e_max': params['stakePoolRetirementEpochBound'],
+            'n_opt': params['desiredNumberOfStakePools'],
+            'a0': KupoOgmiosBackend.__ratio(params['stakePoolPledgeInfluence']),
+            'rho': KupoOgmiosBackend.__ratio(params['monetaryExpansion']),
+            'tau': KupoOgmiosBackend.__ratio(params['treasuryExpansion']),
+            'decentralisation_param': 0,
+            'extra_entropy': None,
+            'protocol_major_ver': params['version']['major'],
+            'protocol_minor_ver': params['version']['minor'],
+            'min_utxo': params['minUtxoDepositCoefficient'],
+            'min_pool_cost': KupoOgmiosBackend.__lovelace(params['minStakePoolCost']),
+            'coins_per_utxo_size': params['minUtxoDepositCoefficient']
+        }
+
+    def submit_txn_cbor(self, tx_cbor):
+        return self.__ogmios('submitTransaction', {'transaction': {'cbor': tx_cbor.hex()}})['transaction']['id']
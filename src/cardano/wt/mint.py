@@ -2,6 +2,7 @@ import json
 import math
 import os
 
+from cardano.wt.inventory import Inventory
 from cardano.wt.utxo import Utxo, Balance
 
 """
@@ -82,6 +83,7 @@ class Mint(object):
                 validated_nfts = self.__validated_nft(json.load(file), validated_names, filename)
                 validated_names.extend(validated_nfts)
         self.validated_names = validated_names
+        self.inventory = Inventory(self.nfts_dir)
         for script in self.scripts:
             if not os.path.exists(script):
                 raise ValueError(f"Minting script file '{script}' not found on filesystem")
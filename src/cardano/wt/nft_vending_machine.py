@@ -1,14 +1,20 @@
 import copy
+import itertools
 import json
 import math
 import os
-import random
-import shutil
+import threading
 import time
 import traceback
 
+from concurrent.futures import ThreadPoolExecutor
+
 from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.journal import VendJournal
 from cardano.wt.mint import Mint
+from cardano.wt.retry_policy import CircuitOpenError, RetryPolicy
+from cardano.wt.retry_scheduler import RetryScheduler
+from cardano.wt.tx_builder import PyCardanoTxBuilder
 from cardano.wt.utxo import Utxo, Balance
 
 class BadUtxoError(ValueError):
@@ -17,15 +23,52 @@ class BadUtxoError(ValueError):
         super().__init__(message)
         self.utxo = utxo
 
+"""
+A mint request that has had its inventory and whitelist slots reserved and is
+ready to be built into a transaction (possibly alongside other requests).  The
+reservation is given back if the vend fails for good before its transaction was
+ever handed to a submitter.
+"""
+class PreparedVend(object):
+
+    def __init__(self, mint_req, txn_id, input_addr, num_mints, bonuses, locked_dir, locked_filenames, wl_consumed, nft_metadata, nft_policy_map, submit_attempted=False):
+        self.mint_req = mint_req
+        self.txn_id = txn_id
+        self.input_addr = input_addr
+        self.num_mints = num_mints
+        self.bonuses = bonuses
+        self.locked_dir = locked_dir
+        self.locked_filenames = locked_filenames
+        self.wl_consumed = wl_consumed
+        self.nft_metadata = nft_metadata
+        self.nft_policy_map = nft_policy_map
+        self.submit_attempted = submit_attempted
+
+    def journal_details(self):
+        return {
+            'balances': [[balance.lovelace, balance.policy] for balance in self.mint_req.balances],
+            'input_addr': self.input_addr,
+            'num_mints': self.num_mints,
+            'bonuses': self.bonuses,
+            'locked_filenames': self.locked_filenames,
+            'wl_consumed': self.wl_consumed
+        }
+
 class NftVendingMachine(object):
 
     __SINGLE_POLICY = 1
-    __ERROR_WAIT = 30
+
+    _CONFIRMATION_INTERVAL_SEC = 60
+    _RANDOM_ORDER_FILE = 'vend_order.json'
+
+    def __public_attrs(o):
+        # Private attributes are internal state (locks, sessions, caches), not configuration
+        return {attr: val for attr, val in o.__dict__.items() if not attr.startswith('_')}
 
     def as_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
+        return json.dumps(self, default=lambda o: NftVendingMachine.__public_attrs(o) if hasattr(o, '__dict__') else str(o), sort_keys=True, indent=4)
 
-    def __init__(self, payment_addr, payment_sign_key, profit_addr, vend_randomly, single_vend_max, mint, blockfrost_api, cardano_cli, mainnet=False):
+    def __init__(self, payment_addr, payment_sign_key, profit_addr, vend_randomly, single_vend_max, mint, blockfrost_api, cardano_cli, mainnet=False, vend_workers=1, vend_batch_size=1, random_seed=321, retry_scheduler=None, journal=None, in_memory=False, audit_sink=None, utxo_source=None, submitter=None):
         self.payment_addr = payment_addr
         self.payment_sign_key = payment_sign_key
         self.profit_addr = profit_addr
@@ -35,6 +78,20 @@ class NftVendingMachine(object):
         self.blockfrost_api = blockfrost_api
         self.cardano_cli = cardano_cli
         self.mainnet = mainnet
+        self.vend_workers = vend_workers
+        self.vend_batch_size = vend_batch_size
+        self.random_seed = random_seed
+        self.retry_scheduler = retry_scheduler if retry_scheduler else RetryScheduler()
+        self.journal = journal
+        self.in_memory = in_memory
+        self.audit_sink = audit_sink
+        self.utxo_source = utxo_source
+        self.submitter = submitter
+        self.__last_confirmation = 0
+        self.__reservation_lock = threading.Lock()
+        self.__api_retry_policy = RetryPolicy()
+        self.__pushed_lock = threading.Lock()
+        self.__pushed = {}
         self.__is_validated = False
 
     def __get_tx_out_args(self, payees):
@@ -48,22 +105,17 @@ class NftVendingMachine(object):
                 tx_outs.append(f'--tx-out "{payee}+{payout_str}"')
         return tx_outs
 
-    def __get_policy_name_map(self, metadata_file):
+    def __get_policy_name_map(self, nft_metadata):
         nft_names = {}
-        with open(metadata_file, 'r') as metadata_filehandle:
-            cip25_metadata = json.load(metadata_filehandle)['721']
-            for policy in cip25_metadata:
-                if policy == 'version':
-                    continue
-                nft_names[policy] = list(cip25_metadata[policy].keys())
+        for policy in nft_metadata:
+            nft_names[policy] = list(nft_metadata[policy].keys())
         return nft_names
 
-    def __lock_and_merge(self, available_mints, num_mints, output_dir, locked_subdir, metadata_subdir, txn_id):
+    def __merge_locked(self, locked_filenames, locked_dir):
         combined_nft_metadata = {}
-        for i in range(num_mints):
-            mint_metadata_filename = available_mints.pop(0)
-            mint_metadata_orig = os.path.join(self.mint.nfts_dir, mint_metadata_filename)
-            with open(mint_metadata_orig, 'r') as mint_metadata_handle:
+        for mint_metadata_filename in locked_filenames:
+            mint_metadata_locked = os.path.join(locked_dir, mint_metadata_filename)
+            with open(mint_metadata_locked, 'r') as mint_metadata_handle:
                 mint_metadata = json.load(mint_metadata_handle)
                 for policy in mint_metadata['721']:
                     if policy == 'version':
@@ -72,9 +124,22 @@ class NftVendingMachine(object):
                         if not policy in combined_nft_metadata:
                             combined_nft_metadata[policy] = {}
                         combined_nft_metadata[policy][nft_name] = nft_metadata
-            mint_metadata_locked = os.path.join(output_dir, locked_subdir, mint_metadata_filename)
-            shutil.move(mint_metadata_orig, mint_metadata_locked)
-        combined_output_path = os.path.join(output_dir, metadata_subdir, f"{txn_id}.json")
+        return combined_nft_metadata
+
+    def __merge_nft_metadata(self, vends):
+        combined_nft_metadata = {}
+        for vend in vends:
+            for policy in vend.nft_metadata:
+                if not policy in combined_nft_metadata:
+                    combined_nft_metadata[policy] = {}
+                combined_nft_metadata[policy].update(vend.nft_metadata[policy])
+        return combined_nft_metadata
+
+    def __combined_metadata_path(self, output_dir, metadata_subdir, txn_id):
+        return os.path.join(output_dir, metadata_subdir, f"{txn_id}.json")
+
+    def __write_combined_metadata(self, combined_nft_metadata, output_dir, metadata_subdir, txn_id):
+        combined_output_path = self.__combined_metadata_path(output_dir, metadata_subdir, txn_id)
         with open(combined_output_path, 'w') as combined_metadata_handle:
             json.dump({'721': combined_nft_metadata }, combined_metadata_handle)
         return combined_output_path
@@ -188,13 +253,26 @@ class NftVendingMachine(object):
             remainder.lovelace = 0
         return payees
 
-    def __do_vend(self, mint_req, output_dir, locked_subdir, metadata_subdir):
-        available_mints = sorted(os.listdir(self.mint.nfts_dir))
-        if not available_mints:
-            print("WARNING: Metadata directory is empty, please restock the vending machine...")
-        elif self.vend_randomly:
-            random.shuffle(available_mints)
+    def __merge_pricing_breakdowns(self, pricing_breakdowns):
+        payees = {}
+        for pricing_breakdown in pricing_breakdowns:
+            for payee, payouts in pricing_breakdown.items():
+                if not payee in payees:
+                    payees[payee] = {}
+                for unit, amount in payouts.items():
+                    if not unit in payees[payee]:
+                        payees[payee][unit] = 0
+                    payees[payee][unit] += amount
+        return payees
 
+    def __get_batch_pricing_breakdown(self, vends, fee):
+        fee_share = math.ceil(fee / len(vends))
+        return self.__merge_pricing_breakdowns([
+            self.__get_pricing_breakdown(vend.input_addr, (vend.num_mints - vend.bonuses), vend.nft_policy_map, vend.mint_req, fee_share)
+            for vend in vends
+        ])
+
+    def __prepare_vend(self, mint_req, output_dir, locked_subdir):
         num_mints_requested = self.__calculate_num_mints_requested(mint_req)
 
         utxos = self.blockfrost_api.get_tx_utxos(mint_req.hash)
@@ -202,67 +280,314 @@ class NftVendingMachine(object):
         utxo_outputs = utxos['outputs']
         input_addrs = set([utxo_input['address'] for utxo_input in utxo_inputs if not utxo_input['reference']])
         if len(input_addrs) < 1:
-            raise BadUtxoError(mint_req, f"Txn hash {txn_hash} has no valid addresses ({utxo_inputs}), aborting...")
+            raise BadUtxoError(mint_req, f"Txn hash {mint_req.hash} has no valid addresses ({utxo_inputs}), aborting...")
         input_addr = input_addrs.pop()
 
         wl_resources = self.mint.whitelist.required_info(mint_req, utxos, self.blockfrost_api)
-        wl_availability = self.mint.whitelist.available(wl_resources)
-        num_mints = min(self.single_vend_max, len(available_mints), num_mints_requested, wl_availability)
-
-        bonuses = 0
-        if self.mint.bogo:
-            eligible_bonuses = self.mint.bogo.determine_bonuses(num_mints_requested)
-            num_mints_plus_bonus = min(self.single_vend_max, len(available_mints), (num_mints + eligible_bonuses))
-            print(f"Bonus of {eligible_bonuses} NFTs determined based on {num_mints_requested} (can mint {num_mints_plus_bonus} in total)")
-            bonuses = num_mints_plus_bonus - num_mints
-            num_mints += bonuses
-
-        print(f"Beginning to mint {num_mints} NFTs to send to address {input_addr}")
-        txn_id = int(time.time())
-        nft_metadata_file = self.__lock_and_merge(available_mints, num_mints, output_dir, locked_subdir, metadata_subdir, txn_id)
-        nft_policy_map = self.__get_policy_name_map(nft_metadata_file)
-
-        fee = 0
-        pricing_breakdown = self.__get_pricing_breakdown(input_addr, (num_mints - bonuses), nft_policy_map, mint_req, fee)
-        print(f"Anticipated pricing breakdown: {pricing_breakdown}")
-
-        tx_ins = [f"--tx-in {mint_req.hash}#{mint_req.ix}"]
-        tx_outs = self.__get_tx_out_args(pricing_breakdown)
-        mint_build_tmp = self.cardano_cli.build_raw_mint_txn(output_dir, txn_id, tx_ins, tx_outs, 0, nft_metadata_file, self.mint, nft_policy_map, self.script_map)
-
-        tx_in_count = len(tx_ins)
-        tx_out_count = len([tx_out for tx_out in tx_outs if tx_out])
-        signers = [self.payment_sign_key]
-        if num_mints:
-            signers.extend(self.mint.sign_keys)
-        fee = self.cardano_cli.calculate_min_fee(mint_build_tmp, tx_in_count, tx_out_count, len(signers))
+        txn_id = f"{int(time.time())}_{mint_req.hash}_{mint_req.ix}"
+
+        # RESERVE INVENTORY AND WHITELIST SLOTS ATOMICALLY SO CONCURRENT VENDS CANNOT OVERLAP
+        with self.__reservation_lock:
+            self.mint.inventory.refresh()
+            num_available = len(self.mint.inventory)
+            if not num_available:
+                print("WARNING: Metadata directory is empty, please restock the vending machine...")
+
+            wl_availability = self.mint.whitelist.available(wl_resources)
+            num_mints = min(self.single_vend_max, num_available, num_mints_requested, wl_availability)
+
+            bonuses = 0
+            if self.mint.bogo:
+                eligible_bonuses = self.mint.bogo.determine_bonuses(num_mints_requested)
+                num_mints_plus_bonus = min(self.single_vend_max, num_available, (num_mints + eligible_bonuses))
+                print(f"Bonus of {eligible_bonuses} NFTs determined based on {num_mints_requested} (can mint {num_mints_plus_bonus} in total)")
+                bonuses = num_mints_plus_bonus - num_mints
+                num_mints += bonuses
+
+            print(f"Beginning to mint {num_mints} NFTs to send to address {input_addr}")
+            locked_dir = os.path.join(output_dir, locked_subdir)
+            locked_filenames = self.mint.inventory.reserve(num_mints, locked_dir)
+            try:
+                nft_metadata = self.__merge_locked(locked_filenames, locked_dir)
+                nft_policy_map = self.__get_policy_name_map(nft_metadata)
+                pricing_breakdown = self.__get_pricing_breakdown(input_addr, (num_mints - bonuses), nft_policy_map, mint_req, 0)
+                print(f"Anticipated pricing breakdown: {pricing_breakdown}")
+            except Exception as e:
+                self.mint.inventory.release(locked_filenames, locked_dir)
+                raise e
 
-        pricing_breakdown = self.__get_pricing_breakdown(input_addr, (num_mints - bonuses), nft_policy_map, mint_req, fee)
-        print(f"Final pricing breakdown: {pricing_breakdown}")
+            try:
+                wl_consumed = self.mint.whitelist.consume(wl_resources, num_mints)
+            except Exception as e:
+                self.mint.inventory.release(locked_filenames, locked_dir)
+                raise BadUtxoError(mint_req, f"Whitelist consumption failed, NOT minting: {e}")
 
-        tx_outs = self.__get_tx_out_args(pricing_breakdown)
-        mint_build = self.cardano_cli.build_raw_mint_txn(output_dir, txn_id, tx_ins, tx_outs, fee, nft_metadata_file, self.mint, nft_policy_map, self.script_map)
-        mint_signed = self.cardano_cli.sign_txn(signers, mint_build)
-        self.mint.whitelist.consume(wl_resources, num_mints)
-        self.blockfrost_api.submit_txn(mint_signed)
+            # JOURNAL BEFORE LEAVING THE CRITICAL SECTION SO NO RESERVATION IS EVER HELD WITHOUT A RECORD OF IT
+            prepared_vend = PreparedVend(mint_req, txn_id, input_addr, num_mints, bonuses, locked_dir, locked_filenames, wl_consumed, nft_metadata, nft_policy_map)
+            try:
+                self.__journal(mint_req, VendJournal.RESERVED, txn_id, prepared_vend.journal_details())
+            except Exception as e:
+                self.mint.inventory.release(locked_filenames, locked_dir)
+                self.mint.whitelist.release(wl_consumed)
+                raise e
+        return prepared_vend
+
+    def __build_vends(self, vends, txn_id, tx_ins, tx_outs_for_fee, signers, combined_nft_metadata, nft_policy_map, output_dir, metadata_subdir):
+        if self.in_memory:
+            (mint_build, fee) = self.cardano_cli.build_mint_txn_at_min_fee(
+                txn_id, tx_ins, tx_outs_for_fee, len(signers), {'721': combined_nft_metadata}, self.mint, nft_policy_map, self.script_map, fee_step=len(vends)
+            )
+            return (mint_build, len(mint_build), fee)
+        nft_metadata_file = self.__write_combined_metadata(combined_nft_metadata, output_dir, metadata_subdir, txn_id)
+        (mint_build, fee) = self.cardano_cli.build_raw_mint_txn_at_min_fee(
+            output_dir, txn_id, tx_ins, tx_outs_for_fee, len(signers), nft_metadata_file, self.mint, nft_policy_map, self.script_map, fee_step=len(vends)
+        )
+        return (mint_build, self.cardano_cli.txn_size(mint_build), fee)
+
+    def __sign_vends(self, signers, mint_build, txn_id, combined_nft_metadata, output_dir, metadata_subdir):
+        if not self.in_memory:
+            return self.cardano_cli.sign_txn(signers, mint_build)
+        mint_signed = self.cardano_cli.sign_txn_cbor(signers, mint_build)
+        if self.audit_sink:
+            raw_build_file = os.path.join(output_dir, CardanoCli.TXN_DIR, f"txn_{txn_id}.raw.build")
+            self.audit_sink.write_json(self.__combined_metadata_path(output_dir, metadata_subdir, txn_id), {'721': combined_nft_metadata})
+            self.audit_sink.write_json(raw_build_file, PyCardanoTxBuilder.text_envelope(mint_build))
+            self.audit_sink.write_json(f"{raw_build_file}.signed", PyCardanoTxBuilder.text_envelope(mint_signed, signed=True))
+        return mint_signed
+
+    def __submit_vends(self, mint_signed):
+        submitter = self.submitter if self.submitter else self.blockfrost_api
+        if self.in_memory:
+            return submitter.submit_txn_cbor(mint_signed)
+        return submitter.submit_txn(mint_signed)
+
+    def __execute_vends(self, vends, output_dir, metadata_subdir):
+        txn_id = vends[0].txn_id if len(vends) == 1 else f"{vends[0].txn_id}_batch{len(vends)}"
+        combined_nft_metadata = self.__merge_nft_metadata(vends)
+        nft_policy_map = self.__get_policy_name_map(combined_nft_metadata)
+
+        tx_ins = [f"--tx-in {vend.mint_req.hash}#{vend.mint_req.ix}" for vend in vends]
+        tx_outs_for_fee = lambda fee: self.__get_tx_out_args(self.__get_batch_pricing_breakdown(vends, fee))
 
-    def vend(self, output_dir, locked_subdir, metadata_subdir, exclusions):
+        signers = [self.payment_sign_key]
+        if sum([vend.num_mints for vend in vends]):
+            signers.extend(self.mint.sign_keys)
+
+        (mint_build, txn_size, fee) = self.__build_vends(vends, txn_id, tx_ins, tx_outs_for_fee, signers, combined_nft_metadata, nft_policy_map, output_dir, metadata_subdir)
+
+        max_tx_size = self.cardano_cli.max_tx_size()
+        estimated_tx_size = txn_size + (len(signers) * CardanoCli.WITNESS_SIZE)
+        if len(vends) > 1 and max_tx_size and estimated_tx_size > max_tx_size:
+            print(f"Batch of {len(vends)} vends estimated at {estimated_tx_size} bytes (max {max_tx_size}), splitting...")
+            split_idx = math.ceil(len(vends) / 2)
+            self.__execute_vends_safely(vends[:split_idx], output_dir, metadata_subdir)
+            self.__execute_vends_safely(vends[split_idx:], output_dir, metadata_subdir)
+            return
+
+        print(f"Final pricing breakdown (fee {fee}): {self.__get_batch_pricing_breakdown(vends, fee)}")
+        self.__journal_all(vends, VendJournal.BUILT, txn_id)
+        mint_signed = self.__sign_vends(signers, mint_build, txn_id, combined_nft_metadata, output_dir, metadata_subdir)
+        self.__journal_all(vends, VendJournal.SIGNED, txn_id)
+        for vend in vends:
+            vend.submit_attempted = True
+        submitted_hash = self.__submit_vends(mint_signed)
+        self.__journal_all(vends, VendJournal.SUBMITTED, txn_id, {'submitted_hash': submitted_hash})
+
+    def __journal(self, mint_req, stage, txn_id, details=None):
+        if self.journal:
+            self.journal.record(mint_req, stage, txn_id, details)
+
+    def __journal_all(self, vends, stage, txn_id, details=None):
+        for vend in vends:
+            self.__journal(vend.mint_req, stage, txn_id, details)
+
+    def __confirm_submitted(self):
+        if not self.journal or (time.time() - self.__last_confirmation) < NftVendingMachine._CONFIRMATION_INTERVAL_SEC:
+            return
+        self.__last_confirmation = time.time()
+        for entry in self.journal.latest([VendJournal.SUBMITTED]):
+            submitted_hash = entry.details.get('submitted_hash')
+            if submitted_hash and self.blockfrost_api.get_txn(submitted_hash):
+                self.journal.record(entry.utxo, VendJournal.CONFIRMED, entry.txn_id)
+
+    def restore(self, output_dir, locked_subdir, exclusions):
+        """
+        Rebuild vending state from the journal after a restart: requests that
+        were already submitted (or dead-lettered) are added to exclusions and
+        requests that were in flight are queued to be resumed with the
+        inventory that was already reserved for them.
+
+        :return: How many in-flight requests will be resumed
+        """
         if not self.__is_validated:
-            raise ValueError('Attempting to vend from non-validated vending machine')
-        mint_reqs = self.blockfrost_api.get_utxos(self.payment_addr, exclusions)
+            raise ValueError('Attempting to restore a non-validated vending machine')
+        if not self.journal:
+            return 0
+        locked_dir = os.path.join(output_dir, locked_subdir)
+        for entry in self.journal.latest(VendJournal.EXCLUDED_STAGES):
+            if entry.stage == VendJournal.DEAD_LETTER and entry.details.get('retryable'):
+                print(f"Retrying {entry.utxo} after restart (dead-lettered with '{entry.details.get('error')}')")
+                continue
+            exclusions.add(entry.utxo)
+        in_flight = self.journal.latest(VendJournal.IN_FLIGHT_STAGES)
+        for entry in in_flight:
+            nft_metadata = self.__merge_locked(entry.details['locked_filenames'], locked_dir)
+            prepared_vend = PreparedVend(
+                entry.utxo,
+                entry.txn_id,
+                entry.details['input_addr'],
+                entry.details['num_mints'],
+                entry.details['bonuses'],
+                locked_dir,
+                entry.details['locked_filenames'],
+                entry.details.get('wl_consumed', []),
+                nft_metadata,
+                self.__get_policy_name_map(nft_metadata),
+                # A crash after SIGNED may have happened mid-submission, so the transaction could already be on chain
+                submit_attempted=(entry.stage == VendJournal.SIGNED)
+            )
+            print(f"Resuming in-flight vend for {entry.utxo} from stage '{entry.stage}'")
+            self.retry_scheduler.resume(entry.utxo, prepared_vend)
+        return len(in_flight)
+
+    def __release_vend(self, prepared_vend):
+        if prepared_vend.submit_attempted:
+            print(f"WARNING: Keeping reservation of {prepared_vend.locked_filenames} since its transaction may already be on chain")
+            return
+        # Inventory goes back last: if anything fails first the NFTs are still locked for the rescheduled vend
+        with self.__reservation_lock:
+            self.mint.whitelist.release(prepared_vend.wl_consumed)
+            self.mint.inventory.release(prepared_vend.locked_filenames, prepared_vend.locked_dir)
+        print(f"Released {prepared_vend.locked_filenames} and {len(prepared_vend.wl_consumed)} WL slot(s) reserved for {prepared_vend.mint_req}")
+
+    def __is_transient(self, e):
+        # Outages of the chain backend say nothing about the mint request itself
+        return isinstance(e, CircuitOpenError) or self.__api_retry_policy.is_retryable(e)
+
+    def __handle_vend_error(self, mint_req, e, prepared_vend=None):
+        print(traceback.format_exc())
+        if isinstance(e, BadUtxoError):
+            self.retry_scheduler.record_failure(mint_req, e, retryable=False)
+        elif self.retry_scheduler.record_failure(mint_req, e, payload=prepared_vend, transient=self.__is_transient(e)):
+            print(f"ERROR: Uncaught exception for {mint_req}, scheduled for retry")
+            return
+        if prepared_vend:
+            self.__release_vend(prepared_vend)
+        retryable = not isinstance(e, BadUtxoError)
+        self.__journal(mint_req, VendJournal.DEAD_LETTER, None, {'error': str(e), 'retryable': retryable})
+        if not retryable:
+            print(f"UNRECOVERABLE UTXO ERROR\n{e.utxo}\n^--- REQUIRES INVESTIGATION")
+        else:
+            print(f"ERROR: Uncaught exception for {mint_req}, out of attempts and added to dead letters (RETRY WILL NOT BE ATTEMPTED UNTIL RESTART)")
+
+    def __execute_vends_safely(self, vends, output_dir, metadata_subdir):
+        try:
+            self.__execute_vends(vends, output_dir, metadata_subdir)
+            for vend in vends:
+                self.retry_scheduler.record_success(vend.mint_req)
+            return
+        except Exception as e:
+            if len(vends) == 1:
+                self.__handle_vend_error(vends[0].mint_req, e, prepared_vend=vends[0])
+                return
+            print(f"ERROR: Batch of {len(vends)} vends failed, retrying each vend in its own transaction")
+            print(traceback.format_exc())
+        for vend in vends:
+            self.__execute_vends_safely([vend], output_dir, metadata_subdir)
+
+    def __vend_batch(self, mint_reqs, vends, output_dir, locked_subdir, metadata_subdir):
         for mint_req in mint_reqs:
-            exclusions.add(mint_req)
+            prepared_vend = self.retry_scheduler.payload(mint_req)
+            if prepared_vend:
+                print(f"Retrying previously prepared vend for {mint_req}")
+                vends.append(prepared_vend)
+                continue
             try:
-                self.__do_vend(mint_req, output_dir, locked_subdir, metadata_subdir)
-            except BadUtxoError as e:
-                print(f"UNRECOVERABLE UTXO ERROR\n{e.utxo}\n^--- REQUIRES INVESTIGATION")
-                print(traceback.format_exc())
+                vends.append(self.__prepare_vend(mint_req, output_dir, locked_subdir))
             except Exception as e:
-                print(f"ERROR: Uncaught exception for {mint_req}, added to exclusions (RETRY WILL NOT BE ATTEMPTED)")
-                print(traceback.format_exc())
-                time.sleep(NftVendingMachine.__ERROR_WAIT)
+                self.__handle_vend_error(mint_req, e)
+        if vends:
+            self.__execute_vends_safely(vends, output_dir, metadata_subdir)
+
+    def __vend_batch_safely(self, mint_reqs, output_dir, locked_subdir, metadata_subdir):
+        vends = []
+        try:
+            self.__vend_batch(mint_reqs, vends, output_dir, locked_subdir, metadata_subdir)
+        except Exception as e:
+            # Only reached if error handling itself failed (e.g., releasing a reservation), so the requests are
+            # rescheduled rather than left excluded without a journal entry or retry
+            print(traceback.format_exc())
+            prepared_vends = {vend.mint_req: vend for vend in vends}
+            for mint_req in mint_reqs:
+                prepared_vend = prepared_vends.get(mint_req)
+                if prepared_vend and prepared_vend.submit_attempted:
+                    print(f"ERROR: Vend worker failed after submitting {mint_req}, NOT rescheduling")
+                    continue
+                print(f"ERROR: Vend worker failed for {mint_req}, scheduled for retry")
+                self.retry_scheduler.record_failure(mint_req, e, payload=prepared_vend, transient=True)
+
+    def enqueue(self, mint_reqs):
+        """
+        Hand over mint requests discovered by a push source (e.g., a webhook)
+        so the next vend() picks them up without listing the payment address.
+
+        :param mint_reqs: UTxOs at the payment address
+        """
+        with self.__pushed_lock:
+            for mint_req in mint_reqs:
+                self.__pushed[mint_req] = mint_req
+
+    def __drain_pushed(self, exclusions):
+        with self.__pushed_lock:
+            pushed = list(self.__pushed.values())
+            self.__pushed = {}
+        return [mint_req for mint_req in pushed if not mint_req in exclusions]
+
+    def vend(self, output_dir, locked_subdir, metadata_subdir, exclusions, list_address=True):
+        """
+        Vend every eligible mint request currently waiting at the payment
+        address (skipping those in exclusions, which is updated in place).
+
+        :param list_address: Whether to list the payment address, or only vend
+            the mint requests handed over with enqueue()
+        :return: How many mint requests were picked up for vending
+        """
+        if not self.__is_validated:
+            raise ValueError('Attempting to vend from non-validated vending machine')
+        if self.vend_randomly:
+            self.mint.inventory.randomize(os.path.join(output_dir, NftVendingMachine._RANDOM_ORDER_FILE), self.random_seed)
+        self.__confirm_submitted()
+        for retry_utxo in self.retry_scheduler.pending():
+            exclusions.discard(retry_utxo)
+        mint_reqs = self.__drain_pushed(exclusions)
+        if list_address:
+            mint_reqs = itertools.chain(mint_reqs, (self.utxo_source if self.utxo_source else self.blockfrost_api).iter_utxos(self.payment_addr, exclusions))
+        num_dispatched = 0
+        vend_futures = []
+        with ThreadPoolExecutor(max_workers=self.vend_workers) as vend_pool:
+            batch = []
+            for mint_req in mint_reqs:
+                if mint_req in exclusions or not self.retry_scheduler.is_eligible(mint_req):
+                    continue
+                exclusions.add(mint_req)
+                batch.append(mint_req)
+                num_dispatched += 1
+                if len(batch) == self.vend_batch_size:
+                    vend_futures.append(vend_pool.submit(self.__vend_batch_safely, batch, output_dir, locked_subdir, metadata_subdir))
+                    batch = []
+            if batch:
+                vend_futures.append(vend_pool.submit(self.__vend_batch_safely, batch, output_dir, locked_subdir, metadata_subdir))
+        for vend_future in vend_futures:
+            vend_future.result()
+        return num_dispatched
 
     def validate(self):
+        if self.vend_workers < 1:
+            raise ValueError(f"Must have at least one vend worker, found {self.vend_workers}")
+        if self.vend_batch_size < 1:
+            raise ValueError(f"Must have a vend batch size of at least one, found {self.vend_batch_size}")
+        if self.in_memory and not isinstance(self.cardano_cli, PyCardanoTxBuilder):
+            raise ValueError(f"In-memory vending requires the pycardano transaction builder, found {type(self.cardano_cli).__name__}")
         self.mint.validate()
         if self.payment_addr == self.profit_addr:
             raise ValueError(f"Payment address and profit address ({self.payment_addr}) cannot be the same!")
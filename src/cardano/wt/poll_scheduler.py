@@ -0,0 +1,65 @@
+import threading
+
+"""
+Decides how long the vending machine should wait between polls for new mint
+requests.  While requests keep arriving it polls at the minimum interval, and
+each idle poll multiplies the interval by a backoff factor up to a maximum.
+Push sources (e.g., a webhook listener or chain follower) can call notify() to
+cut the current wait short as soon as a new payment is seen.  With a
+RequestBudget, waits are stretched while Blockfrost usage is projected to
+exceed the daily quota.
+"""
+class AdaptivePollScheduler(object):
+
+    _BACKOFF = 2
+    _MAX_WAIT_SEC = 60
+    _MIN_WAIT_SEC = 2
+
+    def __init__(self, min_wait=_MIN_WAIT_SEC, max_wait=_MAX_WAIT_SEC, backoff=_BACKOFF, budget=None):
+        if min_wait <= 0 or max_wait < min_wait:
+            raise ValueError(f"Invalid poll wait bounds ({min_wait}, {max_wait})")
+        if backoff < 1:
+            raise ValueError(f"Poll backoff factor must be at least 1, found {backoff}")
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.backoff = backoff
+        self.budget = budget
+        self.current_wait = min_wait
+        self.__notified = False
+        self.__wakeup = threading.Condition()
+
+    def next_wait(self, num_found):
+        """
+        :param num_found: How many mint requests the last poll found
+        :return: Seconds to wait before the next poll
+        """
+        if num_found:
+            self.current_wait = self.min_wait
+        else:
+            self.current_wait = min(self.max_wait, self.current_wait * self.backoff)
+        return self.budget.poll_wait(self.current_wait) if self.budget is not None else self.current_wait
+
+    def wait(self, num_found):
+        """
+        Block until the next poll is due or until notify() is called.
+
+        :param num_found: How many mint requests the last poll found
+        :return: True if woken up early by notify(), False otherwise
+        """
+        timeout = self.next_wait(num_found)
+        # Check and reset under the same lock as notify() so that a notification
+        # arriving while the last poll ran (or as this wait times out) is never lost
+        with self.__wakeup:
+            woken = self.__wakeup.wait_for(lambda: self.__notified, timeout)
+            self.__notified = False
+        if woken:
+            self.current_wait = self.min_wait
+        return woken
+
+    def notify(self):
+        """
+        Wake up any pending wait() immediately (thread-safe).
+        """
+        with self.__wakeup:
+            self.__notified = True
+            self.__wakeup.notify_all()
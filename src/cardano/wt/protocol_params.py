@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+import traceback
+
+"""
+Keeps the protocol parameters the transaction builders read (a cardano-cli
+protocol.json file) in step with the chain.  The parameters are cached on disk
+keyed by epoch, so a restart uses the cached copy right away instead of
+waiting on the backend, and a background thread fetches them again each time
+an epoch rolls over.  The protocol file is rewritten atomically, and both
+transaction builders re-read it, so fees follow parameter changes without a
+restart.
+"""
+class ProtocolParameters(object):
+
+    # Blockfrost gives the wrong format back for protocol parameters so here's a translator
+    BLOCKFROST_PROTOCOL_TRANSLATOR = {
+        'decentralization': 'decentralisation_param',
+        'extraPraosEntropy': 'extra_entropy',
+        'maxBlockBodySize': 'max_block_size',
+        'maxBlockHeaderSize': 'max_block_header_size',
+        'minPoolCost': 'min_pool_cost',
+        'maxTxSize': 'max_tx_size',
+        'minUTxOValue': 'min_utxo',
+        'monetaryExpansion': 'rho',
+        'poolPledgeInfluence': 'a0',
+        'poolRetireMaxEpoch': 'e_max',
+        'protocolVersion': {
+            'minor': 'protocol_minor_ver',
+            'major': 'protocol_major_ver'
+        },
+        'stakeAddressDeposit': 'key_deposit',
+        'stakePoolDeposit': 'pool_deposit',
+        'stakePoolTargetNum': 'n_opt',
+        'treasuryCut': 'tau',
+        'txFeeFixed': 'min_fee_b',
+        'txFeePerByte': 'min_fee_a'
+    }
+
+    # (Shelley-era epoch, its start as a UNIX timestamp, epoch length in seconds)
+    MAINNET_EPOCHS = (208, 1596059091, 432000)
+    PREPROD_EPOCHS = (4, 1655769600, 432000)
+    PREVIEW_EPOCHS = (0, 1666656000, 86400)
+
+    CACHE_SUBDIR = 'protocol_params'
+    PROTOCOL_FILE = 'protocol.json'
+
+    _CACHED_EPOCHS = 3
+    _EPOCH_GRACE_SEC = 120
+    _REFRESH_SEC = 3600
+    _RETRY_SEC = 60
+
+    def __init__(self, backend, output_dir, epoch_schedule=None, refresh_interval=_REFRESH_SEC, clock=time.time):
+        """
+        :param backend: ChainBackend to fetch the parameters from
+        :param output_dir: Directory the protocol file and cache are kept in
+        :param epoch_schedule: Network's epoch schedule (e.g., MAINNET_EPOCHS),
+            used to refresh right after each epoch boundary
+        :param refresh_interval: Seconds between refreshes when the epoch schedule is unknown
+        """
+        self.backend = backend
+        self.protocol_file = os.path.join(output_dir, ProtocolParameters.PROTOCOL_FILE)
+        self.cache_dir = os.path.join(output_dir, ProtocolParameters.CACHE_SUBDIR)
+        self.epoch_schedule = epoch_schedule
+        self.refresh_interval = refresh_interval
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__params = None
+        self.__fetched = False
+        self.__stopped = threading.Event()
+        self.__refresher = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def generate_cardano_cli_protocol(translator, blockfrost_input):
+        translated = {}
+        for entry in translator:
+            translation = translator[entry]
+            if type(translation) is dict:
+                translated[entry] = ProtocolParameters.generate_cardano_cli_protocol(translation, blockfrost_input)
+            else:
+                input_val = blockfrost_input[translation]
+                if type(input_val) is str and input_val.isdigit():
+                    translated[entry] = int(input_val)
+                else:
+                    translated[entry] = input_val
+        return translated
+
+    def __write_json(filename, contents):
+        tmp_file = f"{filename}.tmp"
+        with open(tmp_file, 'w') as json_filehandle:
+            json.dump(contents, json_filehandle)
+        os.replace(tmp_file, filename)
+
+    def __cached_epochs(self):
+        epochs = [int(filename[:-len('.json')]) for filename in os.listdir(self.cache_dir) if filename.endswith('.json') and filename[:-len('.json')].isdigit()]
+        return sorted(epochs)
+
+    def __cache_file(self, epoch):
+        return os.path.join(self.cache_dir, f"{epoch}.json")
+
+    def __apply(self, params):
+        with self.__lock:
+            if params == self.__params:
+                return False
+            ProtocolParameters.__write_json(self.protocol_file, ProtocolParameters.generate_cardano_cli_protocol(ProtocolParameters.BLOCKFROST_PROTOCOL_TRANSLATOR, params))
+            self.__params = params
+        print(f"Using protocol parameters of epoch {params.get('epoch')}")
+        return True
+
+    def expected_epoch(self):
+        """
+        :return: Epoch the network is in according to the epoch schedule (None if unknown)
+        """
+        if not self.epoch_schedule:
+            return None
+        (base_epoch, base_start, epoch_length) = self.epoch_schedule
+        return base_epoch + int((self.__clock() - base_start) // epoch_length)
+
+    def load(self):
+        """
+        Use the most recently cached parameters, fetching them from the backend
+        only when nothing is cached or the cached epoch has already ended.
+
+        :return: Location of the cardano-cli protocol file
+        """
+        cached_epochs = self.__cached_epochs()
+        expected_epoch = self.expected_epoch()
+        if cached_epochs and (expected_epoch is None or cached_epochs[-1] >= expected_epoch):
+            with open(self.__cache_file(cached_epochs[-1]), 'r') as cache_filehandle:
+                self.__apply(json.load(cache_filehandle))
+        else:
+            self.refresh()
+        return self.protocol_file
+
+    def refresh(self):
+        """
+        :return: Whether the parameters fetched from the backend differ from the current ones
+        """
+        params = self.backend.get_protocol_parameters()
+        self.__fetched = True
+        epoch = params['epoch']
+        ProtocolParameters.__write_json(self.__cache_file(epoch), params)
+        for stale_epoch in self.__cached_epochs()[:-ProtocolParameters._CACHED_EPOCHS]:
+            os.remove(self.__cache_file(stale_epoch))
+        return self.__apply(params)
+
+    def current(self):
+        """
+        :return: Current parameters (as in Blockfrost's epochs/latest/parameters)
+        """
+        with self.__lock:
+            return self.__params
+
+    def max_txn_fee(self):
+        params = self.current()
+        return (int(params['min_fee_a']) * int(params['max_tx_size'])) + int(params['min_fee_b'])
+
+    def __next_refresh_wait(self):
+        expected_epoch = self.expected_epoch()
+        if expected_epoch is None:
+            # Without a schedule there is no telling whether cached parameters are still current
+            return self.refresh_interval if self.__fetched else 0
+        if self.current()['epoch'] < expected_epoch:
+            return ProtocolParameters._RETRY_SEC
+        (base_epoch, base_start, epoch_length) = self.epoch_schedule
+        next_epoch_start = base_start + ((expected_epoch + 1 - base_epoch) * epoch_length)
+        return max(0, next_epoch_start - self.__clock()) + ProtocolParameters._EPOCH_GRACE_SEC
+
+    def __refresh_forever(self):
+        while not self.__stopped.wait(self.__next_refresh_wait()):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(traceback.format_exc())
+                print(f"WARNING: Could not refresh protocol parameters ({e}), retrying in {ProtocolParameters._RETRY_SEC}s")
+                self.__stopped.wait(ProtocolParameters._RETRY_SEC)
+
+    def start(self):
+        """
+        Keep refreshing the parameters (once loaded) on a background thread.
+        """
+        self.__stopped.clear()
+        self.__refresher = threading.Thread(target=self.__refresh_forever, name='protocol-params', daemon=True)
+        self.__refresher.start()
+
+    def stop(self):
+        self.__stopped.set()
+        if self.__refresher:
+            self.__refresher.join()
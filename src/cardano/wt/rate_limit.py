@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+"""
+Token bucket shared by every caller of a rate-limited API.  Tokens refill at a
+steady rate up to a burst capacity.  When callers have to wait, they are served
+strictly by priority (then first come, first served), so critical calls (e.g.,
+transaction submits) go ahead of background lookups.  Both threads (acquire)
+and asyncio tasks (acquire_async) can draw from the same bucket.
+"""
+class TokenBucket(object):
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    _ASYNC_POLL_SEC = 0.05
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Invalid token bucket rate {rate} and burst {burst}")
+        self.rate = rate
+        self.burst = burst
+        self.__clock = clock
+        self.__tokens = burst
+        self.__last_refill = clock()
+        self.__waiters = []
+        self.__tickets = itertools.count()
+        self.__cond = threading.Condition()
+
+    def __refill(self):
+        now = self.__clock()
+        self.__tokens = min(self.burst, self.__tokens + ((now - self.__last_refill) * self.rate))
+        self.__last_refill = now
+
+    def __try_take(self, waiter):
+        """
+        :return: 0 if a token was taken for the waiter, otherwise the number of
+            seconds until it is worth trying again (None if not next in line)
+        """
+        self.__refill()
+        if self.__waiters[0] != waiter:
+            return None
+        if self.__tokens >= 1:
+            self.__tokens -= 1
+            heapq.heappop(self.__waiters)
+            self.__cond.notify_all()
+            return 0
+        return (1 - self.__tokens) / self.rate
+
+    def __enqueue(self, priority):
+        waiter = (priority, next(self.__tickets))
+        heapq.heappush(self.__waiters, waiter)
+        return waiter
+
+    def available(self):
+        """
+        :return: The (fractional) number of tokens currently in the bucket
+        """
+        with self.__cond:
+            self.__refill()
+            return self.__tokens
+
+    def drain(self):
+        """
+        Empty the bucket, e.g., after the API reports that it is rate limiting
+        us, so that every caller backs off until tokens refill.
+        """
+        with self.__cond:
+            self.__refill()
+            self.__tokens = min(self.__tokens, 0)
+
+    def acquire(self, priority=NORMAL):
+        """
+        Block the current thread until a token is available for it.
+
+        :param priority: One of HIGH, NORMAL, or LOW (lower values go first)
+        """
+        with self.__cond:
+            waiter = self.__enqueue(priority)
+            while True:
+                wait_sec = self.__try_take(waiter)
+                if wait_sec == 0:
+                    return
+                self.__cond.wait(wait_sec)
+
+    async def acquire_async(self, priority=NORMAL):
+        """
+        Wait (without blocking the event loop) until a token is available.
+
+        :param priority: One of HIGH, NORMAL, or LOW (lower values go first)
+        """
+        with self.__cond:
+            waiter = self.__enqueue(priority)
+        try:
+            while True:
+                with self.__cond:
+                    wait_sec = self.__try_take(waiter)
+                if wait_sec == 0:
+                    return
+                await asyncio.sleep(wait_sec if wait_sec else TokenBucket._ASYNC_POLL_SEC)
+        except asyncio.CancelledError:
+            with self.__cond:
+                if waiter in self.__waiters:
+                    self.__waiters.remove(waiter)
+                    heapq.heapify(self.__waiters)
+                    self.__cond.notify_all()
+            raise
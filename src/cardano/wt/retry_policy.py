@@ -0,0 +1,187 @@
+import email.utils
+import random
+import requests
+import threading
+import time
+
+from http import HTTPStatus
+
+"""
+Raised instead of calling an API whose circuit breaker is open.
+"""
+class CircuitOpenError(RuntimeError):
+    pass
+
+"""
+Decides whether and when a failed API call should be retried: only errors that
+could succeed later are retried (throttling, server errors, timeouts, and
+dropped connections), after the server's Retry-After if it sent one and
+otherwise after an exponentially growing delay with full jitter.  Retries stop
+once the total time spent on the call would exceed a budget.
+"""
+class RetryPolicy(object):
+
+    RETRYABLE_STATUSES = set([
+        HTTPStatus.REQUEST_TIMEOUT,
+        HTTPStatus.TOO_EARLY,
+        HTTPStatus.TOO_MANY_REQUESTS,
+        HTTPStatus.INTERNAL_SERVER_ERROR,
+        HTTPStatus.BAD_GATEWAY,
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        HTTPStatus.GATEWAY_TIMEOUT
+    ])
+
+    _BASE_DELAY_SEC = 1
+    _MAX_DELAY_SEC = 60
+    _MAX_ELAPSED_SEC = 300
+
+    def __init__(self, base_delay=_BASE_DELAY_SEC, max_delay=_MAX_DELAY_SEC, max_elapsed=_MAX_ELAPSED_SEC, rng=random.random):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_elapsed = max_elapsed
+        self.__rng = rng
+
+    def is_retryable(self, error):
+        """
+        :param error: Exception raised by the call
+        :return: Whether retrying the call could possibly succeed
+        """
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response is not None and error.response.status_code in RetryPolicy.RETRYABLE_STATUSES
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def __retry_after(self, error):
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('Retry-After') if response is not None and response.headers else None
+        if not retry_after:
+            return None
+        try:
+            return max(0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def next_delay(self, attempt, error, elapsed):
+        """
+        :param attempt: How many retries have already been made (0 for the first)
+        :param error: Exception raised by the latest attempt
+        :param elapsed: Seconds spent on the call so far
+        :return: Seconds to wait before retrying, or None to give up
+        """
+        if not self.is_retryable(error):
+            return None
+        delay = self.__retry_after(error)
+        if delay is None:
+            delay = self.__rng() * min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = min(delay, self.max_delay)
+        if elapsed + delay > self.max_elapsed:
+            return None
+        return delay
+
+"""
+Fails calls fast while an API is down.  After enough consecutive failures the
+circuit opens and calls are rejected outright; once the reset timeout passes a
+single trial call is let through, which closes the circuit on success or
+re-opens it on failure.
+"""
+class CircuitBreaker(object):
+
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+
+    _FAILURE_THRESHOLD = 5
+    _RESET_TIMEOUT_SEC = 30
+
+    def __init__(self, failure_threshold=_FAILURE_THRESHOLD, reset_timeout=_RESET_TIMEOUT_SEC, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__state = CircuitBreaker.CLOSED
+        self.__failures = 0
+        self.__opened_at = None
+
+    def state(self):
+        with self.__lock:
+            return self.__state
+
+    def before_call(self):
+        """
+        :raises CircuitOpenError: If calls are currently being rejected
+        """
+        with self.__lock:
+            if self.__state == CircuitBreaker.CLOSED:
+                return
+            if self.__state == CircuitBreaker.OPEN and (self.__clock() - self.__opened_at) >= self.reset_timeout:
+                self.__state = CircuitBreaker.HALF_OPEN
+                return
+            raise CircuitOpenError(f"Circuit is {self.__state} after {self.__failures} consecutive failures, not calling")
+
+    def record_success(self):
+        with self.__lock:
+            self.__state = CircuitBreaker.CLOSED
+            self.__failures = 0
+
+    def record_failure(self):
+        with self.__lock:
+            self.__failures += 1
+            if self.__state == CircuitBreaker.HALF_OPEN or self.__failures >= self.failure_threshold:
+                self.__state = CircuitBreaker.OPEN
+                self.__opened_at = self.__clock()
+
+"""
+State of one API call being retried under a RetryPolicy and guarded by a
+CircuitBreaker.  The decisions live here so the sync and asyncio clients, which
+only differ in how they wait, make them the same way.
+"""
+class RetryingCall(object):
+
+    RETRIED_ERRORS = (requests.exceptions.HTTPError, requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+    def __init__(self, retry_policy, circuit_breaker, max_retries, clock=time.monotonic):
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.max_retries = max_retries
+        self.retries = 0
+        self.__clock = clock
+        self.__start = clock()
+
+    def before_attempt(self):
+        """
+        :raises CircuitOpenError: If calls are currently being rejected
+        """
+        self.circuit_breaker.before_call()
+
+    def succeeded(self):
+        self.circuit_breaker.record_success()
+
+    def failed(self, error):
+        """
+        :param error: One of RETRIED_ERRORS raised by the latest attempt
+        :return: Seconds to wait before the next attempt
+        :raises Exception: The error itself, if the call should not be retried
+        """
+        # Client errors (e.g., a 404) mean the API is up, they just never succeed on retry
+        if self.retry_policy.is_retryable(error):
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        delay = self.retry_policy.next_delay(self.retries, error, self.__clock() - self.__start) if self.retries < self.max_retries else None
+        if delay is None:
+            raise error
+        self.retries += 1
+        return delay
+
+    def aborted(self, error):
+        """
+        Record an attempt that raised something other than RETRIED_ERRORS
+        (e.g., an unparseable body), which is never retried.  It still counts
+        against the circuit so a failed half-open trial re-opens it.
+
+        :param error: Exception raised by the latest attempt
+        """
+        self.circuit_breaker.record_failure()
@@ -0,0 +1,126 @@
+import threading
+import time
+
+"""
+Retry bookkeeping for a single mint request UTxO.
+"""
+class RetryState(object):
+
+    def __init__(self, utxo):
+        self.utxo = utxo
+        self.attempts = 0
+        self.deferrals = 0
+        self.next_eligible = 0
+        self.last_error = None
+        self.payload = None
+
+    def __repr__(self):
+        return f"{self.utxo} (attempts={self.attempts}, next_eligible={self.next_eligible}, last_error={self.last_error})"
+
+"""
+Schedules retries of failed mint requests with per-UTxO exponential backoff so
+that one failing request does not hold up the rest of the queue.  Requests that
+keep failing (or that are known to be unrecoverable) end up in a dead-letter
+list for manual investigation.  Transient failures (e.g., while an API is
+down) are retried with the same backoff but never use up an attempt, so an
+outage cannot dead-letter every request in flight.
+"""
+class RetryScheduler(object):
+
+    _BASE_DELAY_SEC = 5
+    _MAX_ATTEMPTS = 5
+    _MAX_DELAY_SEC = 600
+
+    def __init__(self, max_attempts=_MAX_ATTEMPTS, base_delay=_BASE_DELAY_SEC, max_delay=_MAX_DELAY_SEC):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.__lock = threading.Lock()
+        self.__pending = {}
+        self.__dead_letters = {}
+
+    def is_eligible(self, utxo, now=None):
+        """
+        :param utxo: The mint request UTxO
+        :param now: Current time in seconds (defaults to time.time())
+        :return: Whether the UTxO may be vended now (it is not dead-lettered
+            and, if it failed before, its backoff period has elapsed)
+        """
+        now = now if now is not None else time.time()
+        with self.__lock:
+            if utxo in self.__dead_letters:
+                return False
+            return not utxo in self.__pending or self.__pending[utxo].next_eligible <= now
+
+    def payload(self, utxo):
+        """
+        :param utxo: The mint request UTxO
+        :return: The payload stored alongside the UTxO's last failure, if any
+        """
+        with self.__lock:
+            return self.__pending[utxo].payload if utxo in self.__pending else None
+
+    def pending(self):
+        """
+        :return: The UTxOs that failed and are waiting to be retried
+        """
+        with self.__lock:
+            return list(self.__pending.keys())
+
+    def dead_letters(self):
+        """
+        :return: Retry states of UTxOs that will not be retried again
+        """
+        with self.__lock:
+            return list(self.__dead_letters.values())
+
+    def resume(self, utxo, payload):
+        """
+        Queue a UTxO whose vend was interrupted (e.g., by a restart) so that it
+        is immediately eligible and its payload is handed back on the next
+        attempt.  This does not count as a failed attempt.
+
+        :param utxo: The mint request UTxO
+        :param payload: State needed to resume the vend
+        """
+        with self.__lock:
+            state = RetryState(utxo)
+            state.payload = payload
+            self.__pending[utxo] = state
+
+    def record_success(self, utxo):
+        with self.__lock:
+            self.__pending.pop(utxo, None)
+
+    def record_failure(self, utxo, error, payload=None, retryable=True, transient=False, now=None):
+        """
+        Record a failed attempt and schedule the next one with exponential
+        backoff, or move the UTxO to the dead-letter list if it is out of
+        attempts or the error is not retryable.
+
+        :param utxo: The mint request UTxO
+        :param error: The exception (or message) that caused the failure
+        :param payload: Arbitrary state to hand back on the next attempt
+        :param retryable: Whether another attempt could possibly succeed
+        :param transient: Whether the failure was outside the request's control
+            (rescheduled without counting as an attempt)
+        :param now: Current time in seconds (defaults to time.time())
+        :return: True if the UTxO will be retried, False if dead-lettered
+        """
+        now = now if now is not None else time.time()
+        with self.__lock:
+            state = self.__pending.pop(utxo, None) or RetryState(utxo)
+            if transient and retryable:
+                state.deferrals += 1
+            else:
+                state.attempts += 1
+            state.last_error = str(error)
+            state.payload = payload
+            if not retryable or state.attempts >= self.max_attempts:
+                self.__dead_letters[utxo] = state
+                return False
+            num_failures = state.attempts + state.deferrals
+            state.next_eligible = now + min(self.max_delay, self.base_delay * (2 ** (num_failures - 1)))
+            self.__dead_letters.pop(utxo, None)
+            self.__pending[utxo] = state
+            return True
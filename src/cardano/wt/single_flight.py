@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+"""
+One call that concurrent callers for the same key are waiting on.
+"""
+class Flight(object):
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+"""
+One asyncio task that concurrent coroutines for the same key are awaiting.
+"""
+class AsyncFlight(object):
+
+    def __init__(self, task, ttl):
+        self.task = task
+        self.ttl = ttl
+        self.finished_at = None
+
+"""
+Coalesces concurrent calls for the same key into a single call whose result
+(or error) is handed to every caller.  Successful results can also be reused
+by back-to-back callers for a short TTL; errors are never reused once the call
+that raised them has finished.
+"""
+class SingleFlight(object):
+
+    _TTL_SEC = 2
+
+    def __init__(self, ttl=_TTL_SEC, clock=time.monotonic):
+        self.ttl = ttl
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__flights = {}
+
+    def __prune(self, now):
+        expired = [key for key, flight in self.__flights.items() if flight.done.is_set() and flight.finished_at + flight.ttl <= now]
+        for key in expired:
+            del self.__flights[key]
+
+    def do(self, key, func, ttl=None):
+        """
+        :param key: Identifies calls that are interchangeable
+        :param func: Function making the call when no shared result is available
+        :param ttl: Seconds the result may be reused after the call finishes
+            (defaults to this object's TTL, 0 only shares in-flight calls)
+        :return: The result of func, possibly from another caller's call
+        """
+        with self.__lock:
+            self.__prune(self.__clock())
+            flight = self.__flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight(self.ttl if ttl is None else ttl)
+                self.__flights[key] = flight
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = func()
+        except Exception as e:
+            flight.error = e
+        with self.__lock:
+            flight.finished_at = self.__clock()
+            if flight.error or not flight.ttl:
+                self.__flights.pop(key, None)
+        flight.done.set()
+        if flight.error:
+            raise flight.error
+        return flight.result
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__flights)
+
+"""
+Asyncio version of SingleFlight for coroutines running on one event loop.
+Callers that are cancelled stop waiting without cancelling the shared call.
+"""
+class AsyncSingleFlight(object):
+
+    def __init__(self, ttl=SingleFlight._TTL_SEC, clock=time.monotonic):
+        self.ttl = ttl
+        self.__clock = clock
+        self.__flights = {}
+
+    def __prune(self, now):
+        expired = [key for key, flight in self.__flights.items() if flight.finished_at is not None and flight.finished_at + flight.ttl <= now]
+        for key in expired:
+            del self.__flights[key]
+
+    def __finish(self, key, flight):
+        flight.finished_at = self.__clock()
+        failed = flight.task.cancelled() or flight.task.exception() is not None
+        if (failed or not flight.ttl) and self.__flights.get(key) is flight:
+            del self.__flights[key]
+
+    async def do(self, key, coro_func, ttl=None):
+        """
+        :param key: Identifies calls that are interchangeable
+        :param coro_func: Function returning the coroutine that makes the call
+        :param ttl: Seconds the result may be reused after the call finishes
+            (defaults to this object's TTL, 0 only shares in-flight calls)
+        :return: The result of the call, possibly from another caller's call
+        """
+        self.__prune(self.__clock())
+        flight = self.__flights.get(key)
+        if flight is None:
+            flight = AsyncFlight(asyncio.ensure_future(coro_func()), self.ttl if ttl is None else ttl)
+            self.__flights[key] = flight
+            flight.task.add_done_callback(lambda task: self.__finish(key, flight))
+        return await asyncio.shield(flight.task)
+
+    def __len__(self):
+        return len(self.__flights)
@@ -0,0 +1,157 @@
+import json
+import requests
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pycardano import Transaction
+from requests.adapters import HTTPAdapter
+
+"""
+Submits transactions to a cardano-submit-api instance.
+"""
+class SubmitApiEndpoint(object):
+
+    _CONNECT_TIMEOUT_SEC = 2
+    _READ_TIMEOUT_SEC = 20
+
+    def __init__(self, url, connect_timeout=_CONNECT_TIMEOUT_SEC, read_timeout=_READ_TIMEOUT_SEC):
+        self.url = url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.__session = requests.Session()
+        self.__session.mount('http://', HTTPAdapter(pool_maxsize=2))
+        self.__session.mount('https://', HTTPAdapter(pool_maxsize=2))
+
+    def submit_txn_cbor(self, tx_cbor):
+        submit_resp = self.__session.post(f"{self.url}/api/submit/tx", headers={'Content-Type': 'application/cbor'}, data=tx_cbor, timeout=self.timeout)
+        if not submit_resp.ok:
+            raise ValueError(f"{self.url} rejected transaction ({submit_resp.status_code}): {submit_resp.text}")
+        return submit_resp.json()
+
+"""
+Submits transactions to Ogmios (JSON-RPC over HTTP, Ogmios v6+).
+"""
+class OgmiosSubmitEndpoint(object):
+
+    _CONNECT_TIMEOUT_SEC = 2
+    _READ_TIMEOUT_SEC = 20
+
+    def __init__(self, url, connect_timeout=_CONNECT_TIMEOUT_SEC, read_timeout=_READ_TIMEOUT_SEC):
+        self.url = url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.__session = requests.Session()
+
+    def submit_txn_cbor(self, tx_cbor):
+        request = {'jsonrpc': '2.0', 'method': 'submitTransaction', 'params': {'transaction': {'cbor': tx_cbor.hex()}}, 'id': None}
+        response = self.__session.post(self.url, json=request, timeout=self.timeout).json()
+        if 'error' in response:
+            raise ValueError(f"{self.url} rejected transaction: {response['error']}")
+        return response['result']['transaction']['id']
+
+"""
+Submission latency and outcomes for one endpoint.
+"""
+class EndpointStats(object):
+
+    _EWMA_WEIGHT = 0.2
+
+    def __init__(self):
+        self.submissions = 0
+        self.successes = 0
+        self.failures = 0
+        self.last_ms = None
+        self.avg_ms = None
+
+    def record(self, latency_sec, succeeded):
+        latency_ms = latency_sec * 1000
+        self.submissions += 1
+        if succeeded:
+            self.successes += 1
+        else:
+            self.failures += 1
+        self.last_ms = latency_ms
+        self.avg_ms = latency_ms if self.avg_ms is None else (EndpointStats._EWMA_WEIGHT * latency_ms) + ((1 - EndpointStats._EWMA_WEIGHT) * self.avg_ms)
+
+"""
+Sends the same signed transaction to several endpoints at once (anything with
+a submit_txn_cbor method, e.g., BlockfrostApi, SubmitApiEndpoint, or
+OgmiosSubmitEndpoint) and returns as soon as the first one accepts it, so one
+slow or failing endpoint does not hold up the vend.  An endpoint reporting the
+transaction is already in its mempool counts as accepting it.  Latency and
+outcomes are recorded per endpoint.
+"""
+class HedgedSubmitter(object):
+
+    ALREADY_SUBMITTED_MARKERS = ['already in mempool', 'already in the mempool', 'alreadyinmempool', 'transaction already exists']
+
+    _TIMEOUT_SEC = 60
+
+    def __init__(self, endpoints, timeout=_TIMEOUT_SEC):
+        """
+        :param endpoints: Dictionary of endpoint names to endpoints
+        :param timeout: Seconds to wait for any endpoint to accept a transaction
+        """
+        if not endpoints:
+            raise ValueError('Hedged submission requires at least one endpoint')
+        self.endpoints = endpoints
+        self.timeout = timeout
+        self.__lock = threading.Lock()
+        self.__stats = {name: EndpointStats() for name in endpoints}
+        self.__executor = ThreadPoolExecutor(max_workers=len(endpoints) * 2, thread_name_prefix='submit')
+
+    def is_already_submitted(error):
+        response = getattr(error, 'response', None)
+        error_text = f"{error} {response.text if response is not None else ''}".lower()
+        return any([marker in error_text for marker in HedgedSubmitter.ALREADY_SUBMITTED_MARKERS])
+
+    def __submit_to(self, name, tx_cbor, txn_hash):
+        start = time.monotonic()
+        try:
+            result = self.endpoints[name].submit_txn_cbor(tx_cbor)
+            succeeded = True
+            return result if result else txn_hash
+        except Exception as e:
+            succeeded = HedgedSubmitter.is_already_submitted(e)
+            if succeeded:
+                print(f"Transaction {txn_hash} was already submitted to '{name}'")
+                return txn_hash
+            print(f"WARNING: Submitting {txn_hash} to '{name}' failed: {e}")
+            raise
+        finally:
+            with self.__lock:
+                self.__stats[name].record(time.monotonic() - start, succeeded)
+
+    def submit_txn_cbor(self, tx_cbor):
+        """
+        :param tx_cbor: Serialized signed transaction
+        :return: The transaction's hash, from the first endpoint to accept it
+        :raises Exception: The last endpoint's error if none accepted it
+        """
+        txn_hash = str(Transaction.from_cbor(tx_cbor).id)
+        pending = set([self.__executor.submit(self.__submit_to, name, tx_cbor, txn_hash) for name in self.endpoints])
+        deadline = time.monotonic() + self.timeout
+        last_error = None
+        while pending:
+            (done, pending) = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"No endpoint accepted {txn_hash} within {self.timeout}s")
+            for submission in done:
+                if submission.exception() is None:
+                    return submission.result()
+                last_error = submission.exception()
+        raise last_error
+
+    def submit_txn(self, signed_file):
+        with open(signed_file, 'r') as signed_filehandle:
+            tx_cbor = json.load(signed_filehandle)['cborHex']
+        return self.submit_txn_cbor(bytes.fromhex(tx_cbor))
+
+    def latencies(self):
+        """
+        :return: Per-endpoint submission counts and latencies (in milliseconds)
+        """
+        with self.__lock:
+            return {name: dict(vars(stats)) for name, stats in self.__stats.items()}
+
+    def close(self):
+        self.__executor.shutdown(wait=False)
@@ -0,0 +1,205 @@
+import json
+import math
+import os
+
+from pycardano import Address, AlonzoMetadata, Asset, AssetName, AuxiliaryData, Metadata, MultiAsset, NativeScript, Network, PaymentSigningKey, ScriptHash, Transaction, TransactionBody, TransactionInput, TransactionOutput, TransactionWitnessSet, Value, VerificationKeyWitness
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.utxo import Balance
+
+"""
+Drop-in replacement for the CardanoCli transaction commands that assembles,
+sizes, and signs mint transactions in memory with pycardano instead of
+spawning cardano-cli.  Transactions are still written to disk as text
+envelopes so the rest of the vending machine (and cardano-cli itself) can read
+them.  Mint transaction bodies are byte-identical to those produced by
+'cardano-cli transaction build-raw --alonzo-era'.
+
+Generic transactions built with arbitrary cardano-cli arguments (see
+build_raw_txn) are still delegated to cardano-cli.
+"""
+class PyCardanoTxBuilder(CardanoCli):
+
+    _BUILD_TYPE = 'Unwitnessed Tx AlonzoEra'
+    _FEE_PLACEHOLDER = 0xffffffff   # Largest fee that fits in a 5-byte CBOR uint
+    _HEX_PREFIX = '0x'
+    _SIGNED_TYPE = 'Witnessed Tx AlonzoEra'
+
+    def __init__(self, protocol_params=None):
+        super().__init__(protocol_params=protocol_params)
+        self.__signing_keys = {}
+
+    def __signing_key(self, signing_file):
+        if not signing_file in self.__signing_keys:
+            self.__signing_keys[signing_file] = PaymentSigningKey.load(signing_file)
+        return self.__signing_keys[signing_file]
+
+    def text_envelope(txn_cbor, signed=False):
+        """
+        :param txn_cbor: Serialized transaction
+        :param signed: Whether the transaction has been signed
+        :return: The cardano-cli text envelope for the transaction
+        """
+        envelope_type = PyCardanoTxBuilder._SIGNED_TYPE if signed else PyCardanoTxBuilder._BUILD_TYPE
+        return {'type': envelope_type, 'description': '', 'cborHex': txn_cbor.hex()}
+
+    def __write_envelope(self, txn_file, txn_cbor, signed=False):
+        with open(txn_file, 'w') as txn_filehandle:
+            json.dump(PyCardanoTxBuilder.text_envelope(txn_cbor, signed), txn_filehandle, indent=4)
+
+    def __read_txn(self, txn_file):
+        with open(txn_file, 'r') as txn_filehandle:
+            return Transaction.from_cbor(json.load(txn_filehandle)['cborHex'])
+
+    def __to_tx_in(tx_in_arg):
+        (txn_hash, txn_ix) = tx_in_arg.replace('--tx-in', '').strip().split('#')
+        return TransactionInput.from_primitive([txn_hash, int(txn_ix)])
+
+    def __to_tx_out(tx_out_arg):
+        tx_out = tx_out_arg.replace('--tx-out', '').strip().strip('"\'')
+        (addr, *amounts) = tx_out.split('+')
+        lovelace = 0
+        assets = {}
+        for amount in amounts:
+            (quantity, *unit) = amount.strip().split(' ')
+            unit = unit[0] if unit else Balance.LOVELACE_POLICY
+            if unit == Balance.LOVELACE_POLICY:
+                lovelace += int(quantity)
+                continue
+            (policy, _, hex_name) = unit.partition('.')
+            if not policy in assets:
+                assets[policy] = {}
+            assets[policy][hex_name] = assets[policy].get(hex_name, 0) + int(quantity)
+        value = Value(lovelace, PyCardanoTxBuilder.__to_multi_asset(assets)) if assets else lovelace
+        return TransactionOutput(Address.from_primitive(addr), value)
+
+    def __to_multi_asset(policy_assets):
+        multi_asset = MultiAsset()
+        for policy in sorted(policy_assets):
+            asset = Asset()
+            for hex_name in sorted(policy_assets[policy], key=lambda name: (len(name), name)):
+                asset[AssetName(bytes.fromhex(hex_name))] = policy_assets[policy][hex_name]
+            multi_asset[ScriptHash(bytes.fromhex(policy))] = asset
+        return multi_asset
+
+    def __to_metadatum(json_val):
+        if type(json_val) is dict:
+            return {key: PyCardanoTxBuilder.__to_metadatum(val) for key, val in json_val.items()}
+        if type(json_val) is list:
+            return [PyCardanoTxBuilder.__to_metadatum(val) for val in json_val]
+        if type(json_val) is str and json_val.startswith(PyCardanoTxBuilder._HEX_PREFIX):
+            try:
+                return bytes.fromhex(json_val[len(PyCardanoTxBuilder._HEX_PREFIX):])
+            except ValueError:
+                return json_val
+        return json_val
+
+    def __read_auxiliary_data(metadata_json_file):
+        with open(metadata_json_file, 'r') as metadata_filehandle:
+            return PyCardanoTxBuilder.__to_auxiliary_data(json.load(metadata_filehandle))
+
+    def __to_auxiliary_data(metadata_json):
+        metadata = Metadata({int(label): PyCardanoTxBuilder.__to_metadatum(val) for label, val in metadata_json.items()})
+        return AuxiliaryData(AlonzoMetadata(metadata=metadata))
+
+    def __load_native_script(script_file):
+        with open(script_file, 'r') as script_filehandle:
+            return NativeScript.from_dict(json.load(script_filehandle))
+
+    def __mint_txn(self, tx_in_args, tx_out_args, fee, auxiliary_data, mint, nft_policy_map, scripts_map):
+        inputs = sorted([PyCardanoTxBuilder.__to_tx_in(tx_in_arg) for tx_in_arg in tx_in_args], key=lambda tx_in: (tx_in.transaction_id.payload, tx_in.index))
+        outputs = [PyCardanoTxBuilder.__to_tx_out(tx_out_arg) for tx_out_arg in tx_out_args]
+
+        minted = None
+        native_scripts = None
+        if nft_policy_map:
+            minted = PyCardanoTxBuilder.__to_multi_asset({
+                policy: {nft_name.encode('UTF-8').hex(): 1 for nft_name in nft_policy_map[policy]} for policy in nft_policy_map
+            })
+            native_scripts = [PyCardanoTxBuilder.__load_native_script(scripts_map[script]) for script in scripts_map if script in nft_policy_map]
+
+        txn_body = TransactionBody(
+            inputs=inputs,
+            outputs=outputs,
+            fee=fee,
+            ttl=mint.expiration_slot if mint.expiration_slot else None,
+            auxiliary_data_hash=auxiliary_data.hash() if auxiliary_data else None,
+            validity_start=mint.initial_slot if mint.initial_slot else None,
+            mint=minted
+        )
+        return Transaction(txn_body, TransactionWitnessSet(native_scripts=native_scripts), auxiliary_data=auxiliary_data)
+
+    def build_raw_mint_txn(self, output_dir, txn_id, tx_in_args, tx_out_args, fee, metadata_json_file, mint, nft_policy_map, scripts_map):
+        raw_build_file = os.path.join(output_dir, CardanoCli.TXN_DIR, f"txn_{txn_id}.raw.build")
+        auxiliary_data = PyCardanoTxBuilder.__read_auxiliary_data(metadata_json_file) if metadata_json_file else None
+        txn = self.__mint_txn(tx_in_args, tx_out_args, fee, auxiliary_data, mint, nft_policy_map, scripts_map)
+        self.__write_envelope(raw_build_file, txn.to_cbor())
+        return raw_build_file
+
+    def build_raw_mint_txn_at_min_fee(self, output_dir, txn_id, tx_in_args, tx_outs_for_fee, witness_count, metadata_json_file, mint, nft_policy_map, scripts_map, fee_step=1):
+        """
+        Same as CardanoCli.build_raw_mint_txn_at_min_fee, but the fee is
+        iterated on in memory so only the final transaction is written.
+        """
+        raw_build_file = os.path.join(output_dir, CardanoCli.TXN_DIR, f"txn_{txn_id}.raw.build")
+        metadata_json = None
+        if metadata_json_file:
+            with open(metadata_json_file, 'r') as metadata_filehandle:
+                metadata_json = json.load(metadata_filehandle)
+        (txn_cbor, fee) = self.build_mint_txn_at_min_fee(txn_id, tx_in_args, tx_outs_for_fee, witness_count, metadata_json, mint, nft_policy_map, scripts_map, fee_step)
+        self.__write_envelope(raw_build_file, txn_cbor)
+        return (raw_build_file, fee)
+
+    def build_mint_txn_at_min_fee(self, txn_id, tx_in_args, tx_outs_for_fee, witness_count, metadata_json, mint, nft_policy_map, scripts_map, fee_step=1):
+        """
+        In-memory version of build_raw_mint_txn_at_min_fee that does not touch
+        the filesystem (other than reading the protocol parameters).
+
+        :param metadata_json: Transaction metadata as a JSON-style dict, if any
+        :return: A tuple of the serialized unsigned transaction and its fee
+        """
+        auxiliary_data = PyCardanoTxBuilder.__to_auxiliary_data(metadata_json) if metadata_json else None
+        fee_calculator = self.fee_calculator()
+        fee = CardanoCli.initial_fee(fee_calculator, witness_count, fee_step)
+        for iteration in range(PyCardanoTxBuilder._MAX_FEE_ITERATIONS):
+            txn_cbor = self.__mint_txn(tx_in_args, tx_outs_for_fee(fee), fee, auxiliary_data, mint, nft_policy_map, scripts_map).to_cbor()
+            min_fee = fee_calculator.min_fee(len(txn_cbor), witness_count)
+            if min_fee <= fee:
+                return (txn_cbor, fee)
+            fee = math.ceil(min_fee / fee_step) * fee_step
+        raise ValueError(f"Fee for {txn_id} did not converge after {PyCardanoTxBuilder._MAX_FEE_ITERATIONS} iterations (last was {fee})")
+
+    def calculate_min_fee(self, raw_build_file, tx_in_count, tx_out_count, witness_count):
+        txn = self.__read_txn(raw_build_file)
+        txn.transaction_body.fee = max(txn.transaction_body.fee, PyCardanoTxBuilder._FEE_PLACEHOLDER)
+        return self.fee_calculator().min_fee(len(txn.to_cbor()), witness_count)
+
+    def sign_txn(self, signing_files, build_file):
+        signed_file = f"{build_file}.signed"
+        with open(build_file, 'r') as build_filehandle:
+            txn_cbor = bytes.fromhex(json.load(build_filehandle)['cborHex'])
+        self.__write_envelope(signed_file, self.sign_txn_cbor(signing_files, txn_cbor), signed=True)
+        return signed_file
+
+    def sign_txn_cbor(self, signing_files, txn_cbor):
+        """
+        :param signing_files: Signing key files (loaded once and cached)
+        :param txn_cbor: Serialized unsigned transaction
+        :return: The serialized signed transaction
+        """
+        txn = Transaction.from_cbor(txn_cbor)
+        txn_body_hash = txn.transaction_body.hash()
+        witnesses = {}
+        for signing_file in signing_files:
+            signing_key = self.__signing_key(signing_file)
+            verification_key = signing_key.to_verification_key()
+            witnesses[verification_key.payload] = VerificationKeyWitness(verification_key, signing_key.sign(txn_body_hash))
+        txn.transaction_witness_set.vkey_witnesses = list(witnesses.values())
+        return txn.to_cbor()
+
+    def build_addr(self, payment_sign_key, mainnet=False):
+        verification_key = PaymentSigningKey.load(payment_sign_key).to_verification_key()
+        return str(Address(verification_key.hash(), network=Network.MAINNET if mainnet else Network.TESTNET))
+
+    def policy_id(self, script_file):
+        return PyCardanoTxBuilder.__load_native_script(script_file).hash().payload.hex()
@@ -0,0 +1,125 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cardano.wt.blockfrost import BlockfrostApi
+
+"""
+Handles a single webhook delivery for the listener attached to its server.
+"""
+class WebhookHandler(BaseHTTPRequestHandler):
+
+    def __respond(self, status, message):
+        body = json.dumps({'message': message}).encode('UTF-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        listener = self.server.listener
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length > WebhookListener._MAX_BODY_BYTES:
+            return self.__respond(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Payload larger than {WebhookListener._MAX_BODY_BYTES} bytes")
+        body = self.rfile.read(content_length)
+        if not listener.verify(self.headers.get(WebhookListener.SIGNATURE_HEADER, ''), body):
+            return self.__respond(HTTPStatus.UNAUTHORIZED, 'Invalid signature')
+        try:
+            num_enqueued = listener.ingest(json.loads(body))
+        except (ValueError, KeyError, TypeError) as e:
+            return self.__respond(HTTPStatus.BAD_REQUEST, f"Malformed payload: {e}")
+        self.__respond(HTTPStatus.OK, f"Enqueued {num_enqueued} mint request(s)")
+
+    def log_message(self, format, *args):
+        pass
+
+"""
+Embedded HTTP listener for Blockfrost address-activity (transaction) webhooks.
+Deliveries are verified against the webhook's auth token (HMAC-SHA256 of the
+timestamped payload), and outputs sent to the payment address are enqueued on
+the vending machine right away, so polling can fall back to a slow safety net.
+"""
+class WebhookListener(object):
+
+    SIGNATURE_HEADER = 'Blockfrost-Signature'
+    TRANSACTION_EVENT = 'transaction'
+
+    _MAX_BODY_BYTES = 5 * 1024 * 1024
+    _TOLERANCE_SEC = 600
+
+    def __init__(self, nft_vending_machine, secret, port, host='0.0.0.0', notify=None, tolerance=_TOLERANCE_SEC, clock=time.time):
+        if not secret:
+            raise ValueError('Webhook listener requires the webhook auth token to verify signatures')
+        self.nft_vending_machine = nft_vending_machine
+        self.host = host
+        self.port = port
+        self.notify = notify
+        self.tolerance = tolerance
+        self.__secret = secret.encode('UTF-8')
+        self.__clock = clock
+        self.__server = None
+        self.__thread = None
+
+    def verify(self, signature_header, body):
+        """
+        :param signature_header: Value of the Blockfrost-Signature header
+            ('t=<timestamp>,v1=<signature>', with one v1 per active token)
+        :param body: Raw request body
+        :return: Whether the body was signed with the auth token recently enough
+        """
+        timestamp = None
+        signatures = []
+        for element in signature_header.split(','):
+            (key, _, value) = element.strip().partition('=')
+            if key == 't':
+                timestamp = value
+            elif key == 'v1':
+                signatures.append(value)
+        if not timestamp or not timestamp.isdigit() or not signatures:
+            return False
+        if abs(self.__clock() - int(timestamp)) > self.tolerance:
+            return False
+        expected = hmac.new(self.__secret, f"{timestamp}.".encode('UTF-8') + body, hashlib.sha256).hexdigest()
+        return any([hmac.compare_digest(expected, signature) for signature in signatures])
+
+    def ingest(self, event):
+        """
+        :param event: Parsed webhook event
+        :return: How many outputs to the payment address were enqueued
+        """
+        if event.get('type') != WebhookListener.TRANSACTION_EVENT:
+            return 0
+        payment_addr = self.nft_vending_machine.payment_addr
+        mint_reqs = []
+        for txn in event['payload']:
+            for tx_output in txn['outputs']:
+                if tx_output['address'] == payment_addr and not tx_output.get('collateral'):
+                    mint_reqs.append(BlockfrostApi.to_utxo({**tx_output, 'tx_hash': txn['tx']['hash']}))
+        if mint_reqs:
+            print(f"Webhook {event.get('webhook_id')} pushed {len(mint_reqs)} mint request(s)")
+            self.nft_vending_machine.enqueue(mint_reqs)
+            if self.notify:
+                self.notify()
+        return len(mint_reqs)
+
+    def start(self):
+        self.__server = ThreadingHTTPServer((self.host, self.port), WebhookHandler)
+        self.__server.daemon_threads = True
+        self.__server.listener = self
+        self.port = self.__server.server_port
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='webhook-listener', daemon=True)
+        self.__thread.start()
+        print(f"Listening for webhooks on {self.host}:{self.port}")
+
+    def stop(self):
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__thread.join()
+            self.__server = None
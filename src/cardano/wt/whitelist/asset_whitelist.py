@@ -57,19 +57,22 @@ class SingleUseWhitelist(AssetWhitelist):
         :param wl_resources: The UTXOs spent in the mint request's input txn
             NOTE: Explicitly skips reference inputs
         :param num_mints: How many mints were successfully processed
+        :return: Filenames of the consumed whitelist slots (see release())
         """
+        consumed = []
         remaining_to_remove = num_mints
         for utxo_output in wl_resources:
             utxo_amounts = utxo_output['amount']
             for utxo_amount in utxo_amounts:
                 if not remaining_to_remove:
-                    return
+                    return consumed
                 asset_id = utxo_amount['unit']
                 num_removed = min(remaining_to_remove, self.num_whitelisted(asset_id))
-                self._remove_from_whitelist(asset_id, num_removed)
+                consumed.extend(self._remove_from_whitelist(asset_id, num_removed))
                 remaining_to_remove -= num_removed
         if remaining_to_remove != 0:
             raise ValueError(f"[MANUALLY DEBUG] THERE WAS AN OVERMINT FOR A WHITELIST ({remaining_to_remove}), THE MINT WAS ALREADY PROCESSED, INVESTIGATE {wl_resources}")
+        return consumed
 
 
 """
@@ -104,5 +107,6 @@ class UnlimitedWhitelist(AssetWhitelist):
 
         :param wl_resources: The UTXOs in the mint request's input transaction
         :param num_mints: How many mints were successfully processed
+        :return: Nothing consumed (empty list)
         """
-        pass
+        return []
@@ -20,6 +20,7 @@ class FilesystemBasedWhitelist(object):
         return glob.glob(f"{root_identifier_path}_[0-9]*")
 
     def _remove_from_whitelist(self, identifier, num_removed):
+        removed = []
         try:
             identifier_locations = self.__matching_files_for(identifier)
             print(f"Removing {num_removed} WL slot(s) of {len(identifier_locations)} remaining for '{identifier}'")
@@ -36,10 +37,24 @@ class FilesystemBasedWhitelist(object):
                             continue
                         linked_id_paths.append(linked_id_path)
                 shutil.move(identifier_location, self.consumed_dir)
+                removed.append(os.path.basename(identifier_location))
                 for linked_id_path in linked_id_paths:
                     shutil.move(linked_id_path, self.consumed_dir)
+                    removed.append(os.path.basename(linked_id_path))
         except Exception as e:
             print(f"[CATASTROPHIC] FILESYSTEM ERROR IN WHITELIST, THIS IS BAD! {e}")
+        return removed
+
+    def release(self, consumed):
+        """
+        Return consumed whitelist slots (and their linked identifiers) to the
+        whitelist, e.g., if the mint they were consumed for never went through.
+
+        :param consumed: Filenames returned by consume()
+        """
+        for filename in consumed:
+            print(f"Returning WL slot '{filename}' to the whitelist")
+            shutil.move(os.path.join(self.consumed_dir, filename), os.path.join(self.input_dir, filename))
 
     def num_whitelisted(self, identifier):
         return len(self.__matching_files_for(identifier))
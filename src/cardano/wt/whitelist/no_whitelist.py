@@ -30,6 +30,15 @@ class NoWhitelist(object):
 
         :param wl_resources: As returned by required_info()
         :param num_mints: How many mints were successfully processed
+        :return: Nothing consumed (empty list)
+        """
+        return []
+
+    def release(self, consumed):
+        """
+        No-operation because there is no whitelist to be returned to.
+
+        :param consumed: As returned by consume()
         """
         pass
 
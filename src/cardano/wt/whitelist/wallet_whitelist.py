@@ -98,9 +98,10 @@ class WalletWhitelist(FilesystemBasedWhitelist):
 
         :param wl_resources: The transaction's metadata (used for signatures)
         :param num_mints: How many mints were successfully processed
+        :return: Filenames of the consumed whitelist slots (see release())
         """
         if not num_mints:
-            return
+            return []
         message = self._get_signed_message(wl_resources['metadata'])
         try:
             verification = cip8.verify(message)
@@ -110,6 +111,6 @@ class WalletWhitelist(FilesystemBasedWhitelist):
                 raise ValueError(f"[MANUALLY DEBUG] THERE WAS AN OVERMINT FOR A WHITELIST ({num_mints}), THE MINT WAS ALREADY PROCESSED, INVESTIGATE {wl_resources}")
             if not num_whitelisted:
                 raise ValueError(f"[MANUALLY DEBUG] {stake_key} IS NOT ON THE WHITELIST BUT MINTED!")
-            self._remove_from_whitelist(stake_key, num_mints)
+            return self._remove_from_whitelist(stake_key, num_mints)
         except Exception as e:
             raise ValueError(f"[MANUALLY DEBUG] SOMEHOW MINTED OFF WHITELIST ({e}) WITH AN INVALIDLY SIGNED MESSAGE: {wl_resources}")
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+import requests
+import time
+
+from http.server import ThreadingHTTPServer
+
+from test_utils.fake_server import FakeHandler
+
+from cardano.wt.async_blockfrost import AsyncBlockfrostApi
+from cardano.wt.blockfrost import BlockfrostApi
+from cardano.wt.cache import DiskCache
+from cardano.wt.rate_limit import TokenBucket
+from cardano.wt.utxo import Utxo
+
+pytest.importorskip('httpx')
+
+SHORT_ADDR = 'addr_test1short'
+
+class AsyncTestHandler(FakeHandler):
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path.startswith('/txs/missing'):
+            return self.respond(404, {'error': 'Not Found'})
+        if self.path.startswith('/txs/slow'):
+            time.sleep(0.2)
+        if '/utxos?' in self.path:
+            page = int(self.path.split('page=')[1])
+            num_utxos = (5 if page == 1 else 0) if SHORT_ADDR in self.path else 100 if page < 3 else 5 if page == 3 else 0
+            return self.respond(200, [
+                {'tx_hash': 'a' * 64, 'output_index': (page - 1) * 100 + ix, 'amount': [{'unit': 'lovelace', 'quantity': '1000000'}]} for ix in range(num_utxos)
+            ])
+        if self.path == '/blocks/latest':
+            return self.respond(200, {'slot': 42, 'hash': 'b' * 64})
+        if self.path.endswith('/utxos'):
+            return self.respond(200, {'inputs': ['in'], 'outputs': ['out']})
+        self.respond(200, {'hash': self.path.split('/')[-1]})
+
+    def do_POST(self):
+        self.server.paths.append(self.path)
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.respond(200, body.hex())
+
+@pytest.fixture
+def local_server(fake_server):
+    return fake_server(AsyncTestHandler, paths=[])
+
+def run_async(api_base, test_coro, **kwargs):
+    async def with_client():
+        blockfrost_api = AsyncBlockfrostApi('project', api_base=api_base, max_get_retries=0, **kwargs)
+        try:
+            return await test_coro(blockfrost_api)
+        finally:
+            await blockfrost_api.close()
+    return asyncio.run(with_client())
+
+def test_matches_sync_surface(local_server):
+    api_base = local_server.url
+    async def calls(blockfrost_api):
+        return (
+            await blockfrost_api.get_txn('hash'),
+            await blockfrost_api.get_txn('missing'),
+            await blockfrost_api.get_inputs('hash'),
+            await blockfrost_api.get_outputs('hash'),
+            await blockfrost_api.get_utxos('addr_test1', set([Utxo('a' * 64, 1, [])])),
+            await blockfrost_api.submit_txn_cbor(bytes.fromhex('84a0')),
+            await blockfrost_api.get_tip()
+        )
+    (txn, missing, inputs, outputs, utxos, submitted, tip) = run_async(api_base, calls)
+    sync_api = BlockfrostApi('project', api_base=api_base, max_get_retries=0)
+    assert txn == sync_api.get_txn('hash')
+    assert missing is None
+    assert (inputs, outputs) == (['in'], ['out'])
+    assert len(utxos) == 204 and not Utxo('a' * 64, 1, []) in utxos
+    assert submitted == '84a0'
+    assert tip == sync_api.get_tip() == {'slot': 42, 'id': 'b' * 64}
+
+def test_overlaps_calls_and_coalesces_duplicates(local_server):
+    async def calls(blockfrost_api):
+        start = time.monotonic()
+        results = await asyncio.gather(*[blockfrost_api.get_txn(f"slow{idx % 3}") for idx in range(9)])
+        return (results, time.monotonic() - start)
+    (results, elapsed) = run_async(local_server.url, calls)
+    assert results == [{'hash': f"slow{idx % 3}"} for idx in range(9)]
+    assert sorted(local_server.paths) == ['/txs/slow0', '/txs/slow1', '/txs/slow2']
+    assert elapsed < 0.5
+
+def test_shares_cache_and_rate_limiter_with_sync_client(local_server, tmp_path):
+    api_base = local_server.url
+    rate_limiter = TokenBucket(1, 3)
+    cache = DiskCache(str(tmp_path))
+    sync_api = BlockfrostApi('project', api_base=api_base, max_get_retries=0, rate_limiter=rate_limiter, cache=cache)
+    sync_api.get_tx_utxos('cached')
+    async def calls(blockfrost_api):
+        return await blockfrost_api.get_tx_utxos('cached')
+    assert run_async(api_base, calls, rate_limiter=rate_limiter, cache=cache) == {'inputs': ['in'], 'outputs': ['out']}
+    run_async(api_base, lambda blockfrost_api: blockfrost_api.get_asset('asset'), rate_limiter=rate_limiter, cache=cache)
+    assert local_server.paths == ['/txs/cached/utxos', '/assets/asset']
+    assert rate_limiter.available() < 2
+
+def test_raises_sync_client_errors():
+    with ThreadingHTTPServer(('127.0.0.1', 0), AsyncTestHandler) as unresponsive_server:
+        with pytest.raises(requests.exceptions.Timeout):
+            run_async(f"http://127.0.0.1:{unresponsive_server.server_port}", lambda blockfrost_api: blockfrost_api.get_txn('hash'), read_timeout=0.1)
+
+def test_fetches_short_listing_in_one_request(local_server):
+    utxos = run_async(local_server.url, lambda blockfrost_api: blockfrost_api.get_utxos(SHORT_ADDR, set()), page_window=4)
+    assert len(utxos) == 5
+    assert local_server.paths == [f"/addresses/{SHORT_ADDR}/utxos?count=100&page=1"]
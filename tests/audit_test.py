@@ -0,0 +1,23 @@
+import json
+import os
+
+from cardano.wt.audit import AuditSink
+
+def test_writes_json_in_background(tmp_path):
+    audit_sink = AuditSink()
+    audit_file = os.path.join(tmp_path, 'audit.json')
+    audit_sink.write_json(audit_file, {'721': {'a': 1}})
+    audit_sink.flush()
+    with open(audit_file, 'r') as audit_filehandle:
+        assert json.load(audit_filehandle) == {'721': {'a': 1}}
+    audit_sink.close()
+
+def test_failed_writes_do_not_stop_sink(tmp_path):
+    audit_sink = AuditSink()
+    audit_file = os.path.join(tmp_path, 'audit.json')
+    audit_sink.write_json(os.path.join(tmp_path, 'missing', 'audit.json'), {})
+    audit_sink.write_json(audit_file, [1, 2])
+    audit_sink.close()
+    assert not os.path.exists(os.path.join(tmp_path, 'missing'))
+    with open(audit_file, 'r') as audit_filehandle:
+        assert json.load(audit_filehandle) == [1, 2]
@@ -0,0 +1,113 @@
+import pytest
+import requests
+import time
+
+from http.server import ThreadingHTTPServer
+
+from test_utils.fake_server import FakeHandler
+
+from cardano.wt.blockfrost import BlockfrostApi
+from cardano.wt.budget import RequestBudget
+from cardano.wt.cache import DiskCache
+from cardano.wt.utxo import Utxo
+
+SHORT_ADDR = 'addr_test1short'
+
+class CountingHandler(FakeHandler):
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.project_ids.append(self.headers['project_id'])
+        self.server.paths.append(self.path)
+        if '/utxos?' in self.path:
+            page = int(self.path.split('page=')[1])
+            # Pages overlap by one UTxO to exercise deduplication
+            first_ix = (page - 1) * 99
+            num_utxos = (5 if page == 1 else 0) if SHORT_ADDR in self.path else 100 if page < 3 else 5 if page == 3 else 0
+            # Serve the first page slowest to check that pages are still handed back in order
+            time.sleep(0.1 if page == 1 else 0)
+            return self.respond(200, [
+                {'tx_hash': 'a' * 64, 'output_index': ix, 'amount': [{'unit': 'lovelace', 'quantity': '1000000'}]} for ix in range(first_ix, first_ix + num_utxos)
+            ])
+        self.respond(404 if self.path.startswith('/txs/missing') else 200, {'hash': self.path.split('/')[-1]})
+
+@pytest.fixture
+def local_server(fake_server):
+    return fake_server(CountingHandler, connections=0, project_ids=[], paths=[])
+
+def test_reuses_connections_across_calls(local_server):
+    blockfrost_api = BlockfrostApi('project', api_base=local_server.url, max_get_retries=0)
+    for idx in range(5):
+        assert blockfrost_api.get_txn(f"hash{idx}") == {'hash': f"hash{idx}"}
+    assert blockfrost_api.get_txn('missing') is None
+    blockfrost_api.close()
+    assert local_server.connections == 1
+    assert local_server.project_ids == ['project'] * 6
+
+def test_times_out_on_unresponsive_server():
+    with ThreadingHTTPServer(('127.0.0.1', 0), CountingHandler) as unresponsive_server:
+        blockfrost_api = BlockfrostApi('project', api_base=f"http://127.0.0.1:{unresponsive_server.server_port}", read_timeout=0.1, max_get_retries=0)
+        with pytest.raises(requests.exceptions.Timeout):
+            blockfrost_api.get_txn('hash')
+
+def test_http2_session_matches_requests_interface(local_server):
+    pytest.importorskip('h2')
+    blockfrost_api = BlockfrostApi('project', api_base=local_server.url, max_get_retries=0, http2=True)
+    assert blockfrost_api.get_txn('hash') == {'hash': 'hash'}
+    assert blockfrost_api.get_txn('missing') is None
+    blockfrost_api.close()
+    assert local_server.project_ids == ['project'] * 2
+
+def test_caches_only_immutable_resources(local_server, tmp_path):
+    cache = DiskCache(str(tmp_path))
+    blockfrost_api = BlockfrostApi('project', api_base=local_server.url, max_get_retries=0, cache=cache)
+    for attempt in range(3):
+        assert blockfrost_api.get_txn('hash') == {'hash': 'hash'}
+        assert blockfrost_api.get_asset('asset') == {'hash': 'asset'}
+    assert blockfrost_api.get_txn('missing') is None
+    assert len(local_server.project_ids) == 5
+    assert len(cache) == 1
+
+def test_streams_deduplicated_utxos_page_by_page(local_server):
+    blockfrost_api = BlockfrostApi('project', api_base=local_server.url, max_get_retries=0, page_window=1)
+    exclusions = set([Utxo('a' * 64, 1, [])])
+    utxos = blockfrost_api.iter_utxos('addr_test1', exclusions)
+    assert next(utxos) == Utxo('a' * 64, 0, [])
+    assert not [path for path in local_server.paths if 'page=3' in path]
+    remaining = list(utxos)
+    assert len(remaining) == len(set(remaining)) == 201
+    assert not Utxo('a' * 64, 1, []) in remaining
+    assert blockfrost_api.get_utxos('addr_test1', exclusions) == [Utxo('a' * 64, 0, [])] + remaining
+
+def test_fetches_short_listing_in_one_request(local_server):
+    blockfrost_api = BlockfrostApi('project', api_base=local_server.url, max_get_retries=0, page_window=4)
+    assert len(blockfrost_api.get_utxos(SHORT_ADDR, set())) == 5
+    assert [path for path in local_server.paths if '/utxos?' in path] == [f"/addresses/{SHORT_ADDR}/utxos?count=100&page=1"]
+
+def test_fetches_window_of_pages_in_order(local_server):
+    blockfrost_api = BlockfrostApi('project', api_base=local_server.url, max_get_retries=0, page_window=4)
+    utxos = blockfrost_api.iter_utxos('addr_test1', set())
+    assert next(utxos) == Utxo('a' * 64, 0, [])
+    assert local_server.paths[0].endswith('page=1')
+    assert [utxo.ix for utxo in utxos] == list(range(1, 203))
+    pages = [int(path.split('page=')[1]) for path in local_server.paths if '/utxos?' in path]
+    assert sorted(pages) == list(range(1, len(pages) + 1)) and 3 <= len(pages) <= 6
+
+def test_coalesces_back_to_back_immutable_calls(local_server):
+    blockfrost_api = BlockfrostApi('project', api_base=local_server.url, max_get_retries=0)
+    for attempt in range(3):
+        assert blockfrost_api.get_tx_utxos('hash') == {'hash': 'utxos'}
+        assert blockfrost_api.get_asset('asset') == {'hash': 'asset'}
+    assert local_server.paths == ['/txs/hash/utxos'] + ['/assets/asset'] * 3
+
+def test_counts_calls_against_budget(local_server, tmp_path):
+    budget = RequestBudget(1000)
+    blockfrost_api = BlockfrostApi('project', api_base=local_server.url, max_get_retries=0, cache=DiskCache(str(tmp_path)), coalesce_ttl=0, budget=budget)
+    for attempt in range(2):
+        blockfrost_api.get_txn('hash1')
+    blockfrost_api.get_txn('missing1')
+    blockfrost_api.get_utxos(SHORT_ADDR, set())
+    assert budget.metrics()['endpoints'] == {'txs/{}': 2, 'addresses/{}/utxos': 1}
@@ -0,0 +1,81 @@
+import pytest
+
+from cardano.wt.budget import RequestBudget
+from cardano.wt.poll_scheduler import AdaptivePollScheduler
+from cardano.wt.rate_limit import TokenBucket
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+class FakeClock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_rejects_nonpositive_quota():
+    with pytest.raises(ValueError):
+        RequestBudget(0)
+
+def test_groups_calls_by_endpoint():
+    assert RequestBudget.endpoint('txs/abc123/utxos') == 'txs/{}/utxos'
+    assert RequestBudget.endpoint('addresses/addr_test1qz9/utxos?count=100&page=2') == 'addresses/{}/utxos'
+    assert RequestBudget.endpoint('/tx/submit') == 'tx/submit'
+    assert RequestBudget.endpoint('epochs/latest/parameters') == 'epochs/latest/parameters'
+
+def test_counts_and_resets_at_midnight_utc():
+    clock = FakeClock(100 * DAY + 12 * HOUR)
+    budget = RequestBudget(1000, clock=clock)
+    for idx in range(3):
+        budget.record(f"txs/{idx}abc/utxos")
+    budget.record('tx/submit')
+    assert budget.metrics() == {
+        'daily_quota': 1000,
+        'used': 4,
+        'remaining': 996,
+        'projected': 8,
+        'endpoints': {'txs/{}/utxos': 3, 'tx/submit': 1}
+    }
+    clock.now = 101 * DAY
+    assert budget.remaining() == 1000
+    assert budget.metrics()['endpoints'] == {}
+
+def test_paces_non_critical_calls_first():
+    clock = FakeClock(100 * DAY + 12 * HOUR)
+    budget = RequestBudget(10000, clock=clock)
+    for idx in range(4500):
+        budget.record('addresses/addr1/utxos')
+    assert budget.pressure() == 0.9
+    assert budget.pacing_delay(TokenBucket.LOW) == 12 * HOUR / 5500
+    assert budget.pacing_delay(TokenBucket.NORMAL) == 0
+    assert budget.pacing_delay(TokenBucket.HIGH) == 0
+    for idx in range(1000):
+        budget.record('addresses/addr1/utxos')
+    assert budget.pacing_delay(TokenBucket.NORMAL) == 12 * HOUR / 4500
+    assert budget.pacing_delay(TokenBucket.HIGH) == 0
+    for idx in range(10000):
+        budget.record('addresses/addr1/utxos')
+    assert budget.pacing_delay(TokenBucket.LOW) == 60
+    assert budget.remaining() == 0
+
+def test_projects_early_usage_over_at_least_an_hour():
+    clock = FakeClock(100 * DAY + 60)
+    budget = RequestBudget(DAY, clock=clock)
+    for idx in range(60):
+        budget.record('blocks/latest')
+    assert budget.pressure() < 0.05
+
+def test_stretches_polling_when_over_budget():
+    clock = FakeClock(100 * DAY + 12 * HOUR)
+    budget = RequestBudget(1000, clock=clock)
+    poll_scheduler = AdaptivePollScheduler(2, 60, budget=budget)
+    assert poll_scheduler.next_wait(1) == 2
+    for idx in range(750):
+        budget.record('addresses/addr1/utxos')
+    assert poll_scheduler.next_wait(1) == 3
+    assert poll_scheduler.current_wait == 2
+    for idx in range(10000):
+        budget.record('addresses/addr1/utxos')
+    assert poll_scheduler.next_wait(1) == 20
@@ -0,0 +1,36 @@
+import os
+
+from cardano.wt.cache import DiskCache
+
+def test_round_trips_documents(tmp_path):
+    cache = DiskCache(os.path.join(tmp_path, 'cache'))
+    assert cache.get('mainnet', 'txs/abc') is None
+    cache.put('mainnet', 'txs/abc', {'inputs': [], 'outputs': [1]})
+    assert cache.get('mainnet', 'txs/abc') == {'inputs': [], 'outputs': [1]}
+    assert cache.get('preprod', 'txs/abc') is None
+    assert len(cache) == 1
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(os.path.join(tmp_path, 'cache'), max_bytes=25)
+    cache.put('net', 'first', 'a' * 8)
+    cache.put('net', 'second', 'b' * 8)
+    assert cache.get('net', 'first') == 'a' * 8
+    cache.put('net', 'third', 'c' * 8)
+    assert cache.get('net', 'second') is None
+    assert cache.get('net', 'first') == 'a' * 8
+    assert cache.get('net', 'third') == 'c' * 8
+    assert cache.size() <= 25
+
+def test_survives_restarts(tmp_path):
+    cache_dir = os.path.join(tmp_path, 'cache')
+    DiskCache(cache_dir).put('net', 'txs/abc', [1, 2, 3])
+    reopened = DiskCache(cache_dir)
+    assert len(reopened) == 1
+    assert reopened.get('net', 'txs/abc') == [1, 2, 3]
+
+def test_shrinks_to_new_size_cap_on_load(tmp_path):
+    cache_dir = os.path.join(tmp_path, 'cache')
+    cache = DiskCache(cache_dir)
+    for idx in range(5):
+        cache.put('net', f"txs/{idx}", 'x' * 10)
+    assert len(DiskCache(cache_dir, max_bytes=30)) == 2
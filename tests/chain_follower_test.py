@@ -0,0 +1,232 @@
+import json
+import pytest
+import queue
+import threading
+
+from cardano.wt.chain_follower import ChainFollower, OgmiosChainSync
+from cardano.wt.utxo import Utxo
+
+PAYMENT_ADDR = 'addr_test1vplgrtqgphv0hpx2v6zyzwxxmyh0q4vjrzeuv7qvtk3ev2cmmgd54'
+BUYER_ADDR = 'addr_test1qbuyer'
+POLICY_ID = 'a' * 56
+EXISTING_TXN = '0' * 64
+
+def point(slot):
+    return {'slot': slot, 'id': f"block{slot}"}
+
+def txn(txn_id, inputs, outputs, **kwargs):
+    return {
+        'id': txn_id,
+        'spends': 'inputs',
+        'inputs': [{'transaction': {'id': tx_hash}, 'index': ix} for (tx_hash, ix) in inputs],
+        'outputs': [{'address': address, 'value': value} for (address, value) in outputs],
+        **kwargs
+    }
+
+def forward(slot, transactions, tip=None):
+    return {'direction': 'forward', 'block': {**point(slot), 'transactions': transactions}, 'tip': tip if tip else point(slot)}
+
+def backward(rollback_point, tip):
+    return {'direction': 'backward', 'point': rollback_point, 'tip': tip}
+
+def ada(lovelace, **assets):
+    return {'ada': {'lovelace': lovelace}, **{policy: asset for policy, asset in assets.items()}}
+
+class FakeBackend(object):
+
+    def __init__(self, utxos, tip=None):
+        self.utxos = utxos
+        self.tip = tip if tip else point(10)
+        self.calls = 0
+
+    def get_tip(self):
+        return self.tip
+
+    def get_utxos(self, address, exclusions):
+        self.calls += 1
+        return list(self.utxos)
+
+    def iter_utxos(self, address, exclusions):
+        return iter([utxo for utxo in self.get_utxos(address, exclusions) if not utxo in exclusions])
+
+class FakeChainSync(object):
+
+    def __init__(self, tip, chain_points, responses):
+        self.current_tip = tip
+        self.chain_points = chain_points
+        self.responses = queue.Queue()
+        for response in responses:
+            self.responses.put(response)
+        self.intersections = []
+        self.closed = threading.Event()
+
+    def connect(self):
+        self.closed.clear()
+
+    def close(self):
+        self.closed.set()
+
+    def tip(self):
+        return self.current_tip
+
+    def find_intersection(self, points):
+        self.intersections.append(points)
+        for candidate in points:
+            if candidate in self.chain_points:
+                return candidate
+        raise ValueError('No intersection found')
+
+    def next_block(self):
+        while not self.closed.is_set():
+            try:
+                return self.responses.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        raise ConnectionError('closed')
+
+    def wait_drained(self):
+        while not self.responses.empty():
+            self.closed.wait(0.01)
+        # Let the follower finish applying the last response
+        self.closed.wait(0.1)
+
+def follow(chain_sync, state_file, bootstrap=None, on_utxo=None):
+    follower = ChainFollower(PAYMENT_ADDR, chain_sync, str(state_file), bootstrap=bootstrap, on_utxo=on_utxo)
+    assert follower.start(sync_timeout=5)
+    chain_sync.wait_drained()
+    return follower
+
+def test_bootstraps_and_follows_new_payments(tmp_path):
+    found = []
+    bootstrap = FakeBackend([Utxo(EXISTING_TXN, 0, [])])
+    chain_sync = FakeChainSync(point(10), [point(10)], [
+        backward(point(10), point(10)),
+        forward(11, [txn('1' * 64, [(EXISTING_TXN, 5)], [(BUYER_ADDR, ada(2000000)), (PAYMENT_ADDR, ada(10000000, **{POLICY_ID: {'6e6674': 1}}))])]),
+        forward(12, [txn('2' * 64, [(EXISTING_TXN, 0)], [(BUYER_ADDR, ada(1000000))])])
+    ])
+    follower = follow(chain_sync, tmp_path / 'state.json', bootstrap=bootstrap, on_utxo=found.append)
+    assert found == [Utxo('1' * 64, 1, [])]
+    assert [(balance.lovelace, balance.policy) for balance in found[0].balances] == [(10000000, 'lovelace'), (1, f"{POLICY_ID}6e6674")]
+    assert follower.get_utxos(PAYMENT_ADDR, set()) == [Utxo('1' * 64, 1, [])]
+    assert follower.get_utxos(PAYMENT_ADDR, set([Utxo('1' * 64, 1, [])])) == []
+    assert bootstrap.calls == 1
+    follower.stop()
+    with pytest.raises(ValueError):
+        follower.get_utxos(BUYER_ADDR, set())
+
+def test_replays_blocks_the_backend_has_not_indexed(tmp_path):
+    found = []
+    # The node is at slot 12 but the backend listing only reflects blocks up to slot 10
+    bootstrap = FakeBackend([Utxo(EXISTING_TXN, 0, [])], tip=point(10))
+    chain_sync = FakeChainSync(point(12), [point(10), point(12)], [
+        backward(point(10), point(12)),
+        forward(11, [txn('1' * 64, [], [(PAYMENT_ADDR, ada(10000000))])], tip=point(12)),
+        forward(12, [])
+    ])
+    follower = follow(chain_sync, tmp_path / 'state.json', bootstrap=bootstrap, on_utxo=found.append)
+    assert chain_sync.intersections == [[point(10)]]
+    assert found == [Utxo('1' * 64, 0, [])]
+    assert follower.get_utxos(PAYMENT_ADDR, set()) == [Utxo(EXISTING_TXN, 0, []), Utxo('1' * 64, 0, [])]
+    follower.stop()
+
+def test_undoes_rolled_back_blocks(tmp_path):
+    bootstrap = FakeBackend([Utxo(EXISTING_TXN, 0, [])])
+    chain_sync = FakeChainSync(point(10), [point(10)], [
+        backward(point(10), point(12)),
+        forward(11, [txn('1' * 64, [(EXISTING_TXN, 0)], [(PAYMENT_ADDR, ada(3000000))])], tip=point(12)),
+        forward(12, [
+            txn('2' * 64, [('1' * 64, 0)], [(PAYMENT_ADDR, ada(2000000))]),
+            txn('3' * 64, [], [(PAYMENT_ADDR, ada(5000000))])
+        ]),
+        backward(point(11), point(12))
+    ])
+    follower = follow(chain_sync, tmp_path / 'state.json', bootstrap=bootstrap)
+    assert follower.get_utxos(PAYMENT_ADDR, set()) == [Utxo('1' * 64, 0, [])]
+    chain_sync.responses.put(backward(point(10), point(12)))
+    chain_sync.wait_drained()
+    assert follower.get_utxos(PAYMENT_ADDR, set()) == [Utxo(EXISTING_TXN, 0, [])]
+    follower.stop()
+
+def test_only_applies_collateral_of_failed_transactions(tmp_path):
+    failed_txn = txn('1' * 64, [(EXISTING_TXN, 1)], [(PAYMENT_ADDR, ada(9000000))], spends='collaterals',
+        collaterals=[{'transaction': {'id': EXISTING_TXN}, 'index': 0}], collateralReturn={'address': PAYMENT_ADDR, 'value': ada(4000000)})
+    bootstrap = FakeBackend([Utxo(EXISTING_TXN, 0, []), Utxo(EXISTING_TXN, 1, [])])
+    chain_sync = FakeChainSync(point(10), [point(10)], [backward(point(10), point(11)), forward(11, [failed_txn])])
+    follower = follow(chain_sync, tmp_path / 'state.json', bootstrap=bootstrap)
+    assert follower.get_utxos(PAYMENT_ADDR, set()) == [Utxo(EXISTING_TXN, 1, []), Utxo('1' * 64, 1, [])]
+    follower.stop()
+
+def test_resumes_from_state_file(tmp_path):
+    state_file = tmp_path / 'state.json'
+    chain_sync = FakeChainSync(point(10), [point(10)], [
+        backward(point(10), point(11)),
+        forward(11, [txn('1' * 64, [], [(PAYMENT_ADDR, ada(3000000))])])
+    ])
+    follow(chain_sync, state_file, bootstrap=FakeBackend([])).stop()
+    assert json.loads(state_file.read_text())['point'] == point(11)
+
+    resumed_sync = FakeChainSync(point(12), [point(11), point(12)], [
+        backward(point(11), point(12)),
+        forward(12, [txn('2' * 64, [('1' * 64, 0)], [(PAYMENT_ADDR, ada(2000000))])])
+    ])
+    resumed = follow(resumed_sync, state_file)
+    assert resumed_sync.intersections == [[point(11)]]
+    assert resumed.get_utxos(PAYMENT_ADDR, set()) == [Utxo('2' * 64, 0, [])]
+    resumed.stop()
+
+    with pytest.raises(ValueError):
+        ChainFollower(BUYER_ADDR, resumed_sync, str(state_file))
+
+def test_bootstraps_again_without_intersection(tmp_path):
+    state_file = tmp_path / 'state.json'
+    follow(FakeChainSync(point(10), [point(10)], [backward(point(10), point(10))]), state_file, bootstrap=FakeBackend([])).stop()
+    bootstrap = FakeBackend([Utxo(EXISTING_TXN, 3, [])], tip=point(20))
+    forked_sync = FakeChainSync(point(20), [point(20)], [backward(point(20), point(20))])
+    follower = follow(forked_sync, state_file, bootstrap=bootstrap)
+    assert forked_sync.intersections == [[point(10)], [point(20)]]
+    assert follower.get_utxos(PAYMENT_ADDR, set()) == [Utxo(EXISTING_TXN, 3, [])]
+    follower.stop()
+
+def test_ogmios_chain_sync_speaks_json_rpc():
+    sync_server = pytest.importorskip('websockets.sync.server')
+    pytest.importorskip('websocket')
+    requests = []
+    def ogmios(connection):
+        for message in connection:
+            request = json.loads(message)
+            requests.append(request)
+            if request['method'] == 'queryNetwork/tip':
+                result = point(10)
+            elif request['method'] == 'findIntersection':
+                if request['params']['points'] == [point(99)]:
+                    connection.send(json.dumps({'jsonrpc': '2.0', 'method': 'findIntersection', 'error': {'code': 1000, 'message': 'No intersection found.'}, 'id': None}))
+                    continue
+                result = {'intersection': request['params']['points'][0], 'tip': point(10)}
+            else:
+                result = backward(point(10), point(10))
+            connection.send(json.dumps({'jsonrpc': '2.0', 'method': request['method'], 'result': result, 'id': None}))
+    with sync_server.serve(ogmios, '127.0.0.1', 0) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        chain_sync = OgmiosChainSync(f"ws://127.0.0.1:{server.socket.getsockname()[1]}", timeout=5)
+        chain_sync.connect()
+        assert chain_sync.tip() == point(10)
+        assert chain_sync.find_intersection([point(10)]) == point(10)
+        with pytest.raises(ValueError):
+            chain_sync.find_intersection([point(99)])
+        assert chain_sync.next_block() == backward(point(10), point(10))
+        chain_sync.close()
+        server.shutdown()
+    assert [request['method'] for request in requests] == ['queryNetwork/tip', 'findIntersection', 'findIntersection', 'nextBlock']
+
+class UnreachableChainSync(FakeChainSync):
+
+    def connect(self):
+        raise ConnectionError('Ogmios is down')
+
+def test_falls_back_to_bootstrap_listing_until_synced(tmp_path):
+    bootstrap = FakeBackend([Utxo(EXISTING_TXN, 0, []), Utxo(EXISTING_TXN, 1, [])])
+    follower = ChainFollower(PAYMENT_ADDR, UnreachableChainSync(point(10), [], []), str(tmp_path / 'state.json'), bootstrap=bootstrap)
+    assert not follower.start(sync_timeout=0.1)
+    assert not follower.is_synced()
+    assert follower.get_utxos(PAYMENT_ADDR, set([Utxo(EXISTING_TXN, 1, [])])) == [Utxo(EXISTING_TXN, 0, [])]
+    follower.stop()
@@ -1,3 +1,8 @@
+import pytest
+import threading
+
+from http.server import ThreadingHTTPServer
+
 def pytest_addoption(parser):
     parser.addoption("--available-assets", type=int)
     parser.addoption("--assets-dir", type=str)
@@ -6,3 +11,24 @@ def pytest_addoption(parser):
     parser.addoption("--min-nfts", type=int)
     parser.addoption("--num-wallets", type=int)
     parser.addoption("--old-test-dir", type=str)
+
+@pytest.fixture
+def fake_server():
+    """
+    Starts fake HTTP servers on free local ports (shut down after the test):
+    fake_server(handler_class, **attrs) sets attrs on the server for the
+    handler's use and returns the server, whose url is the base URL.
+    """
+    servers = []
+    def start(handler_class, **attrs):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        for attr, value in attrs.items():
+            setattr(server, attr, value)
+        server.url = f"http://127.0.0.1:{server.server_port}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
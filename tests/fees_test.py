@@ -0,0 +1,18 @@
+import os
+
+from test_utils.fs import data_file_path
+
+from cardano.wt.fees import FeeCalculator
+
+def test_reads_linear_fee_from_protocol(request):
+    fee_calculator = FeeCalculator(data_file_path(request, os.path.join('protocol', 'preprod.json')))
+    assert fee_calculator.fee_per_byte == 44
+    assert fee_calculator.fee_fixed == 155381
+    assert fee_calculator.min_fee(1000, 0) == (44 * 1000) + 155381
+
+def test_estimates_witness_sizes(request):
+    fee_calculator = FeeCalculator(data_file_path(request, os.path.join('protocol', 'preprod.json')))
+    one_witness_size = 1000 + FeeCalculator.WITNESS_SET_OVERHEAD + FeeCalculator.WITNESS_SIZE
+    assert fee_calculator.witnessed_size(1000, 1) == one_witness_size
+    assert fee_calculator.witnessed_size(1000, 2) == one_witness_size + FeeCalculator.WITNESS_SIZE
+    assert fee_calculator.min_fee(1000, 2) == (44 * (one_witness_size + FeeCalculator.WITNESS_SIZE)) + 155381
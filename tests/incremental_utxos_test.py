@@ -0,0 +1,93 @@
+import pytest
+
+from urllib.parse import urlparse
+
+from test_utils.fake_server import FakeHandler
+
+from cardano.wt.blockfrost import BlockfrostApi
+from cardano.wt.utxo import Utxo
+
+PAYMENT_ADDR = 'addr_test1payment'
+OTHER_ADDR = 'addr_test1other'
+
+class FakeChainHandler(FakeHandler):
+
+    def do_GET(self):
+        chain = self.server.chain
+        path = urlparse(self.path).path.rstrip('/')
+        chain.requests.append(self.path)
+        status = 200
+        if path == '/blocks/latest':
+            body = {'height': chain.height}
+        elif path == f"/addresses/{PAYMENT_ADDR}/utxos":
+            body = [{'tx_hash': utxo.hash, 'output_index': utxo.ix, 'amount': [{'unit': 'lovelace', 'quantity': '1000000'}]} for utxo in chain.utxos()] if 'page=1' in self.path else []
+        elif path == f"/addresses/{PAYMENT_ADDR}/transactions":
+            from_height = int(self.path.split('from=')[1].split('&')[0])
+            body = [{'tx_hash': txn_hash, 'tx_index': 0, 'block_height': height} for (txn_hash, height, inputs, outputs) in chain.txns if height >= from_height] if 'page=1' in self.path else []
+        elif path.startswith('/txs/') and path.endswith('/utxos'):
+            txn_hash = path.split('/')[2]
+            (txn_hash, height, inputs, outputs) = [txn for txn in chain.txns if txn[0] == txn_hash][0]
+            body = {
+                'inputs': [{'address': PAYMENT_ADDR, 'tx_hash': utxo.hash, 'output_index': utxo.ix, 'reference': False, 'collateral': False} for utxo in inputs],
+                'outputs': [{'address': addr, 'output_index': ix, 'amount': [{'unit': 'lovelace', 'quantity': '1000000'}]} for (ix, addr) in enumerate(outputs)]
+            }
+        else:
+            status = 404
+            body = {'status_code': 404}
+        self.respond(status, body)
+
+class FakeChain(object):
+
+    def __init__(self):
+        self.height = 100
+        self.txns = []
+        self.requests = []
+
+    def add_txn(self, txn_hash, inputs, outputs):
+        self.height += 1
+        self.txns.append((txn_hash, self.height, inputs, outputs))
+
+    def utxos(self):
+        spent = set([utxo for txn in self.txns for utxo in txn[2]])
+        created = [Utxo(txn[0], ix, []) for txn in self.txns for (ix, addr) in enumerate(txn[3]) if addr == PAYMENT_ADDR]
+        return [utxo for utxo in created if not utxo in spent]
+
+@pytest.fixture
+def fake_chain(fake_server):
+    return fake_server(FakeChainHandler, chain=FakeChain())
+
+def incremental_api(fake_chain, reconcile_interval=900):
+    return BlockfrostApi('project', api_base=fake_chain.url, max_get_retries=0, incremental_utxos=True, reconcile_interval=reconcile_interval)
+
+def test_only_fetches_new_transactions(fake_chain):
+    chain = fake_chain.chain
+    chain.add_txn('a' * 64, [], [PAYMENT_ADDR, OTHER_ADDR])
+    blockfrost_api = incremental_api(fake_chain)
+    assert blockfrost_api.get_utxos(PAYMENT_ADDR, set()) == [Utxo('a' * 64, 0, [])]
+
+    chain.add_txn('b' * 64, [], [OTHER_ADDR, PAYMENT_ADDR])
+    chain.add_txn('c' * 64, [Utxo('a' * 64, 0, [])], [OTHER_ADDR])
+    chain.requests.clear()
+    assert blockfrost_api.get_utxos(PAYMENT_ADDR, set()) == [Utxo('b' * 64, 1, [])]
+    assert not [request for request in chain.requests if '/utxos?' in request]
+    assert sorted([request for request in chain.requests if request.startswith('/txs/')]) == [f"/txs/{'b' * 64}/utxos", f"/txs/{'c' * 64}/utxos"]
+
+def test_does_not_reapply_transactions_at_cursor(fake_chain):
+    chain = fake_chain.chain
+    blockfrost_api = incremental_api(fake_chain)
+    assert blockfrost_api.get_utxos(PAYMENT_ADDR, set()) == []
+    chain.add_txn('a' * 64, [], [PAYMENT_ADDR])
+    assert blockfrost_api.get_utxos(PAYMENT_ADDR, set()) == [Utxo('a' * 64, 0, [])]
+    chain.requests.clear()
+    assert blockfrost_api.get_utxos(PAYMENT_ADDR, set([Utxo('a' * 64, 0, [])])) == []
+    assert not [request for request in chain.requests if request.startswith('/txs/')]
+
+def test_reconciles_periodically(fake_chain):
+    chain = fake_chain.chain
+    chain.add_txn('a' * 64, [], [PAYMENT_ADDR])
+    blockfrost_api = incremental_api(fake_chain, reconcile_interval=0)
+    assert blockfrost_api.get_utxos(PAYMENT_ADDR, set()) == [Utxo('a' * 64, 0, [])]
+    chain.add_txn('b' * 64, [Utxo('a' * 64, 0, [])], [PAYMENT_ADDR])
+    chain.requests.clear()
+    assert blockfrost_api.get_utxos(PAYMENT_ADDR, set()) == [Utxo('b' * 64, 0, [])]
+    assert [request for request in chain.requests if '/utxos?' in request]
@@ -0,0 +1,113 @@
+import json
+import os
+
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.inventory import Inventory
+
+def create_nft_files(metadata_dir, filenames):
+    for filename in filenames:
+        with open(os.path.join(metadata_dir, filename), 'w') as nft_file:
+            nft_file.write('{}')
+
+def test_reserves_in_sorted_order(vm_test_config):
+    create_nft_files(vm_test_config.metadata_dir, ['c.json', 'a.json', 'b.json'])
+    inventory = Inventory(vm_test_config.metadata_dir)
+    assert len(inventory) == 3
+    reserved = inventory.reserve(2, vm_test_config.locked_dir)
+    assert reserved == ['a.json', 'b.json']
+    assert len(inventory) == 1
+    assert sorted(os.listdir(vm_test_config.locked_dir)) == ['a.json', 'b.json']
+    assert os.listdir(vm_test_config.metadata_dir) == ['c.json']
+
+def test_reserves_randomly_without_repeats(vm_test_config):
+    filenames = [f"{idx}.json" for idx in range(20)]
+    create_nft_files(vm_test_config.metadata_dir, filenames)
+    inventory = Inventory(vm_test_config.metadata_dir)
+    inventory.randomize(os.path.join(vm_test_config.root_dir, 'order.json'), 321)
+    reserved = inventory.reserve(20, vm_test_config.locked_dir)
+    assert sorted(reserved) == sorted(filenames)
+    assert not len(inventory)
+
+def test_picks_up_restocked_files(vm_test_config):
+    create_nft_files(vm_test_config.metadata_dir, ['b.json'])
+    inventory = Inventory(vm_test_config.metadata_dir)
+    inventory.reserve(1, vm_test_config.locked_dir)
+    assert not len(inventory)
+    create_nft_files(vm_test_config.metadata_dir, ['d.json', 'c.json'])
+    inventory.refresh()
+    assert len(inventory) == 2
+    assert inventory.reserve(2, vm_test_config.locked_dir) == ['c.json', 'd.json']
+
+def test_skips_files_removed_externally(vm_test_config):
+    create_nft_files(vm_test_config.metadata_dir, ['a.json', 'b.json'])
+    inventory = Inventory(vm_test_config.metadata_dir)
+    os.remove(os.path.join(vm_test_config.metadata_dir, 'a.json'))
+    assert inventory.reserve(1, vm_test_config.locked_dir) == ['b.json']
+
+def test_does_not_over_reserve(vm_test_config):
+    create_nft_files(vm_test_config.metadata_dir, ['a.json'])
+    inventory = Inventory(vm_test_config.metadata_dir)
+    try:
+        inventory.reserve(2, vm_test_config.locked_dir)
+        assert False, 'Successfully reserved more NFTs than were available'
+    except ValueError as e:
+        assert 'Only able to reserve 1 of 2 NFTs' in str(e)
+
+def test_random_order_is_reproducible(vm_test_config):
+    filenames = [f"{idx}.json" for idx in range(20)]
+    create_nft_files(vm_test_config.metadata_dir, filenames)
+    order_file = os.path.join(vm_test_config.root_dir, 'order.json')
+    inventory = Inventory(vm_test_config.metadata_dir)
+    inventory.randomize(order_file, 321)
+    with open(order_file, 'r') as order_filehandle:
+        order = json.load(order_filehandle)['order']
+    assert sorted(order) == sorted(filenames)
+    assert order != sorted(filenames)
+    os.remove(order_file)
+    inventory = Inventory(vm_test_config.metadata_dir)
+    inventory.randomize(order_file, 321)
+    assert inventory.reserve(20, vm_test_config.locked_dir) == order
+
+def test_random_order_resumes_after_restart(vm_test_config):
+    filenames = [f"{idx}.json" for idx in range(10)]
+    create_nft_files(vm_test_config.metadata_dir, filenames)
+    order_file = os.path.join(vm_test_config.root_dir, 'order.json')
+    inventory = Inventory(vm_test_config.metadata_dir)
+    inventory.randomize(order_file, 321)
+    first_reserved = inventory.reserve(4, vm_test_config.locked_dir)
+    with open(order_file, 'r') as order_filehandle:
+        order = json.load(order_filehandle)['order']
+    assert first_reserved == order[:4]
+    restarted = Inventory(vm_test_config.metadata_dir)
+    restarted.randomize(order_file, 321)
+    assert restarted.reserve(6, vm_test_config.locked_dir) == order[4:]
+
+def test_random_order_appends_restocked_files(vm_test_config):
+    create_nft_files(vm_test_config.metadata_dir, ['a.json', 'b.json'])
+    order_file = os.path.join(vm_test_config.root_dir, 'order.json')
+    inventory = Inventory(vm_test_config.metadata_dir)
+    inventory.randomize(order_file, 321)
+    inventory.reserve(2, vm_test_config.locked_dir)
+    create_nft_files(vm_test_config.metadata_dir, ['c.json', 'd.json'])
+    inventory.refresh()
+    assert sorted(inventory.reserve(2, vm_test_config.locked_dir)) == ['c.json', 'd.json']
+
+def test_rejects_random_order_with_different_seed(vm_test_config):
+    create_nft_files(vm_test_config.metadata_dir, ['a.json'])
+    order_file = os.path.join(vm_test_config.root_dir, 'order.json')
+    Inventory(vm_test_config.metadata_dir).randomize(order_file, 321)
+    try:
+        Inventory(vm_test_config.metadata_dir).randomize(order_file, 123)
+        assert False, 'Successfully reused a random order generated with a different seed'
+    except ValueError as e:
+        assert 'generated with seed 321, not 123' in str(e)
+
+def test_released_files_are_reserved_next(vm_test_config):
+    create_nft_files(vm_test_config.metadata_dir, ['a.json', 'b.json', 'c.json'])
+    inventory = Inventory(vm_test_config.metadata_dir)
+    reserved = inventory.reserve(2, vm_test_config.locked_dir)
+    inventory.release(reserved, vm_test_config.locked_dir)
+    assert len(inventory) == 3
+    assert not os.listdir(vm_test_config.locked_dir)
+    assert inventory.reserve(3, vm_test_config.locked_dir) == ['a.json', 'b.json', 'c.json']
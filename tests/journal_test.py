@@ -0,0 +1,55 @@
+import os
+import sqlite3
+
+from cardano.wt.journal import VendJournal
+from cardano.wt.utxo import Utxo, Balance
+
+MINT_REQ = Utxo('a' * 64, 0, [Balance(10000000, 'lovelace')])
+OTHER_REQ = Utxo('b' * 64, 1, [])
+
+def test_latest_returns_last_stage_with_merged_details(tmp_path):
+    journal = VendJournal(os.path.join(tmp_path, 'journal.db'))
+    journal.record(MINT_REQ, VendJournal.RESERVED, 'txn', {'balances': [[10000000, 'lovelace']], 'locked_filenames': ['a.json']})
+    journal.record(MINT_REQ, VendJournal.SUBMITTED, 'txn', {'submitted_hash': 'c' * 64})
+    entries = journal.latest()
+    assert len(entries) == 1
+    assert entries[0].utxo == MINT_REQ
+    assert entries[0].utxo.balances[0].lovelace == 10000000
+    assert entries[0].stage == VendJournal.SUBMITTED
+    assert entries[0].details == {'balances': [[10000000, 'lovelace']], 'locked_filenames': ['a.json'], 'submitted_hash': 'c' * 64}
+
+def test_latest_filters_by_stage(tmp_path):
+    journal = VendJournal(os.path.join(tmp_path, 'journal.db'))
+    journal.record(MINT_REQ, VendJournal.RESERVED, 'txn1')
+    journal.record(OTHER_REQ, VendJournal.RESERVED, 'txn2')
+    journal.record(OTHER_REQ, VendJournal.DEAD_LETTER)
+    assert [entry.utxo for entry in journal.latest(VendJournal.IN_FLIGHT_STAGES)] == [MINT_REQ]
+    assert [entry.utxo for entry in journal.latest(VendJournal.EXCLUDED_STAGES)] == [OTHER_REQ]
+
+def test_survives_reopening(tmp_path):
+    db_file = os.path.join(tmp_path, 'journal.db')
+    journal = VendJournal(db_file)
+    journal.record(MINT_REQ, VendJournal.SIGNED, 'txn')
+    journal.close()
+    reopened = VendJournal(db_file)
+    entries = reopened.latest()
+    assert len(entries) == 1
+    assert entries[0].stage == VendJournal.SIGNED
+    assert entries[0].txn_id == 'txn'
+
+def test_backfills_latest_state_of_existing_journal(tmp_path):
+    db_file = os.path.join(tmp_path, 'journal.db')
+    journal = VendJournal(db_file)
+    journal.record(MINT_REQ, VendJournal.RESERVED, 'txn', {'locked_filenames': ['a.json']})
+    journal.record(MINT_REQ, VendJournal.BUILT, 'txn', {'fee': 200000})
+    journal.record(OTHER_REQ, VendJournal.DEAD_LETTER)
+    journal.close()
+    # Simulate a journal written before the latest state was kept alongside the log
+    conn = sqlite3.connect(db_file)
+    conn.execute('DROP TABLE vend_latest')
+    conn.commit()
+    conn.close()
+    reopened = VendJournal(db_file)
+    in_flight = reopened.latest(VendJournal.IN_FLIGHT_STAGES)
+    assert [(entry.utxo, entry.stage, entry.details) for entry in in_flight] == [(MINT_REQ, VendJournal.BUILT, {'locked_filenames': ['a.json'], 'fee': 200000})]
+    assert [entry.utxo for entry in reopened.latest(VendJournal.EXCLUDED_STAGES)] == [OTHER_REQ]
@@ -0,0 +1,180 @@
+import json
+import pytest
+import urllib.parse
+
+from test_utils.fake_server import FakeHandler
+
+from cardano.wt.chain_backend import ChainBackend
+from cardano.wt.kupo_ogmios import KupoOgmiosBackend
+from cardano.wt.utxo import Utxo, Balance
+
+PAYMENT_ADDR = 'addr_test1vplgrtqgphv0hpx2v6zyzwxxmyh0q4vjrzeuv7qvtk3ev2cmmgd54'
+BUYER_ADDR = 'addr_test1qbuyer'
+POLICY_ID = 'a' * 56
+MINT_REQ_TXN = '1' * 64
+PREV_TXN = '2' * 64
+OTHER_TXN = '3' * 64
+
+def match(txn, ix, address, coins, assets={}, slot=100, spent_by=None, spent_slot=None):
+    return {
+        'transaction_id': txn,
+        'output_index': ix,
+        'address': address,
+        'value': {'coins': coins, 'assets': assets},
+        'datum_hash': None,
+        'script_hash': None,
+        'created_at': {'slot_no': slot, 'header_hash': f"header{slot}"},
+        'spent_at': {'slot_no': spent_slot, 'header_hash': f"header{spent_slot}", 'transaction_id': spent_by} if spent_by else None
+    }
+
+MATCHES = [
+    match(PREV_TXN, 0, BUYER_ADDR, 20000000, {f"{POLICY_ID}.6e667431": 1}, slot=50, spent_by=MINT_REQ_TXN, spent_slot=100),
+    match(PREV_TXN, 1, BUYER_ADDR, 3000000, slot=50, spent_by=OTHER_TXN, spent_slot=100),
+    match(MINT_REQ_TXN, 1, BUYER_ADDR, 9800000, {f"{POLICY_ID}.6e667431": 1}),
+    match(MINT_REQ_TXN, 0, PAYMENT_ADDR, 10000000),
+    match(OTHER_TXN, 0, PAYMENT_ADDR, 3000000, {f"{POLICY_ID}.6e667432": 2, POLICY_ID: 5}),
+]
+
+METADATA = {
+    100: [
+        {'hash': 'ff' * 32, 'raw': '', 'schema': {'674': {'map': [
+            {'k': {'string': 'msg'}, 'v': {'list': [{'string': 'hello'}, {'bytes': 'cafe'}]}},
+            {'k': {'int': 1}, 'v': {'int': 42}}
+        ]}}}
+    ]
+}
+
+PROTOCOL_PARAMETERS = {
+    'minFeeCoefficient': 44,
+    'minFeeConstant': {'ada': {'lovelace': 155381}},
+    'maxBlockBodySize': {'bytes': 90112},
+    'maxBlockHeaderSize': {'bytes': 1100},
+    'maxTransactionSize': {'bytes': 16384},
+    'stakeCredentialDeposit': {'ada': {'lovelace': 2000000}},
+    'stakePoolDeposit': {'ada': {'lovelace': 500000000}},
+    'stakePoolRetirementEpochBound': 18,
+    'desiredNumberOfStakePools': 500,
+    'stakePoolPledgeInfluence': '3/10',
+    'monetaryExpansion': '3/1000',
+    'treasuryExpansion': '1/5',
+    'minStakePoolCost': {'ada': {'lovelace': 170000000}},
+    'minUtxoDepositCoefficient': 4310,
+    'version': {'major': 8, 'minor': 0}
+}
+
+class KupoOgmiosHandler(FakeHandler):
+
+    def __matches(self, pattern, query):
+        matches = []
+        for candidate in MATCHES:
+            if pattern.startswith('*@') and candidate['transaction_id'] != pattern[2:]:
+                continue
+            if pattern.startswith('addr') and candidate['address'] != pattern:
+                continue
+            if '.' in pattern:
+                (policy_id, asset_name) = pattern.split('.')
+                if not [asset for asset in candidate['value']['assets'] if asset.startswith(policy_id) and (asset_name == '*' or asset == pattern)]:
+                    continue
+            if 'unspent' in query and candidate['spent_at']:
+                continue
+            if 'spent' in query and not candidate['spent_at']:
+                continue
+            if 'spent_after' in query and candidate['spent_at']['slot_no'] <= int(query['spent_after'][0]):
+                continue
+            if 'spent_before' in query and candidate['spent_at']['slot_no'] >= int(query['spent_before'][0]):
+                continue
+            matches.append(candidate)
+        return matches
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+        self.server.paths.append(self.path)
+        if url.path.startswith('/matches/'):
+            return self.respond(200, self.__matches(url.path[len('/matches/'):], query))
+        if url.path == '/checkpoints':
+            return self.respond(200, [{'slot_no': 100, 'header_hash': 'header100'}, {'slot_no': 50, 'header_hash': 'header50'}])
+        if url.path.startswith('/metadata/'):
+            slot_metadata = METADATA.get(int(url.path.split('/')[-1]), [])
+            return self.respond(200, slot_metadata if query['transaction_id'] == [MINT_REQ_TXN] else [])
+        self.send_error(404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.rpcs.append(request)
+        if request['method'] == 'queryLedgerState/protocolParameters':
+            return self.respond(200, {'jsonrpc': '2.0', 'method': request['method'], 'result': PROTOCOL_PARAMETERS, 'id': None})
+        if request['method'] == 'queryLedgerState/epoch':
+            return self.respond(200, {'jsonrpc': '2.0', 'method': request['method'], 'result': 123, 'id': None})
+        if request['params']['transaction']['cbor'] == 'dead':
+            return self.respond(200, {'jsonrpc': '2.0', 'method': request['method'], 'error': {'code': 3005, 'message': 'Bad input'}, 'id': None})
+        return self.respond(200, {'jsonrpc': '2.0', 'method': request['method'], 'result': {'transaction': {'id': 'ab' * 32}}, 'id': None})
+
+@pytest.fixture
+def backend(fake_server):
+    server = fake_server(KupoOgmiosHandler, paths=[], rpcs=[])
+    kupo_ogmios = KupoOgmiosBackend(f"{server.url}/", server.url)
+    kupo_ogmios.server = server
+    yield kupo_ogmios
+    kupo_ogmios.close()
+
+def test_is_a_chain_backend(backend):
+    assert isinstance(backend, ChainBackend)
+
+def test_rejects_incomplete_chain_backend():
+    class TipOnlyBackend(ChainBackend):
+        def get_tip(self):
+            return {'slot': 0, 'id': 'genesis'}
+    with pytest.raises(TypeError) as e:
+        TipOnlyBackend()
+    assert 'get_tx_utxos' in str(e.value)
+
+def test_lists_unspent_utxos(backend):
+    utxos = backend.get_utxos(PAYMENT_ADDR, set([Utxo(OTHER_TXN, 0, [])]))
+    assert utxos == [Utxo(MINT_REQ_TXN, 0, [])]
+    assert [(balance.lovelace, balance.policy) for balance in utxos[0].balances] == [(10000000, Balance.LOVELACE_POLICY)]
+    assert backend.server.paths == [f"/matches/{PAYMENT_ADDR}?unspent"]
+
+def test_translates_txn_utxos_to_blockfrost_shape(backend):
+    tx_utxos = backend.get_tx_utxos(MINT_REQ_TXN)
+    assert [(tx_input['tx_hash'], tx_input['output_index'], tx_input['address']) for tx_input in tx_utxos['inputs']] == [(PREV_TXN, 0, BUYER_ADDR)]
+    assert tx_utxos['inputs'][0]['amount'] == [{'unit': 'lovelace', 'quantity': '20000000'}, {'unit': f"{POLICY_ID}6e667431", 'quantity': '1'}]
+    assert not tx_utxos['inputs'][0]['reference'] and not tx_utxos['inputs'][0]['collateral']
+    assert [tx_output['output_index'] for tx_output in tx_utxos['outputs']] == [0, 1]
+    assert backend.get_inputs(MINT_REQ_TXN) == tx_utxos['inputs']
+    assert backend.get_outputs(MINT_REQ_TXN)[0]['address'] == PAYMENT_ADDR
+    with pytest.raises(ValueError):
+        backend.get_tx_utxos('9' * 64)
+
+def test_looks_up_transactions_and_metadata(backend):
+    assert backend.get_txn(MINT_REQ_TXN) == {'hash': MINT_REQ_TXN, 'slot': 100, 'block': 'header100'}
+    assert backend.get_txn('9' * 64) is None
+    assert backend.get_metadata(MINT_REQ_TXN) == [{'label': '674', 'json_metadata': {'msg': ['hello', '0xcafe'], '1': 42}}]
+    assert backend.get_metadata(OTHER_TXN) == []
+
+def test_reads_tip_from_latest_checkpoint(backend):
+    assert backend.get_tip() == {'slot': 100, 'id': 'header100'}
+
+def test_sums_unspent_assets(backend):
+    assert backend.get_assets(POLICY_ID) == [
+        {'asset': POLICY_ID, 'quantity': '5'},
+        {'asset': f"{POLICY_ID}6e667431", 'quantity': '1'},
+        {'asset': f"{POLICY_ID}6e667432", 'quantity': '2'}
+    ]
+    assert backend.get_asset(f"{POLICY_ID}6e667432")['quantity'] == '2'
+    assert backend.get_asset(f"{POLICY_ID}6e667433") is None
+
+def test_translates_protocol_parameters(backend):
+    protocol_params = backend.get_protocol_parameters()
+    assert protocol_params['epoch'] == 123
+    assert (protocol_params['min_fee_a'], protocol_params['min_fee_b'], protocol_params['max_tx_size']) == (44, 155381, 16384)
+    assert (protocol_params['a0'], protocol_params['rho'], protocol_params['tau']) == (0.3, 0.003, 0.2)
+    assert (protocol_params['protocol_major_ver'], protocol_params['protocol_minor_ver']) == (8, 0)
+
+def test_submits_through_ogmios(backend, tmp_path):
+    signed_file = tmp_path / 'txn.signed'
+    signed_file.write_text(json.dumps({'type': 'Witnessed Tx AlonzoEra', 'description': '', 'cborHex': '84a0'}))
+    assert backend.submit_txn(str(signed_file)) == 'ab' * 32
+    assert backend.server.rpcs[-1]['params'] == {'transaction': {'cbor': '84a0'}}
+    with pytest.raises(ValueError, match='Bad input'):
+        backend.submit_txn_cbor(bytes.fromhex('dead'))
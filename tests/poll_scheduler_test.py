@@ -0,0 +1,41 @@
+import threading
+import time
+
+from cardano.wt.poll_scheduler import AdaptivePollScheduler
+
+def test_backs_off_when_idle():
+    scheduler = AdaptivePollScheduler(min_wait=1, max_wait=10, backoff=2)
+    assert [scheduler.next_wait(0) for i in range(5)] == [2, 4, 8, 10, 10]
+
+def test_polls_tightly_while_busy():
+    scheduler = AdaptivePollScheduler(min_wait=1, max_wait=10, backoff=2)
+    scheduler.next_wait(0)
+    scheduler.next_wait(0)
+    assert scheduler.next_wait(5) == 1
+    assert scheduler.next_wait(1) == 1
+
+def test_wakes_up_on_notify():
+    scheduler = AdaptivePollScheduler(min_wait=30, max_wait=60)
+    threading.Timer(0.1, scheduler.notify).start()
+    start = time.time()
+    assert scheduler.wait(1)
+    assert time.time() - start < 10
+    assert scheduler.current_wait == 30
+
+def test_times_out_without_notify():
+    scheduler = AdaptivePollScheduler(min_wait=0.01, max_wait=0.01)
+    assert not scheduler.wait(0)
+
+def test_rejects_invalid_bounds():
+    try:
+        AdaptivePollScheduler(min_wait=10, max_wait=5)
+        assert False, 'Successfully created a scheduler with min wait above max wait'
+    except ValueError as e:
+        assert 'Invalid poll wait bounds (10, 5)' in str(e)
+
+def test_keeps_notify_that_arrives_between_waits():
+    scheduler = AdaptivePollScheduler(min_wait=30, max_wait=60)
+    scheduler.notify()
+    start = time.time()
+    assert scheduler.wait(0)
+    assert time.time() - start < 10
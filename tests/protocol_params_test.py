@@ -0,0 +1,117 @@
+import json
+import os
+import time
+
+from cardano.wt.protocol_params import ProtocolParameters
+
+EPOCH_SCHEDULE = (10, 1000000, 1000)
+
+def blockfrost_params(epoch, min_fee_a=44):
+    return {
+        'epoch': epoch,
+        'min_fee_a': min_fee_a,
+        'min_fee_b': 155381,
+        'max_block_size': 90112,
+        'max_tx_size': 16384,
+        'max_block_header_size': 1100,
+        'key_deposit': '2000000',
+        'pool_deposit': '500000000',
+        'e_max': 18,
+        'n_opt': 500,
+        'a0': 0.3,
+        'rho': 0.003,
+        'tau': 0.2,
+        'decentralisation_param': 0,
+        'extra_entropy': None,
+        'protocol_major_ver': 8,
+        'protocol_minor_ver': 0,
+        'min_utxo': '4310',
+        'min_pool_cost': '340000000',
+        'coins_per_utxo_size': '4310'
+    }
+
+class FakeBackend(object):
+
+    def __init__(self, params):
+        self.params = params
+        self.calls = 0
+
+    def get_protocol_parameters(self):
+        self.calls += 1
+        return self.params
+
+class FakeClock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def read_protocol_file(protocol_file):
+    with open(protocol_file, 'r') as protocol_filehandle:
+        return json.load(protocol_filehandle)
+
+def test_generate_cardano_cli_protocol():
+    translated = ProtocolParameters.generate_cardano_cli_protocol(ProtocolParameters.BLOCKFROST_PROTOCOL_TRANSLATOR, blockfrost_params(12))
+    assert translated['txFeePerByte'] == 44
+    assert translated['stakeAddressDeposit'] == 2000000
+    assert translated['protocolVersion'] == {'minor': 0, 'major': 8}
+
+def test_first_load_fetches_and_caches_by_epoch(tmp_path):
+    backend = FakeBackend(blockfrost_params(12))
+    protocol_params = ProtocolParameters(backend, str(tmp_path), epoch_schedule=EPOCH_SCHEDULE, clock=FakeClock(1002500))
+    assert protocol_params.expected_epoch() == 12
+    protocol_file = protocol_params.load()
+    assert protocol_file == os.path.join(str(tmp_path), 'protocol.json')
+    assert read_protocol_file(protocol_file)['txFeePerByte'] == 44
+    assert os.path.exists(os.path.join(str(tmp_path), ProtocolParameters.CACHE_SUBDIR, '12.json'))
+    assert backend.calls == 1
+    assert protocol_params.max_txn_fee() == (44 * 16384) + 155381
+
+def test_restart_in_same_epoch_uses_cache(tmp_path):
+    ProtocolParameters(FakeBackend(blockfrost_params(12)), str(tmp_path), epoch_schedule=EPOCH_SCHEDULE, clock=FakeClock(1002500)).load()
+    backend = FakeBackend(blockfrost_params(12, min_fee_a=99))
+    protocol_params = ProtocolParameters(backend, str(tmp_path), epoch_schedule=EPOCH_SCHEDULE, clock=FakeClock(1002900))
+    protocol_params.load()
+    assert backend.calls == 0
+    assert protocol_params.current()['min_fee_a'] == 44
+
+def test_restart_in_later_epoch_fetches_again(tmp_path):
+    ProtocolParameters(FakeBackend(blockfrost_params(12)), str(tmp_path), epoch_schedule=EPOCH_SCHEDULE, clock=FakeClock(1002500)).load()
+    backend = FakeBackend(blockfrost_params(13, min_fee_a=45))
+    protocol_params = ProtocolParameters(backend, str(tmp_path), epoch_schedule=EPOCH_SCHEDULE, clock=FakeClock(1003100))
+    protocol_file = protocol_params.load()
+    assert backend.calls == 1
+    assert read_protocol_file(protocol_file)['txFeePerByte'] == 45
+
+def test_refresh_rewrites_protocol_file_only_on_change(tmp_path):
+    backend = FakeBackend(blockfrost_params(12))
+    protocol_params = ProtocolParameters(backend, str(tmp_path), epoch_schedule=EPOCH_SCHEDULE, clock=FakeClock(1002500))
+    protocol_params.load()
+    assert not protocol_params.refresh()
+    backend.params = blockfrost_params(13, min_fee_a=45)
+    assert protocol_params.refresh()
+    assert read_protocol_file(protocol_params.protocol_file)['txFeePerByte'] == 45
+
+def test_prunes_old_epochs(tmp_path):
+    backend = FakeBackend(blockfrost_params(12))
+    protocol_params = ProtocolParameters(backend, str(tmp_path), epoch_schedule=EPOCH_SCHEDULE, clock=FakeClock(1002500))
+    for epoch in range(12, 18):
+        backend.params = blockfrost_params(epoch)
+        protocol_params.refresh()
+    assert sorted(os.listdir(protocol_params.cache_dir)) == ['15.json', '16.json', '17.json']
+
+def test_background_refresh_without_schedule(tmp_path):
+    ProtocolParameters(FakeBackend(blockfrost_params(12)), str(tmp_path)).load()
+    backend = FakeBackend(blockfrost_params(13, min_fee_a=45))
+    protocol_params = ProtocolParameters(backend, str(tmp_path), refresh_interval=60)
+    protocol_params.load()
+    assert protocol_params.current()['epoch'] == 12
+    protocol_params.start()
+    deadline = time.time() + 5
+    while protocol_params.current()['epoch'] != 13 and time.time() < deadline:
+        time.sleep(0.01)
+    protocol_params.stop()
+    assert protocol_params.current()['epoch'] == 13
+    assert backend.calls == 1
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+
+from cardano.wt.rate_limit import TokenBucket
+
+def test_allows_burst_without_waiting():
+    bucket = TokenBucket(1, 5)
+    start = time.monotonic()
+    for idx in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.5
+    assert bucket.available() < 1
+
+def test_waits_for_refill():
+    bucket = TokenBucket(20, 1)
+    bucket.acquire()
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.04
+
+def test_drain_forces_callers_to_wait():
+    bucket = TokenBucket(20, 100)
+    bucket.drain()
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.04
+
+def test_serves_waiters_by_priority():
+    bucket = TokenBucket(10, 1)
+    bucket.acquire()
+    served = []
+    def acquire_as(name, priority):
+        bucket.acquire(priority)
+        served.append(name)
+    low = threading.Thread(target=acquire_as, args=('low', TokenBucket.LOW))
+    high = threading.Thread(target=acquire_as, args=('high', TokenBucket.HIGH))
+    low.start()
+    time.sleep(0.02)
+    high.start()
+    low.join()
+    high.join()
+    assert served == ['high', 'low']
+
+def test_shared_between_threads_and_asyncio():
+    bucket = TokenBucket(20, 2)
+    bucket.acquire()
+    async def acquire_twice():
+        await bucket.acquire_async(TokenBucket.HIGH)
+        await bucket.acquire_async(TokenBucket.HIGH)
+    start = time.monotonic()
+    asyncio.run(acquire_twice())
+    assert time.monotonic() - start >= 0.04
+    assert bucket.available() < 1
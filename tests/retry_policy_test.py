@@ -0,0 +1,175 @@
+import email.utils
+import pytest
+import requests
+import time
+
+from test_utils.fake_server import FakeHandler
+
+from cardano.wt.blockfrost import BlockfrostApi
+from cardano.wt.retry_policy import CircuitBreaker, CircuitOpenError, RetryingCall, RetryPolicy
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, headers={}):
+        self.status_code = status_code
+        self.headers = headers
+
+def http_error(status_code, headers={}):
+    return requests.exceptions.HTTPError(f"{status_code} Error", response=FakeResponse(status_code, headers))
+
+class ScriptedHandler(FakeHandler):
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        (status, headers) = self.server.script.pop(0) if self.server.script else (200, {})
+        if headers.get('Content-Type') == 'text/html':
+            # e.g., a proxy's maintenance page served with a 200
+            body = b'<html>Down for maintenance</html>'
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            return self.wfile.write(body)
+        self.respond(status, {'path': self.path}, headers=headers)
+
+@pytest.fixture
+def scripted_server(fake_server):
+    return fake_server(ScriptedHandler, script=[], paths=[])
+
+def test_only_retries_errors_that_could_succeed():
+    retry_policy = RetryPolicy()
+    for status_code in [429, 500, 502, 503, 504]:
+        assert retry_policy.is_retryable(http_error(status_code))
+    for status_code in [400, 402, 403, 404, 418]:
+        assert not retry_policy.is_retryable(http_error(status_code))
+    assert retry_policy.is_retryable(requests.exceptions.ConnectionError())
+    assert retry_policy.is_retryable(requests.exceptions.Timeout())
+    assert not retry_policy.is_retryable(ValueError())
+    assert retry_policy.next_delay(0, http_error(400), 0) is None
+
+def test_backoff_grows_exponentially_with_full_jitter():
+    retry_policy = RetryPolicy(base_delay=1, max_delay=60, max_elapsed=1000, rng=lambda: 1)
+    assert [retry_policy.next_delay(attempt, http_error(503), 0) for attempt in range(8)] == [1, 2, 4, 8, 16, 32, 60, 60]
+    jittered_policy = RetryPolicy(base_delay=1, max_delay=60, max_elapsed=1000, rng=lambda: 0.25)
+    assert jittered_policy.next_delay(4, http_error(503), 0) == 4
+
+def test_honors_retry_after():
+    retry_policy = RetryPolicy(max_delay=60, rng=lambda: 1)
+    assert retry_policy.next_delay(0, http_error(429, {'Retry-After': '7'}), 0) == 7
+    assert retry_policy.next_delay(0, http_error(429, {'Retry-After': '3600'}), 0) == 60
+    retry_date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 28 <= retry_policy.next_delay(0, http_error(503, {'Retry-After': retry_date}), 0) <= 30
+    assert retry_policy.next_delay(2, http_error(503, {'Retry-After': 'garbage'}), 0) == 4
+
+def test_gives_up_when_budget_exhausted():
+    retry_policy = RetryPolicy(base_delay=1, max_delay=60, max_elapsed=300, rng=lambda: 1)
+    assert retry_policy.next_delay(5, http_error(503), 260) == 32
+    assert retry_policy.next_delay(6, http_error(503), 260) is None
+
+def test_nine_retries_stay_within_seven_minutes():
+    retry_policy = RetryPolicy(rng=lambda: 1)
+    (elapsed, read_timeout) = (0, BlockfrostApi._READ_TIMEOUT_SEC)
+    for attempt in range(BlockfrostApi._MAX_GET_RETRIES):
+        elapsed += read_timeout
+        delay = retry_policy.next_delay(attempt, requests.exceptions.Timeout(), elapsed)
+        if delay is None:
+            break
+        elapsed += delay
+    assert elapsed + read_timeout < 7 * 60
+
+def test_circuit_opens_and_half_opens():
+    clock = FakeClock()
+    circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    circuit_breaker.before_call()
+    circuit_breaker.record_failure()
+    circuit_breaker.before_call()
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state() == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        circuit_breaker.before_call()
+    clock.now = 30
+    circuit_breaker.before_call()
+    assert circuit_breaker.state() == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        circuit_breaker.before_call()
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state() == CircuitBreaker.OPEN
+    clock.now = 60
+    circuit_breaker.before_call()
+    circuit_breaker.record_success()
+    assert circuit_breaker.state() == CircuitBreaker.CLOSED
+    circuit_breaker.before_call()
+
+def test_retrying_call_tracks_retries_and_circuit():
+    clock = FakeClock()
+    circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    call = RetryingCall(RetryPolicy(rng=lambda: 1), circuit_breaker, max_retries=1, clock=clock)
+    call.before_attempt()
+    assert call.failed(http_error(503)) == 1
+    assert call.retries == 1
+    with pytest.raises(requests.exceptions.HTTPError):
+        call.failed(http_error(503))
+    assert circuit_breaker.state() == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        call.before_attempt()
+    client_error_call = RetryingCall(RetryPolicy(), circuit_breaker, max_retries=9, clock=clock)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client_error_call.failed(http_error(404))
+    assert circuit_breaker.state() == CircuitBreaker.CLOSED
+
+def test_blockfrost_retries_after_server_hint(scripted_server):
+    scripted_server.script = [(503, {'Retry-After': '0'}), (429, {'Retry-After': '0'})]
+    blockfrost_api = BlockfrostApi('project', api_base=scripted_server.url, max_get_retries=2)
+    assert blockfrost_api.get_txn('hash') == {'path': '/txs/hash'}
+    assert len(scripted_server.paths) == 3
+
+def test_blockfrost_does_not_retry_client_errors(scripted_server):
+    scripted_server.script = [(400, {})]
+    blockfrost_api = BlockfrostApi('project', api_base=scripted_server.url, max_get_retries=9)
+    with pytest.raises(requests.exceptions.HTTPError):
+        blockfrost_api.get_txn('hash')
+    assert len(scripted_server.paths) == 1
+    assert blockfrost_api.circuit_breaker.state() == CircuitBreaker.CLOSED
+
+def test_blockfrost_fails_fast_while_down(scripted_server):
+    scripted_server.script = [(503, {'Retry-After': '0'})] * 3
+    circuit_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    blockfrost_api = BlockfrostApi('project', api_base=scripted_server.url, max_get_retries=9, circuit_breaker=circuit_breaker)
+    with pytest.raises(CircuitOpenError):
+        blockfrost_api.get_txn('hash')
+    with pytest.raises(CircuitOpenError):
+        blockfrost_api.get_txn('hash')
+    assert len(scripted_server.paths) == 3
+
+def test_retrying_call_counts_aborted_attempts_against_circuit():
+    clock = FakeClock()
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    circuit_breaker.before_call()
+    circuit_breaker.record_failure()
+    clock.now = 30
+    call = RetryingCall(RetryPolicy(), circuit_breaker, max_retries=9, clock=clock)
+    call.before_attempt()
+    assert circuit_breaker.state() == CircuitBreaker.HALF_OPEN
+    call.aborted(ValueError('Expecting value'))
+    assert circuit_breaker.state() == CircuitBreaker.OPEN
+
+def test_blockfrost_reopens_circuit_when_trial_returns_garbage(scripted_server):
+    scripted_server.script = [(503, {}), (200, {'Content-Type': 'text/html'})]
+    circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    blockfrost_api = BlockfrostApi('project', api_base=scripted_server.url, max_get_retries=0, circuit_breaker=circuit_breaker)
+    with pytest.raises(requests.exceptions.HTTPError):
+        blockfrost_api.get_txn('hash')
+    assert circuit_breaker.state() == CircuitBreaker.OPEN
+    with pytest.raises(ValueError):
+        blockfrost_api.get_txn('hash')
+    assert circuit_breaker.state() == CircuitBreaker.OPEN
+    assert blockfrost_api.get_txn('hash') == {'path': '/txs/hash'}
+    assert circuit_breaker.state() == CircuitBreaker.CLOSED
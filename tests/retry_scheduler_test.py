@@ -0,0 +1,77 @@
+from cardano.wt.retry_scheduler import RetryScheduler
+from cardano.wt.utxo import Utxo
+
+MINT_REQ = Utxo('a' * 64, 0, [])
+OTHER_REQ = Utxo('b' * 64, 1, [])
+
+def test_new_utxos_are_eligible():
+    scheduler = RetryScheduler()
+    assert scheduler.is_eligible(MINT_REQ)
+    assert not scheduler.pending()
+    assert not scheduler.dead_letters()
+
+def test_backs_off_exponentially():
+    scheduler = RetryScheduler(max_attempts=10, base_delay=5, max_delay=600)
+    now = 1000
+    for expected_delay in [5, 10, 20, 40]:
+        assert scheduler.record_failure(MINT_REQ, 'flaky', now=now)
+        assert not scheduler.is_eligible(MINT_REQ, now=now + expected_delay - 1)
+        assert scheduler.is_eligible(MINT_REQ, now=now + expected_delay)
+        now += expected_delay
+    assert scheduler.is_eligible(OTHER_REQ, now=now)
+
+def test_caps_backoff_delay():
+    scheduler = RetryScheduler(max_attempts=20, base_delay=5, max_delay=60)
+    for attempt in range(10):
+        scheduler.record_failure(MINT_REQ, 'flaky', now=1000)
+    assert scheduler.is_eligible(MINT_REQ, now=1060)
+
+def test_dead_letters_after_max_attempts():
+    scheduler = RetryScheduler(max_attempts=2, base_delay=5)
+    assert scheduler.record_failure(MINT_REQ, 'first', now=1000)
+    assert not scheduler.record_failure(MINT_REQ, 'second', now=1005)
+    assert not scheduler.is_eligible(MINT_REQ, now=100000)
+    assert not scheduler.pending()
+    dead_letters = scheduler.dead_letters()
+    assert len(dead_letters) == 1
+    assert dead_letters[0].utxo == MINT_REQ
+    assert dead_letters[0].attempts == 2
+    assert dead_letters[0].last_error == 'second'
+
+def test_dead_letters_unretryable_errors_immediately():
+    scheduler = RetryScheduler()
+    assert not scheduler.record_failure(MINT_REQ, 'bad utxo', retryable=False)
+    assert not scheduler.is_eligible(MINT_REQ)
+
+def test_keeps_payload_until_success():
+    scheduler = RetryScheduler()
+    scheduler.record_failure(MINT_REQ, 'flaky', payload='prepared')
+    assert scheduler.payload(MINT_REQ) == 'prepared'
+    assert scheduler.pending() == [MINT_REQ]
+    scheduler.record_success(MINT_REQ)
+    assert scheduler.payload(MINT_REQ) == None
+    assert scheduler.is_eligible(MINT_REQ)
+
+def test_resumed_utxos_are_immediately_eligible_with_payload():
+    scheduler = RetryScheduler()
+    scheduler.resume(MINT_REQ, 'prepared')
+    assert scheduler.is_eligible(MINT_REQ)
+    assert scheduler.pending() == [MINT_REQ]
+    assert scheduler.payload(MINT_REQ) == 'prepared'
+
+def test_honors_zero_as_current_time():
+    scheduler = RetryScheduler(max_attempts=10, base_delay=5)
+    assert scheduler.record_failure(MINT_REQ, 'flaky', now=0)
+    assert not scheduler.is_eligible(MINT_REQ, now=0)
+    assert scheduler.is_eligible(MINT_REQ, now=5)
+
+def test_transient_failures_back_off_without_using_attempts():
+    scheduler = RetryScheduler(max_attempts=2, base_delay=5, max_delay=600)
+    now = 1000
+    for expected_delay in [5, 10, 20, 40, 80]:
+        assert scheduler.record_failure(MINT_REQ, 'outage', transient=True, now=now)
+        assert not scheduler.is_eligible(MINT_REQ, now=now + expected_delay - 1)
+        now += expected_delay
+    assert scheduler.record_failure(MINT_REQ, 'flaky', now=now)
+    assert not scheduler.record_failure(MINT_REQ, 'flaky', now=now)
+    assert scheduler.dead_letters()[0].attempts == 2
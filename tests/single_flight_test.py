@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from cardano.wt.single_flight import AsyncSingleFlight, SingleFlight
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class SlowCall(object):
+
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return self.result
+
+def wait_for_leader(slow_call):
+    while not slow_call.calls:
+        time.sleep(0.01)
+    # Give the other callers time to join the flight
+    time.sleep(0.1)
+
+def test_concurrent_calls_share_one_flight():
+    single_flight = SingleFlight(ttl=0)
+    slow_call = SlowCall(result={'hash': 'abc'})
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(single_flight.do, 'txs/abc', slow_call) for idx in range(5)]
+        wait_for_leader(slow_call)
+        slow_call.release.set()
+        results = [future.result() for future in futures]
+    assert results == [{'hash': 'abc'}] * 5
+    assert slow_call.calls == 1
+    assert len(single_flight) == 0
+
+def test_concurrent_callers_share_errors_but_do_not_reuse_them():
+    single_flight = SingleFlight(ttl=60)
+    slow_call = SlowCall(error=ValueError('down'))
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(single_flight.do, 'txs/abc', slow_call) for idx in range(3)]
+        wait_for_leader(slow_call)
+        slow_call.release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert slow_call.calls == 1
+    assert single_flight.do('txs/abc', lambda: 'recovered') == 'recovered'
+
+def test_reuses_results_within_ttl():
+    clock = FakeClock()
+    single_flight = SingleFlight(ttl=2, clock=clock)
+    calls = []
+    fetch = lambda: calls.append(clock.now) or len(calls)
+    assert single_flight.do('txs/abc', fetch) == 1
+    clock.now = 1.9
+    assert single_flight.do('txs/abc', fetch) == 1
+    assert single_flight.do('txs/abc', fetch, ttl=0) == 1
+    clock.now = 2
+    assert single_flight.do('txs/abc', fetch) == 2
+    assert single_flight.do('txs/def', fetch, ttl=0) == 3
+    assert single_flight.do('txs/def', fetch, ttl=0) == 4
+    clock.now = 10
+    single_flight.do('txs/ghi', fetch, ttl=0)
+    assert len(single_flight) == 0
+
+def test_async_callers_share_one_task():
+    calls = []
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+    async def callers():
+        single_flight = AsyncSingleFlight(ttl=0)
+        waiter = asyncio.ensure_future(single_flight.do('txs/abc', fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        results = await asyncio.gather(*[single_flight.do('txs/abc', fetch) for idx in range(4)])
+        return (results, await single_flight.do('txs/abc', fetch), len(single_flight))
+    assert asyncio.run(callers()) == ([1] * 4, 2, 0)
@@ -0,0 +1,122 @@
+import json
+import pytest
+import time
+
+from pycardano import Address, Transaction, TransactionBody, TransactionInput, TransactionOutput, TransactionWitnessSet
+
+from test_utils.fake_server import FakeHandler
+
+from cardano.wt.submission import HedgedSubmitter, OgmiosSubmitEndpoint, SubmitApiEndpoint
+
+PAYMENT_ADDR = 'addr_test1vplgrtqgphv0hpx2v6zyzwxxmyh0q4vjrzeuv7qvtk3ev2cmmgd54'
+MINT_REQ_TXN = '1' * 64
+
+def signed_txn():
+    body = TransactionBody(
+        inputs=[TransactionInput.from_primitive([MINT_REQ_TXN, 0])],
+        outputs=[TransactionOutput(Address.from_primitive(PAYMENT_ADDR), 5000000)],
+        fee=200000
+    )
+    txn = Transaction(body, TransactionWitnessSet())
+    return (txn.to_cbor(), str(txn.id))
+
+class FakeEndpoint(object):
+
+    def __init__(self, delay=0, error=None, result=None):
+        self.delay = delay
+        self.error = error
+        self.result = result
+        self.submitted = []
+
+    def submit_txn_cbor(self, tx_cbor):
+        time.sleep(self.delay)
+        self.submitted.append(tx_cbor)
+        if self.error:
+            raise self.error
+        return self.result
+
+class SubmitHandler(FakeHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, self.headers['Content-Type'], body))
+        if self.path == '/api/submit/tx':
+            if body == b'bad':
+                return self.respond(400, {'tag': 'TxSubmitFail', 'contents': 'BadInputsUTxO'})
+            return self.respond(202, MINT_REQ_TXN)
+        request = json.loads(body)
+        if request['params']['transaction']['cbor'] == b'bad'.hex():
+            return self.respond(400, {'jsonrpc': '2.0', 'error': {'code': 3117, 'message': 'unknown inputs'}, 'id': None})
+        self.respond(200, {'jsonrpc': '2.0', 'result': {'transaction': {'id': MINT_REQ_TXN}}, 'id': None})
+
+@pytest.fixture
+def submit_server(fake_server):
+    return fake_server(SubmitHandler, requests=[])
+
+def test_returns_first_success_without_waiting_for_slow_endpoints():
+    (tx_cbor, txn_hash) = signed_txn()
+    slow = FakeEndpoint(delay=2, result=txn_hash)
+    fast = FakeEndpoint(result=txn_hash)
+    submitter = HedgedSubmitter({'slow': slow, 'fast': fast})
+    start = time.monotonic()
+    assert submitter.submit_txn_cbor(tx_cbor) == txn_hash
+    assert time.monotonic() - start < 1
+    assert fast.submitted == [tx_cbor]
+    latencies = submitter.latencies()
+    assert latencies['fast']['successes'] == 1
+    assert latencies['slow']['submissions'] == 0
+    submitter.close()
+
+def test_failing_endpoint_does_not_fail_submission():
+    (tx_cbor, txn_hash) = signed_txn()
+    submitter = HedgedSubmitter({'down': FakeEndpoint(error=ConnectionError('refused')), 'up': FakeEndpoint(delay=0.2, result=txn_hash)})
+    assert submitter.submit_txn_cbor(tx_cbor) == txn_hash
+    latencies = submitter.latencies()
+    assert latencies['down']['failures'] == 1
+    assert latencies['up']['successes'] == 1
+    assert latencies['up']['last_ms'] >= 200
+    assert latencies['up']['avg_ms'] == latencies['up']['last_ms']
+
+def test_raises_when_every_endpoint_fails():
+    (tx_cbor, _) = signed_txn()
+    submitter = HedgedSubmitter({'first': FakeEndpoint(error=ValueError('BadInputsUTxO')), 'second': FakeEndpoint(delay=0.1, error=ValueError('fee too small'))})
+    with pytest.raises(ValueError, match='fee too small'):
+        submitter.submit_txn_cbor(tx_cbor)
+
+def test_already_in_mempool_counts_as_success():
+    (tx_cbor, txn_hash) = signed_txn()
+    submitter = HedgedSubmitter({'only': FakeEndpoint(error=ValueError('Transaction is already in mempool'))})
+    assert submitter.submit_txn_cbor(tx_cbor) == txn_hash
+    assert submitter.latencies()['only']['successes'] == 1
+
+def test_times_out_when_no_endpoint_answers():
+    (tx_cbor, _) = signed_txn()
+    submitter = HedgedSubmitter({'hung': FakeEndpoint(delay=1)}, timeout=0.1)
+    with pytest.raises(TimeoutError):
+        submitter.submit_txn_cbor(tx_cbor)
+
+def test_requires_an_endpoint():
+    with pytest.raises(ValueError):
+        HedgedSubmitter({})
+
+def test_submit_txn_reads_signed_file(tmp_path):
+    (tx_cbor, txn_hash) = signed_txn()
+    signed_file = tmp_path / 'txn.signed'
+    signed_file.write_text(json.dumps({'type': 'Tx BabbageEra', 'cborHex': tx_cbor.hex()}))
+    endpoint = FakeEndpoint()
+    assert HedgedSubmitter({'only': endpoint}).submit_txn(str(signed_file)) == txn_hash
+    assert endpoint.submitted == [tx_cbor]
+
+def test_submit_api_endpoint(submit_server):
+    endpoint = SubmitApiEndpoint(f"{submit_server.url}/")
+    assert endpoint.submit_txn_cbor(b'good') == MINT_REQ_TXN
+    assert submit_server.requests == [('/api/submit/tx', 'application/cbor', b'good')]
+    with pytest.raises(ValueError, match='BadInputsUTxO'):
+        endpoint.submit_txn_cbor(b'bad')
+
+def test_ogmios_submit_endpoint(submit_server):
+    endpoint = OgmiosSubmitEndpoint(submit_server.url)
+    assert endpoint.submit_txn_cbor(b'good') == MINT_REQ_TXN
+    assert json.loads(submit_server.requests[0][2])['method'] == 'submitTransaction'
+    with pytest.raises(ValueError, match='unknown inputs'):
+        endpoint.submit_txn_cbor(b'bad')
@@ -0,0 +1,20 @@
+import json
+
+from http.server import BaseHTTPRequestHandler
+
+class FakeHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def respond(self, status, doc, headers={}):
+        body = json.dumps(doc).encode('UTF-8')
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
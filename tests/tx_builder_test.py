@@ -0,0 +1,184 @@
+import cbor2
+import hashlib
+import io
+import json
+import os
+import pytest
+import shutil
+
+from nacl.signing import VerifyKey
+from pycardano import Transaction
+
+from test_utils.fs import data_file_path
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.fees import FeeCalculator
+from cardano.wt.mint import Mint
+from cardano.wt.tx_builder import PyCardanoTxBuilder
+from cardano.wt.utxo import Balance
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+POLICY_ID = 'a8b0487ef4d9f4215e0ffcb9b5bc78b438c4e9fb8788656691ce753b'
+NFT_NAMES = ['WildTangz 2', 'WildTangz 10']
+PAYMENT_ADDR = 'addr_test1vplgrtqgphv0hpx2v6zyzwxxmyh0q4vjrzeuv7qvtk3ev2cmmgd54'
+
+def build_mint_txn(request, tmp_path, txn_builder, fee):
+    os.makedirs(os.path.join(tmp_path, CardanoCli.TXN_DIR), exist_ok=True)
+    script_file = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    mint = Mint([Balance(10000000, Balance.LOVELACE_POLICY)], 0, None, str(tmp_path), [script_file], [], NoWhitelist())
+    metadata_file = os.path.join(tmp_path, 'metadata.json')
+    with open(metadata_file, 'w') as metadata_filehandle:
+        json.dump({'721': {POLICY_ID: {name: {'name': name, 'image': 'ipfs://QmRhTTbUrPYEw3mJGGhQqQST9k86v1DPBiTTWJGKDJsVFw'} for name in NFT_NAMES}, 'version': '1.0'}}, metadata_filehandle)
+    tx_ins = [f"--tx-in {'b' * 64}#1", f"--tx-in {'a' * 64}#0"]
+    nft_outs = '+'.join([f"1 {POLICY_ID}.{name.encode('UTF-8').hex()}" for name in NFT_NAMES])
+    tx_outs = [f'--tx-out "{PAYMENT_ADDR}+1500000 lovelace+{nft_outs}"', f'--tx-out "{PAYMENT_ADDR}+8000000 lovelace"']
+    nft_policy_map = {POLICY_ID: NFT_NAMES}
+    return txn_builder.build_raw_mint_txn(str(tmp_path), 'test', tx_ins, tx_outs, fee, metadata_file, mint, nft_policy_map, {POLICY_ID: script_file})
+
+def raw_txn_items(txn_file):
+    # Slice the on-disk CBOR into its top-level items as written, with no decode/re-encode round trip
+    with open(txn_file, 'r') as txn_filehandle:
+        txn_cbor = bytes.fromhex(json.load(txn_filehandle)['cborHex'])
+    assert 0x80 < txn_cbor[0] < 0x98, f"Expected a definite-length transaction array, found {txn_cbor[0]:#x}"
+    stream = io.BytesIO(txn_cbor[1:])
+    decoder = cbor2.CBORDecoder(stream)
+    (items, start) = ([], 0)
+    for idx in range(txn_cbor[0] - 0x80):
+        decoder.decode()
+        items.append(txn_cbor[1 + start:1 + stream.tell()])
+        start = stream.tell()
+    assert 1 + start == len(txn_cbor)
+    return items
+
+def read_txn(txn_file):
+    with open(txn_file, 'r') as txn_filehandle:
+        return Transaction.from_cbor(json.load(txn_filehandle)['cborHex'])
+
+def test_builds_mint_txn_in_memory(request, tmp_path):
+    txn_builder = PyCardanoTxBuilder()
+    txn = read_txn(build_mint_txn(request, tmp_path, txn_builder, 170000))
+    body = txn.transaction_body
+    assert [(str(tx_in.transaction_id), tx_in.index) for tx_in in body.inputs] == [('a' * 64, 0), ('b' * 64, 1)]
+    assert [str(tx_out.address) for tx_out in body.outputs] == [PAYMENT_ADDR, PAYMENT_ADDR]
+    assert body.outputs[0].amount.coin == 1500000
+    assert body.outputs[1].amount == 8000000
+    assert body.fee == 170000
+    assert body.validity_start == 12345678
+    assert body.ttl == 87654321
+    assert sorted([asset_name.payload.decode('UTF-8') for asset_name in list(body.mint.values())[0].keys()]) == sorted(NFT_NAMES)
+    assert body.auxiliary_data_hash == txn.auxiliary_data.hash()
+    assert txn.transaction_witness_set.native_scripts[0].hash().payload.hex() == POLICY_ID
+
+def test_min_fee_accounts_for_witnesses(request, tmp_path):
+    protocol_params = data_file_path(request, os.path.join('protocol', 'preprod.json'))
+    txn_builder = PyCardanoTxBuilder(protocol_params=protocol_params)
+    build_file = build_mint_txn(request, tmp_path, txn_builder, 0)
+    one_witness_fee = txn_builder.calculate_min_fee(build_file, 2, 2, 1)
+    two_witness_fee = txn_builder.calculate_min_fee(build_file, 2, 2, 2)
+    assert one_witness_fee > (44 * txn_builder.txn_size(build_file)) + 155381
+    assert two_witness_fee - one_witness_fee == 44 * CardanoCli.WITNESS_SIZE
+
+def test_signs_with_deduplicated_keys(request, tmp_path):
+    txn_builder = PyCardanoTxBuilder()
+    sign_key = data_file_path(request, os.path.join('sign_keys', 'dummy.skey'))
+    signed_file = txn_builder.sign_txn([sign_key, sign_key], build_mint_txn(request, tmp_path, txn_builder, 170000))
+    txn = read_txn(signed_file)
+    witnesses = txn.transaction_witness_set.vkey_witnesses
+    assert len(witnesses) == 1
+    VerifyKey(witnesses[0].vkey.payload).verify(txn.transaction_body.hash(), witnesses[0].signature)
+
+def test_policy_id_matches_script_hash(request):
+    assert PyCardanoTxBuilder().policy_id(data_file_path(request, os.path.join('scripts', 'simple.script'))) == POLICY_ID
+
+@pytest.mark.skipif(not shutil.which('cardano-cli'), reason='cardano-cli is not installed')
+def test_body_is_byte_identical_to_cardano_cli(request, tmp_path):
+    cli_items = raw_txn_items(build_mint_txn(request, os.path.join(tmp_path, 'cli'), CardanoCli(), 170000))
+    pycardano_items = raw_txn_items(build_mint_txn(request, os.path.join(tmp_path, 'pycardano'), PyCardanoTxBuilder(), 170000))
+    assert pycardano_items[0].hex() == cli_items[0].hex()
+    assert pycardano_items[-1].hex() == cli_items[-1].hex()
+
+def test_raw_txn_items_are_sliced_without_reencoding(request, tmp_path):
+    build_file = build_mint_txn(request, tmp_path, PyCardanoTxBuilder(), 170000)
+    items = raw_txn_items(build_file)
+    txn = read_txn(build_file)
+    assert len(items) == 4
+    # The transaction ID is the hash of the body bytes exactly as written
+    assert hashlib.blake2b(items[0], digest_size=32).hexdigest() == str(txn.id)
+
+def test_builds_once_at_fixed_point_fee(request, tmp_path):
+    os.makedirs(os.path.join(tmp_path, CardanoCli.TXN_DIR), exist_ok=True)
+    protocol_params = data_file_path(request, os.path.join('protocol', 'preprod.json'))
+    txn_builder = PyCardanoTxBuilder(protocol_params=protocol_params)
+    script_file = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    mint = Mint([Balance(10000000, Balance.LOVELACE_POLICY)], 0, None, str(tmp_path), [script_file], [], NoWhitelist())
+    tx_outs_for_fee = lambda fee: [f'--tx-out "{PAYMENT_ADDR}+{10000000 - fee} lovelace"']
+    (build_file, fee) = txn_builder.build_raw_mint_txn_at_min_fee(str(tmp_path), 'test', [f"--tx-in {'a' * 64}#0"], tx_outs_for_fee, 2, None, mint, {}, {}, fee_step=3)
+    txn = read_txn(build_file)
+    assert fee % 3 == 0
+    assert txn.transaction_body.fee == fee
+    assert txn.transaction_body.outputs[0].amount == 10000000 - fee
+    assert fee >= FeeCalculator(protocol_params).min_fee(txn_builder.txn_size(build_file), 2)
+    assert os.listdir(os.path.join(tmp_path, CardanoCli.TXN_DIR)) == ['txn_test.raw.build']
+
+class CountingTxBuilder(PyCardanoTxBuilder):
+
+    def __init__(self, protocol_params):
+        super().__init__(protocol_params=protocol_params)
+        self.builds = 0
+
+    def build_raw_mint_txn(self, *args):
+        self.builds += 1
+        return super().build_raw_mint_txn(*args)
+
+def test_fee_settles_in_two_builds(request, tmp_path):
+    os.makedirs(os.path.join(tmp_path, CardanoCli.TXN_DIR), exist_ok=True)
+    protocol_params = data_file_path(request, os.path.join('protocol', 'preprod.json'))
+    txn_builder = CountingTxBuilder(protocol_params)
+    script_file = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    mint = Mint([Balance(10000000, Balance.LOVELACE_POLICY)], 0, None, str(tmp_path), [script_file], [], NoWhitelist())
+    requested_fees = []
+    def tx_outs_for_fee(fee):
+        requested_fees.append(fee)
+        return [f'--tx-out "{PAYMENT_ADDR}+{10000000 - fee} lovelace"']
+    # The cardano-cli loop (one build-raw per build) run over in-memory builds
+    (build_file, cli_fee) = CardanoCli.build_raw_mint_txn_at_min_fee(txn_builder, str(tmp_path), 'test', [f"--tx-in {'a' * 64}#0"], tx_outs_for_fee, 2, None, mint, {}, {})
+    assert txn_builder.builds == 2
+    (txn_cbor, fee) = txn_builder.build_mint_txn_at_min_fee('test', [f"--tx-in {'a' * 64}#0"], tx_outs_for_fee, 2, None, mint, {}, {})
+    assert fee == cli_fee
+    assert len(requested_fees) == 4
+
+def test_in_memory_pipeline_matches_files(request, tmp_path):
+    os.makedirs(os.path.join(tmp_path, CardanoCli.TXN_DIR), exist_ok=True)
+    protocol_params = data_file_path(request, os.path.join('protocol', 'preprod.json'))
+    txn_builder = PyCardanoTxBuilder(protocol_params=protocol_params)
+    script_file = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    sign_key = data_file_path(request, os.path.join('sign_keys', 'dummy.skey'))
+    mint = Mint([Balance(10000000, Balance.LOVELACE_POLICY)], 0, None, str(tmp_path), [script_file], [], NoWhitelist())
+    metadata_json = {'721': {POLICY_ID: {'WildTangz 1': {'name': 'WildTangz 1'}}}}
+    metadata_file = os.path.join(tmp_path, 'metadata.json')
+    with open(metadata_file, 'w') as metadata_filehandle:
+        json.dump(metadata_json, metadata_filehandle)
+    tx_ins = [f"--tx-in {'a' * 64}#0"]
+    tx_outs_for_fee = lambda fee: [f'--tx-out "{PAYMENT_ADDR}+{10000000 - fee} lovelace+1 {POLICY_ID}.{"WildTangz 1".encode("UTF-8").hex()}"']
+    nft_policy_map = {POLICY_ID: ['WildTangz 1']}
+    (build_file, file_fee) = txn_builder.build_raw_mint_txn_at_min_fee(str(tmp_path), 'test', tx_ins, tx_outs_for_fee, 2, metadata_file, mint, nft_policy_map, {POLICY_ID: script_file})
+    (txn_cbor, fee) = txn_builder.build_mint_txn_at_min_fee('test', tx_ins, tx_outs_for_fee, 2, metadata_json, mint, nft_policy_map, {POLICY_ID: script_file})
+    assert fee == file_fee
+    assert read_txn(build_file).to_cbor() == txn_cbor
+    signed_file = txn_builder.sign_txn([sign_key], build_file)
+    assert read_txn(signed_file).to_cbor() == txn_builder.sign_txn_cbor([sign_key], txn_cbor)
+    assert PyCardanoTxBuilder.text_envelope(txn_cbor)['cborHex'] == txn_cbor.hex()
+
+def test_fee_calculator_reloads_only_rewritten_protocol(request, tmp_path):
+    protocol_params = os.path.join(tmp_path, 'protocol.json')
+    shutil.copy(data_file_path(request, os.path.join('protocol', 'preprod.json')), protocol_params)
+    cardano_cli = CardanoCli(protocol_params=protocol_params)
+    fee_calculator = cardano_cli.fee_calculator()
+    assert cardano_cli.fee_calculator() is fee_calculator
+    with open(protocol_params, 'r') as protocol_filehandle:
+        protocol_json = json.load(protocol_filehandle)
+    protocol_json['txFeePerByte'] = 45
+    with open(protocol_params, 'w') as protocol_filehandle:
+        json.dump(protocol_json, protocol_filehandle)
+    os.utime(protocol_params, ns=(0, 0))
+    assert cardano_cli.fee_calculator().fee_per_byte == 45
@@ -180,3 +180,33 @@ def test_does_not_allow_mint_with_no_prices(request, vm_test_config):
         assert False, f"Successfully validated mint with no prices"
     except ValueError as e:
         assert 'Must specify at least one valid mint price, even if 0 ADA for free mint' in str(e)
+
+def test_does_not_allow_zero_vend_workers(request, vm_test_config):
+    try:
+        simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+        mint = Mint(MINT_PRICE, 0, None, vm_test_config.metadata_dir, [simple_script], None, NoWhitelist())
+        vending_machine = NftVendingMachine('addr123', None, 'addr456', False, 30, mint, None, None, mainnet=False, vend_workers=0)
+        vending_machine.validate()
+        assert False, "Successfully validated vending machine with no vend workers"
+    except ValueError as e:
+        assert 'Must have at least one vend worker, found 0' in str(e)
+
+def test_does_not_allow_zero_vend_batch_size(request, vm_test_config):
+    try:
+        simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+        mint = Mint(MINT_PRICE, 0, None, vm_test_config.metadata_dir, [simple_script], None, NoWhitelist())
+        vending_machine = NftVendingMachine('addr123', None, 'addr456', False, 30, mint, None, None, mainnet=False, vend_batch_size=0)
+        vending_machine.validate()
+        assert False, "Successfully validated vending machine with a vend batch size of zero"
+    except ValueError as e:
+        assert 'Must have a vend batch size of at least one, found 0' in str(e)
+
+def test_does_not_allow_in_memory_vends_with_cardano_cli(request, vm_test_config):
+    try:
+        simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+        mint = Mint(MINT_PRICE, 0, None, vm_test_config.metadata_dir, [simple_script], None, NoWhitelist())
+        vending_machine = NftVendingMachine('addr123', None, 'addr456', False, 30, mint, None, CardanoCli(), mainnet=False, in_memory=True)
+        vending_machine.validate()
+        assert False, "Successfully validated in-memory vending machine with the cardano-cli transaction builder"
+    except ValueError as e:
+        assert 'In-memory vending requires the pycardano transaction builder, found CardanoCli' in str(e)
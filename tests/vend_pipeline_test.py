@@ -0,0 +1,291 @@
+import json
+import math
+import os
+import threading
+
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.journal import VendJournal
+from cardano.wt.mint import Mint
+from cardano.wt.nft_vending_machine import NftVendingMachine
+from cardano.wt.retry_policy import CircuitOpenError
+from cardano.wt.retry_scheduler import RetryScheduler
+from cardano.wt.utxo import Utxo, Balance
+from cardano.wt.whitelist.asset_whitelist import SingleUseWhitelist
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+PAYMENT_ADDR = 'addr_test1payment'
+PROFIT_ADDR = 'addr_test1profit'
+POLICY = 'c' * Mint._POLICY_LEN
+WL_ASSET = f"{'d' * Mint._POLICY_LEN}{'WL'.encode('UTF-8').hex()}"
+MINT_PRICE = 10000000
+FEE = 200000
+
+"""
+Stands in for Blockfrost: every mint request was paid by its own buyer address
+and (optionally) carried a whitelisted asset.
+"""
+class FakeChain(object):
+
+    def __init__(self, mint_reqs, wl_asset=None):
+        self.mint_reqs = mint_reqs
+        self.wl_asset = wl_asset
+        self.outage = False
+        self.lock = threading.Lock()
+        self.submitted = []
+
+    def get_tx_utxos(self, txn_hash):
+        if self.outage:
+            raise CircuitOpenError('Circuit is open')
+        amount = [{'unit': 'lovelace', 'quantity': '2000000'}]
+        if self.wl_asset:
+            amount.append({'unit': self.wl_asset, 'quantity': '1'})
+        return {
+            'inputs': [{'address': buyer_addr(txn_hash), 'reference': False, 'collateral': False}],
+            'outputs': [{'address': buyer_addr(txn_hash), 'amount': amount}]
+        }
+
+    def get_txn(self, txn_hash):
+        return {'hash': txn_hash} if txn_hash in self.submitted else None
+
+    def iter_utxos(self, address, exclusions):
+        return (mint_req for mint_req in self.mint_reqs if not mint_req in exclusions)
+
+    def submit_txn(self, signed_file):
+        with self.lock:
+            self.submitted.append(signed_file)
+        return signed_file
+
+"""
+Stands in for cardano-cli: records the inputs and outputs of every built
+transaction instead of running anything.
+"""
+class FakeCardanoCli(object):
+
+    def __init__(self, fee=FEE, max_tx_size=None, size_per_input=1000, failing_hashes=[]):
+        self.fee = fee
+        self.max_tx_size_bytes = max_tx_size
+        self.size_per_input = size_per_input
+        self.failing_hashes = failing_hashes
+        self.lock = threading.Lock()
+        self.builds = {}
+
+    def build_addr(self, payment_sign_key, mainnet=False):
+        return PAYMENT_ADDR
+
+    def policy_id(self, script_file):
+        return POLICY
+
+    def build_raw_mint_txn_at_min_fee(self, output_dir, txn_id, tx_in_args, tx_outs_for_fee, witness_count, metadata_json_file, mint, nft_policy_map, scripts_map, fee_step=1):
+        fee = math.ceil(self.fee / fee_step) * fee_step
+        with self.lock:
+            self.builds[txn_id] = {'tx_ins': tx_in_args, 'payees': parse_tx_outs(tx_outs_for_fee(fee)), 'fee': fee, 'fee_step': fee_step}
+        return (txn_id, fee)
+
+    def txn_size(self, build_file):
+        return len(self.builds[build_file]['tx_ins']) * self.size_per_input
+
+    def max_tx_size(self):
+        return self.max_tx_size_bytes
+
+    def sign_txn(self, signing_files, build_file):
+        for failing_hash in self.failing_hashes:
+            if [tx_in for tx_in in self.builds[build_file]['tx_ins'] if failing_hash in tx_in]:
+                raise ValueError(f"Could not sign {build_file}")
+        return build_file
+
+def buyer_addr(txn_hash):
+    return f"addr_test1buyer{txn_hash[0:8]}"
+
+def parse_tx_outs(tx_outs):
+    payees = {}
+    for tx_out in tx_outs:
+        (payee, *payouts) = tx_out[len('--tx-out "'):-1].split('+')
+        payees[payee] = {}
+        for payout in payouts:
+            (amount, unit) = payout.split(' ')
+            payees[payee][unit] = int(amount)
+    return payees
+
+def mint_req(idx, lovelace=MINT_PRICE):
+    return Utxo(f"{idx:08d}" + ('a' * 56), 0, [Balance(lovelace, Balance.LOVELACE_POLICY)])
+
+def create_nfts(metadata_dir, num_nfts):
+    for idx in range(num_nfts):
+        with open(os.path.join(metadata_dir, f"nft{idx:02d}.json"), 'w') as nft_file:
+            json.dump({'721': {POLICY: {f"Nft{idx:02d}": {'name': f"Nft {idx}"}}}}, nft_file)
+
+def create_wl_slots(whitelist_dir, asset_id, num_slots):
+    os.makedirs(whitelist_dir, exist_ok=True)
+    for idx in range(num_slots):
+        with open(os.path.join(whitelist_dir, f"{asset_id}_{idx}"), 'w') as slot_file:
+            slot_file.write('')
+
+def vending_machine(vm_test_config, chain, cardano_cli, whitelist=None, **kwargs):
+    for key_file in ['payment.skey', 'policy.skey', 'policy.script']:
+        with open(os.path.join(vm_test_config.root_dir, key_file), 'w') as key_filehandle:
+            key_filehandle.write('{}')
+    mint = Mint(
+        [Balance(MINT_PRICE, Balance.LOVELACE_POLICY)],
+        0,
+        None,
+        vm_test_config.metadata_dir,
+        [os.path.join(vm_test_config.root_dir, 'policy.script')],
+        [os.path.join(vm_test_config.root_dir, 'policy.skey')],
+        whitelist if whitelist else NoWhitelist()
+    )
+    nft_vending_machine = NftVendingMachine(
+        PAYMENT_ADDR, os.path.join(vm_test_config.root_dir, 'payment.skey'), PROFIT_ADDR, False, 10, mint, chain, cardano_cli, **kwargs
+    )
+    nft_vending_machine.validate()
+    return nft_vending_machine
+
+def vend(nft_vending_machine, vm_test_config, exclusions=None):
+    return nft_vending_machine.vend(vm_test_config.root_dir, 'locked', 'in_proc', exclusions if exclusions is not None else set())
+
+def submitted_builds(chain, cardano_cli):
+    return [cardano_cli.builds[txn_id] for txn_id in chain.submitted]
+
+def minted_assets(builds):
+    return [unit for build in builds for payouts in build['payees'].values() for unit in payouts if unit.startswith(POLICY)]
+
+def test_parallel_workers_never_hand_out_an_nft_or_wl_slot_twice(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 12)
+    create_wl_slots(vm_test_config.whitelist_dir, WL_ASSET, 10)
+    os.mkdir(vm_test_config.consumed_dir)
+    mint_reqs = [mint_req(idx, lovelace=(2 * MINT_PRICE)) for idx in range(8)]
+    chain = FakeChain(mint_reqs, wl_asset=WL_ASSET)
+    cardano_cli = FakeCardanoCli()
+    whitelist = SingleUseWhitelist(vm_test_config.whitelist_dir, vm_test_config.consumed_dir)
+    nft_vending_machine = vending_machine(vm_test_config, chain, cardano_cli, whitelist=whitelist, vend_workers=4)
+    assert vend(nft_vending_machine, vm_test_config) == 8
+    assert len(chain.submitted) == 8
+    minted = minted_assets(submitted_builds(chain, cardano_cli))
+    assert len(minted) == len(set(minted)) == 10
+    assert not os.listdir(vm_test_config.whitelist_dir)
+    assert len(os.listdir(vm_test_config.consumed_dir)) == 10
+    assert len(os.listdir(vm_test_config.metadata_dir)) == 2
+
+def test_batch_splits_fee_and_merges_payouts(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 3)
+    mint_reqs = [mint_req(idx, lovelace=(MINT_PRICE + (idx * 1000000))) for idx in range(3)]
+    chain = FakeChain(mint_reqs)
+    cardano_cli = FakeCardanoCli(fee=200001)
+    nft_vending_machine = vending_machine(vm_test_config, chain, cardano_cli, vend_batch_size=3)
+    assert vend(nft_vending_machine, vm_test_config) == 3
+    [build] = submitted_builds(chain, cardano_cli)
+    assert len(build['tx_ins']) == 3
+    assert build['fee_step'] == 3
+    assert build['fee'] % 3 == 0
+    rebate = Mint.RebateCalculator.calculate_rebate_for(1, 1, len('Nft00'))
+    assert build['payees'][PROFIT_ADDR] == {Balance.LOVELACE_POLICY: (3 * (MINT_PRICE - rebate)) - build['fee']}
+    for idx in range(3):
+        payouts = build['payees'][buyer_addr(mint_reqs[idx].hash)]
+        assert payouts[Balance.LOVELACE_POLICY] == rebate + (idx * 1000000)
+        assert len([unit for unit in payouts if unit.startswith(POLICY)]) == 1
+    total_out = sum([payouts[Balance.LOVELACE_POLICY] for payouts in build['payees'].values()])
+    assert total_out + build['fee'] == sum([utxo.balances[0].lovelace for utxo in mint_reqs])
+
+def test_splits_batch_that_exceeds_max_tx_size(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 4)
+    chain = FakeChain([mint_req(idx) for idx in range(4)])
+    two_signed_inputs = (2 * 1000) + (2 * CardanoCli.WITNESS_SIZE)
+    cardano_cli = FakeCardanoCli(max_tx_size=two_signed_inputs)
+    nft_vending_machine = vending_machine(vm_test_config, chain, cardano_cli, vend_batch_size=4)
+    vend(nft_vending_machine, vm_test_config)
+    assert [len(build['tx_ins']) for build in submitted_builds(chain, cardano_cli)] == [2, 2]
+    minted = minted_assets(submitted_builds(chain, cardano_cli))
+    assert len(minted) == len(set(minted)) == 4
+
+def test_failing_vend_does_not_fail_rest_of_batch(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 3)
+    mint_reqs = [mint_req(idx) for idx in range(3)]
+    chain = FakeChain(mint_reqs)
+    cardano_cli = FakeCardanoCli(failing_hashes=[mint_reqs[1].hash])
+    retry_scheduler = RetryScheduler(max_attempts=3)
+    nft_vending_machine = vending_machine(vm_test_config, chain, cardano_cli, vend_batch_size=3, retry_scheduler=retry_scheduler)
+    vend(nft_vending_machine, vm_test_config)
+    assert [build['tx_ins'] for build in submitted_builds(chain, cardano_cli)] == [
+        [f"--tx-in {mint_reqs[0].hash}#0"], [f"--tx-in {mint_reqs[2].hash}#0"]
+    ]
+    assert retry_scheduler.pending() == [mint_reqs[1]]
+
+def test_dead_letter_releases_reserved_nfts_and_wl_slots(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 2)
+    create_wl_slots(vm_test_config.whitelist_dir, WL_ASSET, 1)
+    os.mkdir(vm_test_config.consumed_dir)
+    failing_req = mint_req(0)
+    chain = FakeChain([failing_req], wl_asset=WL_ASSET)
+    cardano_cli = FakeCardanoCli(failing_hashes=[failing_req.hash])
+    whitelist = SingleUseWhitelist(vm_test_config.whitelist_dir, vm_test_config.consumed_dir)
+    nft_vending_machine = vending_machine(vm_test_config, chain, cardano_cli, whitelist=whitelist, retry_scheduler=RetryScheduler(max_attempts=1))
+    vend(nft_vending_machine, vm_test_config)
+    assert not chain.submitted
+    assert sorted(os.listdir(vm_test_config.metadata_dir)) == ['nft00.json', 'nft01.json']
+    assert not os.listdir(vm_test_config.locked_dir)
+    assert os.listdir(vm_test_config.whitelist_dir) == [f"{WL_ASSET}_0"]
+    assert not os.listdir(vm_test_config.consumed_dir)
+
+def test_restore_excludes_submitted_and_confirmed_requests(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 1)
+    (submitted_req, confirmed_req) = (mint_req(0), mint_req(1))
+    journal = VendJournal(os.path.join(vm_test_config.root_dir, 'journal.db'))
+    journal.record(submitted_req, VendJournal.SUBMITTED, 'txn0', {'submitted_hash': 'e' * 64})
+    journal.record(confirmed_req, VendJournal.SUBMITTED, 'txn1', {'submitted_hash': 'f' * 64})
+    journal.record(confirmed_req, VendJournal.CONFIRMED, 'txn1')
+    chain = FakeChain([submitted_req, confirmed_req])
+    nft_vending_machine = vending_machine(vm_test_config, chain, FakeCardanoCli(), journal=journal)
+    exclusions = set()
+    assert nft_vending_machine.restore(vm_test_config.root_dir, 'locked', exclusions) == 0
+    assert exclusions == set([submitted_req, confirmed_req])
+    nft_vending_machine.enqueue([confirmed_req])
+    assert not vend(nft_vending_machine, vm_test_config, exclusions)
+    assert not chain.submitted
+
+def test_backend_outage_does_not_use_up_vend_attempts(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 1)
+    paid_req = mint_req(0)
+    chain = FakeChain([paid_req])
+    chain.outage = True
+    retry_scheduler = RetryScheduler(max_attempts=1, base_delay=0)
+    nft_vending_machine = vending_machine(vm_test_config, chain, FakeCardanoCli(), retry_scheduler=retry_scheduler)
+    exclusions = set()
+    for poll in range(3):
+        vend(nft_vending_machine, vm_test_config, exclusions)
+    assert retry_scheduler.pending() == [paid_req]
+    assert not retry_scheduler.dead_letters()
+    chain.outage = False
+    vend(nft_vending_machine, vm_test_config, exclusions)
+    assert len(chain.submitted) == 1
+
+def test_restore_retries_dead_letters_that_could_still_succeed(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 1)
+    (flaky_req, bad_req) = (mint_req(0), mint_req(1))
+    journal = VendJournal(os.path.join(vm_test_config.root_dir, 'journal.db'))
+    journal.record(flaky_req, VendJournal.DEAD_LETTER, None, {'error': 'flaky', 'retryable': True})
+    journal.record(bad_req, VendJournal.DEAD_LETTER, None, {'error': 'bad utxo', 'retryable': False})
+    nft_vending_machine = vending_machine(vm_test_config, FakeChain([flaky_req, bad_req]), FakeCardanoCli(), journal=journal)
+    exclusions = set()
+    nft_vending_machine.restore(vm_test_config.root_dir, 'locked', exclusions)
+    assert exclusions == set([bad_req])
+
+class UnreleasableWhitelist(NoWhitelist):
+
+    def release(self, consumed):
+        raise OSError('Whitelist directory is read-only')
+
+def test_reschedules_requests_when_error_handling_fails(vm_test_config):
+    create_nfts(vm_test_config.metadata_dir, 1)
+    failing_req = mint_req(0)
+    chain = FakeChain([failing_req])
+    retry_scheduler = RetryScheduler(max_attempts=1)
+    nft_vending_machine = vending_machine(
+        vm_test_config, chain, FakeCardanoCli(failing_hashes=[failing_req.hash]), whitelist=UnreleasableWhitelist(), retry_scheduler=retry_scheduler
+    )
+    exclusions = set()
+    vend(nft_vending_machine, vm_test_config, exclusions)
+    assert retry_scheduler.pending() == [failing_req]
+    assert not retry_scheduler.dead_letters()
+    assert retry_scheduler.payload(failing_req).locked_filenames == ['nft00.json']
+    assert os.listdir(vm_test_config.locked_dir) == ['nft00.json']
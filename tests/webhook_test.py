@@ -0,0 +1,88 @@
+import hashlib
+import hmac
+import json
+import pytest
+import requests
+import time
+
+from cardano.wt.utxo import Utxo
+from cardano.wt.webhook import WebhookListener
+
+PAYMENT_ADDR = 'addr_test1vplgrtqgphv0hpx2v6zyzwxxmyh0q4vjrzeuv7qvtk3ev2cmmgd54'
+BUYER_ADDR = 'addr_test1qbuyer'
+SECRET = 'webhook-auth-token'
+MINT_REQ_TXN = '1' * 64
+
+class FakeVendingMachine(object):
+
+    def __init__(self):
+        self.payment_addr = PAYMENT_ADDR
+        self.enqueued = []
+
+    def enqueue(self, mint_reqs):
+        self.enqueued.extend(mint_reqs)
+
+def output(address, ix, lovelace, collateral=False):
+    return {'address': address, 'amount': [{'unit': 'lovelace', 'quantity': str(lovelace)}], 'output_index': ix, 'collateral': collateral}
+
+def transaction_event(outputs, event_type='transaction'):
+    return {
+        'id': 'event-id',
+        'webhook_id': 'webhook-id',
+        'created': int(time.time()),
+        'api_version': 1,
+        'type': event_type,
+        'payload': [{'tx': {'hash': MINT_REQ_TXN}, 'inputs': [], 'outputs': outputs}]
+    }
+
+def signature(body, timestamp=None, secret=SECRET):
+    timestamp = timestamp if timestamp else int(time.time())
+    signed = hmac.new(secret.encode('UTF-8'), f"{timestamp}.".encode('UTF-8') + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signed}"
+
+@pytest.fixture
+def listener():
+    notifications = []
+    webhook_listener = WebhookListener(FakeVendingMachine(), SECRET, 0, host='127.0.0.1', notify=lambda: notifications.append(True))
+    webhook_listener.notifications = notifications
+    webhook_listener.start()
+    yield webhook_listener
+    webhook_listener.stop()
+
+def post(webhook_listener, body, signature_header):
+    return requests.post(f"http://127.0.0.1:{webhook_listener.port}/webhook", data=body, headers={WebhookListener.SIGNATURE_HEADER: signature_header}, timeout=5)
+
+def test_requires_secret():
+    with pytest.raises(ValueError):
+        WebhookListener(FakeVendingMachine(), '', 0)
+
+def test_verifies_signatures():
+    webhook_listener = WebhookListener(FakeVendingMachine(), SECRET, 0, clock=lambda: 1000)
+    body = b'{"type": "transaction"}'
+    assert webhook_listener.verify(signature(body, timestamp=1000), body)
+    assert webhook_listener.verify(f"t=1000,v1={'0' * 64},{signature(body, timestamp=1000).split(',')[1]}", body)
+    assert not webhook_listener.verify(signature(body, timestamp=1000, secret='rotated'), body)
+    assert not webhook_listener.verify(signature(body, timestamp=1000), body + b' ')
+    assert not webhook_listener.verify(signature(body, timestamp=1000 - 601), body)
+    assert not webhook_listener.verify('', body)
+    assert not webhook_listener.verify('t=abc,v1=def', body)
+
+def test_enqueues_payments_to_payment_address(listener):
+    body = json.dumps(transaction_event([output(BUYER_ADDR, 0, 2000000), output(PAYMENT_ADDR, 1, 10000000), output(PAYMENT_ADDR, 2, 5000000, collateral=True)])).encode('UTF-8')
+    response = post(listener, body, signature(body))
+    assert response.status_code == 200
+    assert listener.nft_vending_machine.enqueued == [Utxo(MINT_REQ_TXN, 1, [])]
+    assert listener.nft_vending_machine.enqueued[0].balances[0].lovelace == 10000000
+    assert listener.notifications == [True]
+
+def test_rejects_unsigned_and_malformed_deliveries(listener):
+    body = json.dumps(transaction_event([output(PAYMENT_ADDR, 0, 10000000)])).encode('UTF-8')
+    assert post(listener, body, signature(body, secret='wrong')).status_code == 401
+    assert post(listener, b'not json', signature(b'not json')).status_code == 400
+    assert listener.nft_vending_machine.enqueued == []
+    assert listener.notifications == []
+
+def test_ignores_other_events(listener):
+    body = json.dumps(transaction_event([output(PAYMENT_ADDR, 0, 10000000)], event_type='block')).encode('UTF-8')
+    assert post(listener, body, signature(body)).status_code == 200
+    assert listener.nft_vending_machine.enqueued == []